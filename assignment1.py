@@ -1,125 +1,84 @@
 import streamlit as st
 import os
-import re
 import base64
-from collections import defaultdict
-from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer
-from nltk.tokenize import word_tokenize
-
-def pre_processing_function(text):
+from corpus_manifest import build_manifest, update_manifest
+from index_store import is_index_stale, load_indexes_for_update, save_indexes
+from indexing import build_indexes, update_indexes
+from positional import min_match_distance, phrase_matches
+from postings import DocSet, intersect_many, intersect_sorted
+from query_parser import evaluate_boolean_query, parse_boolean_query
+from spelling import SpellingIndex
+from spimi import build_spimi_indexes
+from preprocessing import TOKENIZERS, get_preprocessor, pre_processing_function, set_tokenizer, soundex
+
+def create_indexes(folder_path, workers=1, compress=False, build_biphrase=True, memory_budget=None, postings_path=None):
     """
-    Preprocess text by lowercasing, removing stopwords, stemming, and removing non-alphanumeric characters.
+    Create inverted index, biphrase index, and soundex index from the given folder of documents.
     
     Args:
-    text (str): The input text to be preprocessed
+    folder_path (str): Path to the folder containing text documents.
+    workers (int): Number of worker processes that tokenize and index shards of the documents in parallel.
+    compress (bool): Whether to store the posting lists delta and variable-byte compressed, to fit larger corpora in memory.
+    build_biphrase (bool): Whether to build the biphrase index, which phrase queries on the inverted index do not need.
+    memory_budget (int): If given, the inverted index is built in a single process within this many bytes of postings
+    and kept on disk in postings_path, without the biphrase index, for corpora larger than the memory.
+    postings_path (str): Path of the file of the on-disk inverted index.
     
     Returns:
-    list: A list of preprocessed tokens
+    tuple: A tuple containing the inverted index, biphrase index (None if not built), and soundex index of the inputted text documents
     """
-    text = text.lower()
-    tokens = word_tokenize(text)
-    stop_words = set(stopwords.words('english'))
-    tokens = [word for word in tokens if word not in stop_words]
-    ps = PorterStemmer()
-    tokens = [ps.stem(word) for word in tokens]
-    tokens = [re.sub(r'\W+', '', word) for word in tokens if re.sub(r'\W+', '', word) != '']
-    return tokens
-
-def create_indexes(folder_path):
+    if memory_budget:
+        return build_spimi_indexes(folder_path, postings_path, memory_budget, compress)
+    return build_indexes(folder_path, workers, compress, build_biphrase)
+
+def refresh_indexes(folder_path, indexes, manifest, workers=1, compress=False, build_biphrase=True, memory_budget=None, postings_path=None):
     """
-    Create inverted index, biphrase index, and soundex index from the given folder of documents.
+    Update the indexes of a folder of documents for the documents added, modified or removed since they were built.
     
     Args:
     folder_path (str): Path to the folder containing text documents.
+    indexes (tuple): The inverted index, biphrase index and soundex index built from the folder.
+    manifest (dict): The manifest of the folder when the indexes were built.
+    workers (int): Number of worker processes that tokenize and index shards of the changed documents in parallel.
+    compress (bool): Whether to store the posting lists delta and variable-byte compressed.
+    build_biphrase (bool): Whether to build the biphrase index.
+    memory_budget (int): If given, the on-disk inverted index, which cannot be updated in place, is rebuilt in bounded
+    memory when any document changed.
+    postings_path (str): Path of the file of the on-disk inverted index.
     
     Returns:
-    tuple: A tuple containing the inverted index, biphrase index, and soundex index of the inputted text documents
+    tuple: The updated indexes, the manifest of the folder as it is now, and the number of documents re-indexed and removed
     """
-    inverted_index = defaultdict(lambda: defaultdict(list))
-    biphrase_index = defaultdict(lambda: defaultdict(list))
-    soundex_index = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-    
-    for filename in os.listdir(folder_path):
-        if filename.endswith(".txt"):
-            filepath = os.path.join(folder_path, filename)
-            
-            with open(filepath, 'r', encoding='utf-8', errors='ignore') as file:
-                content = file.read()
-                
-            tokens = pre_processing_function(content)
-            
-            for position, token in enumerate(tokens):
-                # Populating the regular inverted index
-                inverted_index[token][filename].append(position)
-                
-                # Populating the biphrase index for pairs of consecutive tokens in the text
-                if position < len(tokens) - 1:
-                    biphrase = f"{token} {tokens[position + 1]}"
-                    biphrase_index[biphrase][filename].append(position)
-                
-                # Populating the soundex index
-                soundex_code = soundex(token)
-                soundex_index[soundex_code][token][filename].append(position)
-    
-    return inverted_index, biphrase_index, soundex_index
-
-def boolean_and(list1, list2):
-    """Perform Boolean AND operation on two sets of documents to find documents having both the query terms"""
-    return list1.intersection(list2)
-
-def boolean_or(list1, list2):
-    """Perform Boolean OR operation on two sets of documents to find the documents having either of the query terms"""
-    return list1.union(list2)
-
-def boolean_not(list1, total_docs):
-    """Perform Boolean NOT operation to exclude documents that contains the query term"""
-    return total_docs - list1
-
-def process_boolean_query(query, inverted_index, total_docs):
+    manifest, changed, removed = update_manifest(folder_path, manifest)
+    if memory_budget:
+        if changed or removed:
+            # The rebuilt index replaces the file of the old one, which cannot be replaced on Windows while mapped
+            indexes[0].close()
+            indexes = create_indexes(folder_path, workers, compress, build_biphrase, memory_budget, postings_path)
+        return indexes, manifest, len(changed), len(removed)
+    indexes = update_indexes(folder_path, indexes, changed, removed, workers, compress, build_biphrase)
+    return indexes, manifest, len(changed), len(removed)
+
+def process_boolean_query(query, inverted_index, total_docs=None):
     """
-    Process Boolean query with AND, OR, and NOT operators on inverted index.
+    Process Boolean query with AND, OR, NOT and parentheses on inverted index.
+
+    The query is parsed into an expression tree, AND binding tighter than OR, and evaluated on document bitmaps
+    in the order the operands are written.
     
     Args:
     query (str): The boolean query string.
-    inverted_index (dict): The inverted index of the document collection.
-    total_docs (set): Set of all document IDs in the collection.
+    inverted_index (InvertedIndex): The inverted index of the document collection.
+    total_docs (set): Set of all document names in the collection, defaults to all the indexed documents.
     
     Returns:
     set: A set of documents matching the boolean query.
     """
-    tokens = query.lower().split()
-    matched_docs = set()
-    default_operation = 'and'
-    not_op = False
-    first_term = True
-
-    for token in tokens:
-        if token in {'and', 'or', 'not'}:
-            if token == 'not':
-                not_op = True
-            else:
-                default_operation = token
-        else:
-            # Preprocessing the token
-            processed_tokens = pre_processing_function(token)
-            if processed_tokens:
-                token = processed_tokens[0]
-                term_postinglist = set(inverted_index[token].keys()) if token in inverted_index else set()
-
-                if not_op:
-                    term_postinglist = total_docs - term_postinglist
-                    not_op = False
-
-                if first_term:
-                    matched_docs = term_postinglist
-                    first_term = False
-                elif default_operation == 'and':
-                    matched_docs = boolean_and(matched_docs, term_postinglist)
-                elif default_operation == 'or':
-                    matched_docs = boolean_or(matched_docs, term_postinglist)
-
-    return matched_docs
+    documents = inverted_index.documents
+    # Documents are sets of integer IDs stored as bitmaps, so AND, OR and NOT are word-level bit operations
+    universe = None if total_docs is None else DocSet.from_ids(documents.ids_of(total_docs))
+    matched_docs = evaluate_boolean_query(parse_boolean_query(query), inverted_index, universe)
+    return documents.names_of(matched_docs)
 
 def biphrase_processing_function(query, biphrase_index):
     """
@@ -127,93 +86,78 @@ def biphrase_processing_function(query, biphrase_index):
     
     Args:
     query (str): The biphrase query string.
-    biphrase_index (dict): The biphrase index of the document collection.
+    biphrase_index (BiphraseIndex): The biphrase index of the document collection.
     
     Returns:
     set: A set of documents matching the biphrase query.
     """
     tokens = pre_processing_function(query)
-    matched_docs = set()
+    matched_docs = []
     
     for i in range(len(tokens) - 1):
-        biphrase = f"{tokens[i]} {tokens[i+1]}"
-        if biphrase in biphrase_index:
+        biphrase_docs = biphrase_index.doc_ids(tokens[i], tokens[i+1])
+        if biphrase_docs is not None:
             if not matched_docs:
-                matched_docs = set(biphrase_index[biphrase].keys())
+                matched_docs = biphrase_docs
             else:
-                matched_docs &= set(biphrase_index[biphrase].keys())
+                # Galloping over the longer list when the lengths are skewed
+                matched_docs = intersect_sorted(matched_docs, biphrase_docs)
     
-    return matched_docs
+    return biphrase_index.documents.names_of(matched_docs)
 
-def soundex(name):
+def phrase_query_processing_function(query, inverted_index):
     """
-    Implement the Soundex algorithm to convert words into soundex codes for spelling matching.
+    Process phrase query of any length by finding documents that contain all the query terms in sequence.
+
+    The phrase is matched on the positions stored in the inverted index, so the biphrase index is not needed.
     
     Args:
-    name (str): The input word to be converted to Soundex code.
+    query (str): The phrase query string.
+    inverted_index (InvertedIndex): The inverted index of the document collection.
     
     Returns:
-    str: The Soundex code of the input word.
+    set: A set of documents containing the phrase.
     """
-    name = name.upper()
-    soundex = name[0]
-    
-    conversions = {
-        'BFPV': '1', 'CGJKQSXZ': '2', 'DT': '3',
-        'L': '4', 'MN': '5', 'R': '6'
-    }
-    
-    for char in name[1:]:
-        for key in conversions:
-            if char in key:
-                code = conversions[key]
-                if code != soundex[-1]:
-                    soundex += code
-                break
-        if len(soundex) == 4:
-            break
-    
-    return soundex.ljust(4, '0')
-
-def proximity_processing_function(query, inverted_index, proximity):
+    tokens = pre_processing_function(query)
+    if not tokens:
+        return set()
+    
+    matched_docs = phrase_matches([inverted_index.get(token, {}) for token in tokens])
+    return inverted_index.documents.names_of(matched_docs)
+
+def proximity_processing_function(query, inverted_index, proximity, ordered=False):
     """
-    Process proximity query to find documents where two terms appear within a certain distance.
+    Process proximity query to find documents where two or more terms appear within a certain distance.
+
+    The positions of the terms are merged in linear time instead of comparing every pair of positions.
     
     Args:
     query (str): The proximity query string input of user
-    inverted_index (dict): The inverted index of the collection of document
-    proximity (int): The maximum allowed distance between terms as specified by the user
+    inverted_index (InvertedIndex): The inverted index of the collection of document
+    proximity (int): The maximum allowed number of other words between the terms, as specified by the user
+    ordered (bool): Whether the terms must appear in the order of the query
     
     Returns:
-    dict: A dictionary of documents and their corresponding word distances.
+    dict: A dictionary of documents and the minimal distance between the query terms in each of them.
+
+    Raises:
+    ValueError: If the query has fewer than 2 terms after preprocessing.
     """
     tokens = pre_processing_function(query)
     tokens = [token for token in tokens if token not in {'and'}]
     
-    if len(tokens) != 2:
-        print("Error! Proximity query must have exactly 2 terms to find the proximity")
-        return {}
-    
-    token1, token2 = tokens
-    docs1 = inverted_index.get(token1, {})
-    docs2 = inverted_index.get(token2, {})
+    if len(tokens) < 2:
+        raise ValueError("Proximity query must have at least 2 terms to find the proximity")
     
-    common_docs = set(docs1.keys()) & set(docs2.keys())
+    postings = [inverted_index.get(token, {}) for token in tokens]
+    common_docs = intersect_many([docs.keys() for docs in postings])
     
     matched_docs = {}
+    doc_names = inverted_index.documents.names
     for doc in common_docs:
-        positions1 = docs1[doc]
-        positions2 = docs2[doc]
-        
-        for pos1 in positions1:
-            for pos2 in positions2:
-                distance = abs(pos2 - pos1) - 1
-                if distance <= proximity:
-                    if doc in matched_docs:
-                        matched_docs[doc].append(distance)
-                    else:
-                        matched_docs[doc] = [distance]
-                    break
+        distance = min_match_distance([docs[doc] for docs in postings], ordered)
+        if distance is not None and distance <= proximity:
+            matched_docs[doc_names[doc]] = distance
     
     return matched_docs
 
@@ -223,8 +167,8 @@ def soundex_processing_function(query, soundex_index, inverted_index):
     
     Args:
     query (string): The soundex query string to find
-    soundex_index (dict): The soundex index of the document collection.
-    inverted_index (dict): The inverted index of the document collection.
+    soundex_index (dict): The soundex index of the document collection, mapping soundex codes to the terms having them.
+    inverted_index (InvertedIndex): The inverted index of the document collection.
     
     Returns:
     tuple: A tuple containing a set of matching documents and a dictionary of matched words.
@@ -250,7 +194,41 @@ def soundex_processing_function(query, soundex_index, inverted_index):
                 matched_docs.intersection_update(token_matched_docs)
                 matched_words[token] = token_matched_words
     
-    return matched_docs, matched_words
+    return inverted_index.documents.names_of(matched_docs), matched_words
+
+def spelling_processing_function(query, spelling_index, inverted_index, max_distance=2, max_terms=10):
+    """
+    Process spelling tolerant query, matching every query term with the indexed terms within an edit distance of it.
+
+    The expansion of every query term is capped to the closest terms, the most frequent ones first among
+    terms at the same distance, so that a short term does not fan out to hundreds of posting lists.
+    
+    Args:
+    query (string): The query string, possibly misspelled
+    spelling_index (SpellingIndex): The k-gram index of the vocabulary of the document collection.
+    inverted_index (InvertedIndex): The inverted index of the document collection.
+    max_distance (int): The largest edit distance between a query term and the terms it is matched with.
+    max_terms (int): The largest number of indexed terms a query term is expanded to.
+    
+    Returns:
+    tuple: A tuple containing a set of documents containing a match of every query term and a dictionary of matched words.
+    """
+    terms = [token for token in query.lower().split() if token not in {'and', 'or', 'not'}]
+    matched_docs = None
+    matched_words = {}
+    
+    for term, token in zip(terms, get_preprocessor().process_terms(terms)):
+        if token is None:
+            continue
+        matches = spelling_index.lookup(token, max_distance)
+        matches.sort(key=lambda match: (match[1], -inverted_index.document_frequency(match[0])))
+        matched_words[term] = [word for word, _ in matches[:max_terms]]
+        token_matched_docs = DocSet()
+        for word in matched_words[term]:
+            token_matched_docs = token_matched_docs | inverted_index.doc_set(word)
+        matched_docs = token_matched_docs if matched_docs is None else matched_docs & token_matched_docs
+    
+    return inverted_index.documents.names_of(matched_docs or ()), matched_words
 
 def main():
     """
@@ -265,43 +243,103 @@ def main():
     # Sidebar for folder path input i.e. the corpus to run query on
     folder_path = st.sidebar.text_input("Enter the path to your corpus folder:", r"C:\Users\ravee\Downloads\Corpus")
 
-    # Creating the indexes on button click of the "Create Indexes" button
+    # Number of processes used to tokenize and index the corpus
+    workers = st.sidebar.number_input("Number of worker processes for indexing:", min_value=1, value=os.cpu_count() or 1)
+
+    # Tokenizer used to split the documents and queries into words
+    tokenizer = st.sidebar.selectbox("Tokenizer:", TOKENIZERS)
+
+    # Compressed posting lists take several times less memory but are decoded at query time
+    compress = st.sidebar.checkbox("Compress posting lists")
+
+    # Corpora larger than the memory are indexed in blocks of bounded size merged into an inverted index kept on disk
+    memory_budget = st.sidebar.number_input("Memory budget for indexing in MB (0 indexes in memory):", min_value=0, value=0) << 20
+
+    # Phrase queries are answered from the positions of the inverted index, the biphrase index only serves biword queries
+    build_biphrase = st.sidebar.checkbox("Build the biphrase index", value=True, disabled=bool(memory_budget)) and not memory_budget
+    build_options = {"compress": compress, "build_biphrase": build_biphrase, "memory_budget": memory_budget}
+
+    # Saved index file, reused across restarts and updated for the documents changed since it was saved
+    index_path = st.sidebar.text_input("Enter the path of the saved index file:", "corpus_indexes.idx")
+    # The postings of the on-disk inverted index are stored next to it
+    postings_path = index_path + ".postings"
+
+    # Creating the indexes on button click of the "Create Indexes" button, only re-indexing the documents changed since
+    # the indexes of this session or of the saved file were built
     if st.sidebar.button("Create Indexes"):
         with st.spinner("Creating indexes..."):
-            inverted_index, biphrase_index, soundex_index = create_indexes(folder_path)
-            total_docs = set(os.listdir(folder_path))
+            set_tokenizer(tokenizer)
+            index_settings = (folder_path, tokenizer, tuple(sorted(build_options.items())))
+            if st.session_state.get("index_settings") == index_settings:
+                saved = (st.session_state.inverted_index, st.session_state.biphrase_index, st.session_state.soundex_index), st.session_state.manifest
+            else:
+                saved = load_indexes_for_update(index_path, build_options)
+            if saved is None:
+                # Recording the manifest first, so that a document modified while indexing is re-indexed next time
+                manifest = build_manifest(folder_path)
+                indexes = create_indexes(folder_path, workers, compress, build_biphrase, memory_budget, postings_path)
+            else:
+                indexes, manifest, changed, removed = refresh_indexes(folder_path, *saved, workers, compress, build_biphrase, memory_budget, postings_path)
+                st.sidebar.caption(f"Documents re-indexed: {changed}, removed: {removed}")
+            if saved is None or manifest != saved[1] or is_index_stale(index_path, folder_path, build_options):
+                save_indexes(index_path, folder_path, *indexes, build_options=build_options, manifest=manifest)
+            inverted_index, biphrase_index, soundex_index = indexes
+            if inverted_index is not st.session_state.get("inverted_index"):
+                # Built on the first spelling query, since the vocabulary of an on-disk index is not held in memory until then
+                st.session_state.spelling_index = None
             st.session_state.inverted_index = inverted_index
             st.session_state.biphrase_index = biphrase_index
             st.session_state.soundex_index = soundex_index
-            st.session_state.total_docs = total_docs
+            st.session_state.manifest = manifest
+            st.session_state.index_settings = index_settings
+            st.session_state.tokenizer = tokenizer
             st.session_state.indexes_created = True
         st.success("Indexes created successfully!")
 
-    # Displaying the four options for query types 
+    # Displaying the options for query types, biword queries only when the biphrase index was built
     if st.session_state.indexes_created:
-        query_type = st.selectbox("Select Query Type", ["Boolean Query", "Biword Query", "Proximity Query", "Soundex Query"])
+        # Queries have to be tokenized the same way as the indexed documents
+        set_tokenizer(st.session_state.tokenizer)
+        query_types = ["Boolean Query", "Phrase Query", "Proximity Query", "Soundex Query", "Spelling Query"]
+        if st.session_state.biphrase_index is not None:
+            query_types.insert(1, "Biword Query")
+        query_type = st.selectbox("Select Query Type", query_types)
 
         # Processing Boolean queries
         if query_type == "Boolean Query":
-            query = st.text_input("Enter your Boolean query:")
+            query = st.text_input("Enter your Boolean query:",
+                                  help="Terms may contain '*' wildcards, such as comput* or *tion, matched against the stemmed terms.")
             if st.button("Search"):
-                matched_docs = process_boolean_query(query, st.session_state.inverted_index, st.session_state.total_docs)
+                matched_docs = process_boolean_query(query, st.session_state.inverted_index)
                 display_matched_docs(matched_docs, folder_path)
 
         # Processing Biphrase queries
-        elif query_type == "Biphrase Query":
+        elif query_type == "Biword Query":
             query = st.text_input("Enter your Biword query:")
             if st.button("Search"):
                 matched_docs = biphrase_processing_function(query, st.session_state.biphrase_index)
                 display_matched_docs(matched_docs, folder_path)
 
+        # Processing exact phrase queries of any length
+        elif query_type == "Phrase Query":
+            query = st.text_input("Enter your Phrase query:")
+            if st.button("Search"):
+                matched_docs = phrase_query_processing_function(query, st.session_state.inverted_index)
+                display_matched_docs(matched_docs, folder_path)
+
         # Processing Proximity queries
         elif query_type == "Proximity Query":
             query = st.text_input("Enter your Proximity query:")
             proximity = st.number_input("Enter the proximity (in terms of number of words):", min_value=1, value=1)
+            ordered = st.checkbox("Terms must appear in the order of the query")
             if st.button("Search"):
-                matched_docs = proximity_processing_function(query, st.session_state.inverted_index, proximity)
-                display_matched_docs(matched_docs.keys(), folder_path)
+                try:
+                    matched_docs = proximity_processing_function(query, st.session_state.inverted_index, proximity, ordered)
+                except ValueError as error:
+                    st.error(str(error))
+                else:
+                    # Showing the documents where the terms are closest first
+                    display_matched_docs(sorted(matched_docs, key=matched_docs.get), folder_path)
 
         # Processing Soundex queries
         elif query_type == "Soundex Query":
@@ -310,6 +348,18 @@ def main():
                 matched_docs, matched_words = soundex_processing_function(query, st.session_state.soundex_index, st.session_state.inverted_index)
                 display_matched_docs(matched_docs, folder_path)
 
+        # Processing spelling tolerant queries
+        elif query_type == "Spelling Query":
+            query = st.text_input("Enter your Spelling query:")
+            max_distance = st.number_input("Maximum number of misspelled characters per word:", min_value=0, max_value=3, value=2)
+            if st.button("Search"):
+                if st.session_state.spelling_index is None:
+                    st.session_state.spelling_index = SpellingIndex(st.session_state.inverted_index.term_dictionary)
+                matched_docs, matched_words = spelling_processing_function(query, st.session_state.spelling_index, st.session_state.inverted_index, max_distance)
+                for term, words in matched_words.items():
+                    st.write(f"'{term}' matched with: {', '.join(words) or 'no indexed word'}")
+                display_matched_docs(matched_docs, folder_path)
+
     else:
         st.warning("Please create indexes first by entering the corpus path present in your system and clicking 'Create Indexes' button.")
 
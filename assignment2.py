@@ -3,10 +3,15 @@ import math
 import re
 import streamlit as st
 import base64
-from collections import defaultdict, Counter
-from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer
-from nltk.tokenize import word_tokenize
+import heapq
+import threading
+from array import array
+from collections import defaultdict, deque, Counter
+from corpus_manifest import build_manifest, update_manifest
+from indexing import iter_document_statistics, lnc_document_length
+from ranking import impact_ordered_scores, maxscore_top_k
+from vsm_segments import Segment, impact_scale, live_postings, merge_segments, select_merges
+from preprocessing import TOKENIZERS, get_preprocessor, iter_text_chunks, set_tokenizer
 
 # Preprocessing function
 def func_to_preprocess_text(text):
@@ -24,72 +29,258 @@ def func_to_preprocess_text(text):
     Returns:
         list: A list of preprocessed, stemmed tokken.
     """
-    #case folding the tokken
-    text = text.lower()
-    tokken = word_tokenize(text)
-    #removing the stop words
-    stop_words = set(stopwords.words('english'))
-    tokken = [word for word in tokken if word not in stop_words]
-    #perfomring stemming
-    ps = PorterStemmer()
-    tokken = [ps.stem(word) for word in tokken]
-    tokken = [re.sub(r'\W+', '', word) for word in tokken if re.sub(r'\W+', '', word) != '']
-    return tokken
+    return get_preprocessor().process(text)
 
 class VectorSpaceModel:
     """
     A Vector Space Model (VSM) class for indexing documents and ranking them based on cosine similarity to a query.
-    
+
+    Documents are stored in small immutable segments. Added documents are buffered until finalize writes them to a new
+    segment, deleted ones are masked with tombstones, and a tiered merge policy compacts the segments, dropping the
+    deleted documents, optionally in a background thread. The document frequencies of the terms only count the live
+    documents, so the IDFs stay correct across updates without a full rebuild.
+
     Attributes:
-        dictionary (defaultdict): A dictionary storing terms and the list of (doc_id, frequency) tuples for each term.
-        document_lenggth (defaultdict): Stores the document lengths for normalization.
-        document_frequencyy (int): A counter for the number of documents added to the VSM.
+        document_lenggth (defaultdict): Stores the document lengths of the live documents for normalization.
+        document_frequencyy (int): The number of live documents of the VSM.
+        live_df (Counter): The number of live documents containing every term.
+        doc_names (list): The identifiers of the documents, indexed by their doc number in order of addition.
+            A document updated or deleted keeps its old doc number here, a new one being given to its new version.
+        doc_numbers (dict): The doc number of every live document identifier.
+        segments (list): The Segment objects holding the postings of the finalized documents.
+        tombstones (set): The doc numbers of the deleted documents still present in a segment.
+        quantize_bits (int): The number of bits the impacts of the segments are quantized to, None for floats.
+        background_merges (bool): Whether the segments are merged in a background thread instead of by finalize.
+        ranking_stats (dict): The number of postings evaluated and skipped by the last ranked query.
+        finalized (bool): Whether every added document is in a segment and the IDF table is up to date.
+        idf (dict): The IDF of every term, precomputed by finalize.
+        impact_scale (float): The factor turning stored impacts into weights, 1 unless they are quantized.
     """
-    def __init__(self):
+    def __init__(self, background_merges=False):
         """
         Initializes the Vector Space Model by setting up necessary dictionaries and counters.
+
+        Args:
+            background_merges (bool): Whether to merge the segments in a background thread.
         """
-        self.dictionary = defaultdict(list)
         self.document_lenggth = defaultdict(float)
         self.document_frequencyy = 0
+        self.live_df = Counter()
+        self.doc_names = []
+        self.doc_numbers = {}
+        self.segments = []
+        self.tombstones = set()
+        self.quantize_bits = None
+        self.background_merges = background_merges
+        self.ranking_stats = {"evaluated": 0, "skipped": 0}
+        self.finalized = False
+        self.idf = {}
+        self.impact_scale = 1.0
+        # The documents added since the last finalize, doc number mapped to (term frequencies, document length)
+        self._pending = {}
+        # Guards the segments and tombstones against the background merges
+        self._lock = threading.Lock()
+        self._merge_thread = None
+        # Impact postings sorted by doc number and tie-breaking ranks by doc number, for document at a time ranking,
+        # built on first use
+        self._doc_ordered_postings = {}
+        self._tie_ranks = None
+        # Sparse matrix engine for batch and array accumulator ranking, compiled on first use
+        self._sparse_engine = None
 
     def update_docs_in_vsm(self, doc_id, text):
         """
         Adds a document to the VSM by processing its text and updating the term frequencies.
-        
+
+        A document already in the VSM is replaced.
+
         Args:
             doc_id (str): The identifier for the document.
             text (str): The content of the document to be processed.
         """
         tokken = func_to_preprocess_text(text)
         term_freq = Counter(tokken)
-        #calculating the term frequency of each term in the document of the corpus 
-        for term, freq in term_freq.items():
-            self.dictionary[term].append((doc_id, freq))
-        self.document_lenggth[doc_id] = math.sqrt(sum((1 + math.log10(freq))**2 for freq in term_freq.values()))
+        self.add_document_statistics(doc_id, term_freq, lnc_document_length(term_freq))
+
+    def add_document_statistics(self, doc_id, term_freq, doc_length):
+        """
+        Adds a document to the VSM from its already computed term frequencies and vector length.
+
+        A document already in the VSM is deleted first, so that updating it never leaves stale postings behind or
+        counts it twice in the document frequencies. The document is only ranked after the next finalize.
+
+        Args:
+            doc_id (str): The identifier for the document.
+            term_freq (Counter): The frequency of every term in the document.
+            doc_length (float): The length of the document vector, used for cosine normalization.
+        """
+        if doc_id in self.doc_numbers:
+            self.delete_document(doc_id)
+        #keeping the term frequency of each term in the document until the next segment is written
+        doc_number = len(self.doc_names)
+        self._pending[doc_number] = (term_freq, doc_length)
+        self.doc_numbers[doc_id] = doc_number
+        self.doc_names.append(doc_id)
+        self.document_lenggth[doc_id] = doc_length
         self.document_frequencyy += 1
+        self.live_df.update(term_freq.keys())
+        self.finalized = False
+
+    def delete_document(self, doc_id):
+        """
+        Deletes a document from the VSM, masking its postings with a tombstone until its segment is merged.
+
+        Args:
+            doc_id (str): The identifier for the document.
+
+        Returns:
+            bool: Whether the document was in the VSM.
+        """
+        if doc_id not in self.doc_numbers:
+            return False
+        doc_number = self.doc_numbers.pop(doc_id)
+        with self._lock:
+            if doc_number in self._pending:
+                terms = self._pending.pop(doc_number)[0].keys()
+            else:
+                terms = next(segment.doc_terms[doc_number] for segment in self.segments if doc_number in segment.doc_terms)
+                self.tombstones.add(doc_number)
+        self.live_df.subtract(terms)
+        for term in terms:
+            if self.live_df[term] <= 0:
+                del self.live_df[term]
+        del self.document_lenggth[doc_id]
+        self.document_frequencyy -= 1
+        self.finalized = False
+        return True
+
+    def finalize(self, quantize_bits=None):
+        """
+        Writes the documents added since the last call to a new segment and precomputes the IDF of every term, so that
+        ranking only accumulates precomputed impacts. The merge policy then compacts the segments.
+
+        The impact of a posting is the lnc weight of the term in the document divided by the document length, its
+        contribution to the cosine score per unit of query weight. The postings of every segment are sorted by
+        decreasing impact, which lets ranking stop early on the postings that can only add little to the scores.
+
+        Args:
+            quantize_bits (int): The number of bits to quantize the impacts to, at most 16, None to keep them as floats.
+                Quantized impacts take 1 or 2 bytes instead of 8, at the cost of slightly approximate scores. The
+                quantization step only depends on the number of bits, and changing it rewrites every segment.
+        """
+        with self._lock:
+            if quantize_bits != self.quantize_bits and self.segments:
+                documents = self._segment_documents()
+                self.segments = [Segment.from_documents(documents, quantize_bits, impact_scale(quantize_bits))]
+                self.tombstones = set()
+                self._pending = {}
+            self.quantize_bits = quantize_bits
+            self.impact_scale = impact_scale(quantize_bits)
+            if self._pending:
+                pending = [(doc_number, term_freq, doc_length) for doc_number, (term_freq, doc_length) in self._pending.items()]
+                self.segments = self.segments + [Segment.from_documents(pending, quantize_bits, self.impact_scale)]
+                self._pending = {}
+        self.idf = {term: math.log10(self.document_frequencyy / df) for term, df in self.live_df.items()}
+        self._doc_ordered_postings.clear()
+        self._tie_ranks = None
+        self._sparse_engine = None
+        self.finalized = True
+        self.merge_segments()
+
+    def _segment_documents(self):
+        # Recovers the statistics of every live document, from the segments and the pending documents
+        term_freqs = {doc_number: {} for doc_number in self.doc_numbers.values()}
+        for segment in self.segments:
+            for term, (doc_numbers, _, freqs) in segment.postings.items():
+                for doc_number, freq in zip(doc_numbers, freqs):
+                    if doc_number in term_freqs:
+                        term_freqs[doc_number][term] = freq
+        for doc_number, (term_freq, _) in self._pending.items():
+            term_freqs[doc_number] = term_freq
+        return [(doc_number, term_freq, self.document_lenggth[self.doc_names[doc_number]]) for doc_number, term_freq in term_freqs.items()]
+
+    def merge_segments(self, wait=False):
+        """
+        Merges the segments chosen by the tiered merge policy, until it chooses none.
+
+        Args:
+            wait (bool): With background merges, whether to wait for them to finish.
+        """
+        if not self.background_merges:
+            self._run_merges()
+            return
+        if self._merge_thread is None or not self._merge_thread.is_alive():
+            self._merge_thread = threading.Thread(target=self._run_merges, daemon=True)
+            self._merge_thread.start()
+        if wait:
+            self._merge_thread.join()
+
+    def _run_merges(self):
+        while True:
+            with self._lock:
+                tombstones = set(self.tombstones)
+                merges = select_merges(self.segments, tombstones)
+            if not merges:
+                return
+            for merged_segments in merges:
+                # Merging outside of the lock so that queries and updates go on meanwhile, the deletions made in the
+                # meantime staying masked by their tombstones
+                merged = merge_segments(merged_segments, tombstones)
+                dropped = {doc_number for segment in merged_segments for doc_number in segment.doc_terms if doc_number in tombstones}
+                with self._lock:
+                    # Dropping the merge if finalize rewrote the segments meanwhile
+                    if not all(any(segment is old for segment in self.segments) for old in merged_segments):
+                        return
+                    self.segments = [segment for segment in self.segments if all(segment is not old for old in merged_segments)]
+                    if len(merged):
+                        self.segments.append(merged)
+                    self.tombstones -= dropped
+
+    def _snapshot(self):
+        # The segments and tombstones of a query, consistent with each other even if a merge completes meanwhile
+        with self._lock:
+            return self.segments, set(self.tombstones)
+
+    def postings(self, term):
+        """
+        Returns the postings of a term in the live finalized documents.
+
+        Args:
+            term (str): The term.
+
+        Returns:
+            list: The (doc_id, frequency) tuples of the live documents containing the term, in order of doc number.
+        """
+        segments, tombstones = self._snapshot()
+        live = live_postings(segments, term, tombstones)
+        if live is None:
+            return []
+        doc_numbers, _, freqs = live
+        return [(self.doc_names[doc_number], freq) for doc_number, freq in sorted(zip(doc_numbers, freqs))]
 
     def calculate_inverse_doc_freq(self, term):
         """
         Calculates the Inverse Document Frequency (IDF) for a given term.
-        
+
         Args:
             term (str): The term for which IDF is calculated.
-        
+
         Returns:
             float: The IDF value for the term.
         """
         #calculating the inverse document frequcney to measure the rareness of the document
-        return math.log10(self.document_frequencyy / len(self.dictionary[term])) if term in self.dictionary else 0
+        if self.finalized:
+            return self.idf.get(term, 0)
+        return math.log10(self.document_frequencyy / self.live_df[term]) if term in self.live_df else 0
 
     def lnc_doc_calculation(self, term, freq):
         """
         Calculates the LNC (Logarithmic term frequency normalization) weight for a term in a document.
-        
+
         Args:
             term (str): The term for which the weight is calculated.
             freq (int): The term frequency in the document.
-        
+
         Returns:
             float: The LNC weight for the term.
         """
@@ -99,52 +290,190 @@ class VectorSpaceModel:
     def ltc_query_calculation(self, term, freq, idf):
         """
         Calculates the LTC (Logarithmic term frequency + IDF normalization) weight for a query term.
-        
+
         Args:
             term (str): The term in the query.
             freq (int): The frequency of the term in the query.
             idf (float): The Inverse Document Frequency (IDF) of the term.
-        
+
         Returns:
             float: The LTC weight for the term.
         """
         # calcualting the tf*idf weight
         return (1 + math.log10(freq)) * idf
 
-    def func_to_rank_documents(self, query):
+    def doc_ordered_postings(self, term):
+        """
+        Returns the live impact postings of a term sorted by doc number, along with its largest impact.
+
+        Args:
+            term (str): A term of the dictionary.
+
+        Returns:
+            tuple: The sorted array of doc numbers, the array of impacts aligned with it, and the largest impact,
+            or None if no live document contains the term.
+        """
+        if term not in self._doc_ordered_postings:
+            segments, tombstones = self._snapshot()
+            live = live_postings(segments, term, tombstones)
+            if live is None:
+                self._doc_ordered_postings[term] = None
+            else:
+                doc_numbers, impacts, _ = live
+                postings = sorted(zip(doc_numbers, impacts))
+                self._doc_ordered_postings[term] = (array('I', [doc_number for doc_number, _ in postings]),
+                                                    array(impacts.typecode, [impact for _, impact in postings]), impacts[0])
+        return self._doc_ordered_postings[term]
+
+    def func_to_rank_documents(self, query, k=10, pruning=False, min_contribution=None, array_accumulator=False):
         """
         Ranks documents based on cosine similarity to the query using term weights.
-        
+
+        Scores are accumulated from the precomputed impacts of the postings of every segment, finalizing the VSM first
+        if documents were added or deleted since. Only the k best documents are selected, with a bounded heap instead
+        of sorting every scored document, and the matching terms are only collected for them.
+
         Args:
             query (str): The search query entered by the user.
-        
+            k (int): The number of documents to return, None to rank every matching document.
+            pruning (bool): Whether to score document at a time, skipping the documents that cannot make the top k
+                (MaxScore), instead of scoring every posting of the query terms. Both return the same documents.
+            min_contribution (float): Without pruning, stop reading every impact-sorted posting list at the first
+                posting adding less than this to the cosine score, trading exactness for speed. None reads them in full.
+            array_accumulator (bool): Without pruning, accumulate the scores with NumPy into an array indexed by doc
+                number instead of a dict, which gives the same ranking up to floating point rounding.
+
         Returns:
-            list: A list of the top 10 ranked documents (doc_id, score).
-            dict: A dictionary of term matches for each document.
+            list: A list of the top k ranked documents (doc_id, score), best first and ties broken by doc_id.
+            dict: A dictionary of the frequency of the matched query terms for each of the ranked documents.
         """
+        if not self.finalized:
+            self.finalize(self.quantize_bits)
         query_terms = func_to_preprocess_text(query)
         query_frequency = Counter(query_terms)
         #calling the functions to calcualte the weighted scores of the query
         weighated_query = {term: self.ltc_query_calculation(term, freq, self.calculate_inverse_doc_freq(term)) for term, freq in query_frequency.items()}
         #normalising the qeighting scores
         query_length_norm = math.sqrt(sum(weight**2 for weight in weighated_query.values()))
+        #a query made only of unknown terms or of terms found in every document has no weight to rank with
+        if query_length_norm == 0:
+            self.ranking_stats = {"evaluated": 0, "skipped": 0}
+            return [], {}
+        if pruning and k is not None:
+            docu_ranking = self.rank_documents_maxscore(weighated_query, query_length_norm, k)
+            return docu_ranking, self.matched_query_terms(query_frequency, [doc_id for doc_id, _ in docu_ranking])
+
+        if array_accumulator:
+            ranking, self.ranking_stats = self.sparse_engine().rank_terms(weighated_query, query_length_norm, k, min_contribution)
+            docu_ranking = [(self.doc_names[doc_number], score) for doc_number, score in ranking]
+            return docu_ranking, self.matched_query_terms(query_frequency, [doc_id for doc_id, _ in docu_ranking])
+
+        #calculating the cosine simialirty between the document and the query by accumulating the impacts of every segment
+        segments, tombstones = self._snapshot()
+        term_postings = [(query_weight,) + segment.postings[term][:2] for term, query_weight in weighated_query.items()
+                         for segment in segments if term in segment.postings]
+        #the contributions are compared before scaling them to the normalised scores
+        if min_contribution is not None:
+            min_contribution = min_contribution * query_length_norm / self.impact_scale
+        scores, self.ranking_stats = impact_ordered_scores(term_postings, min_contribution)
+        #calcualting the normalised scores of the documents that are not deleted
+        normalised_scores = ((self.doc_names[doc_number], score * self.impact_scale / query_length_norm) for doc_number, score in scores.items()
+                             if doc_number not in tombstones)
+        #ranking the documents on the basis of the score generated, keeping only the k highest scored i.e. most relevant documents
+        if k is None:
+            docu_ranking = sorted(normalised_scores, key=lambda item: (-item[1], item[0]))
+        else:
+            docu_ranking = heapq.nsmallest(k, normalised_scores, key=lambda item: (-item[1], item[0]))
+        return docu_ranking, self.matched_query_terms(query_frequency, [doc_id for doc_id, _ in docu_ranking])
 
-        scores = defaultdict(float)
-        matched_terms = defaultdict(lambda: defaultdict(list))
-        #calculating the cosine simialirty between the document and the query
+    def rank_documents_maxscore(self, weighated_query, query_length_norm, k):
+        """
+        Ranks the top k documents for weighted query terms document at a time, with MaxScore dynamic pruning.
+
+        Args:
+            weighated_query (dict): The ltc weight of every query term, in query order.
+            query_length_norm (float): The length of the query vector.
+            k (int): The number of documents to return.
+
+        Returns:
+            list: A list of the top k ranked documents (doc_id, score), best first and ties broken by doc_id.
+        """
+        if self._tie_ranks is None:
+            self._tie_ranks = [0] * len(self.doc_names)
+            for rank, doc_number in enumerate(sorted(range(len(self.doc_names)), key=self.doc_names.__getitem__)):
+                self._tie_ranks[doc_number] = rank
+        term_postings = []
         for term, query_weight in weighated_query.items():
-            if term in self.dictionary:
-                for doc_id, freq in self.dictionary[term]:
-                    docuemtn_weight = self.lnc_doc_calculation(term, freq)
-                    scores[doc_id] += docuemtn_weight * query_weight
-                    matched_terms[doc_id][term] = freq  # Changed to freq instead of self.dictionary[term][doc_id]
-        #calcualting the normalised scores           
-        for doc_id in scores:
-            scores[doc_id] /= (self.document_lenggth[doc_id] * query_length_norm)
-        #ranking the documents on the basis of the score generated
-        docu_ranking = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
-        #returning the top 10 highest scored document i.e. most relevenat dcument
-        return docu_ranking[:10], matched_terms
+            postings = self.doc_ordered_postings(term)
+            if postings is not None:
+                term_postings.append((query_weight,) + postings)
+        ranking, self.ranking_stats = maxscore_top_k(term_postings, self.impact_scale, query_length_norm, self._tie_ranks, k)
+        return [(self.doc_names[doc_number], score) for doc_number, score in ranking]
+
+    def rank_batch(self, queries, k=10):
+        """
+        Ranks the top k documents of a batch of queries at once, as sparse matrix products with NumPy and SciPy.
+
+        The term-document weight matrix is compiled on the first call, and again after documents are added.
+        Meant for offline evaluation and replaying query logs, where the matched terms are not needed.
+
+        Args:
+            queries (list): The search queries.
+            k (int): The number of documents to return per query.
+
+        Returns:
+            list: Per query, the list of its top k ranked documents (doc_id, score), best first and ties broken by doc_id.
+        """
+        return self.sparse_engine().rank_batch(list(queries), k)
+
+    def sparse_engine(self):
+        """
+        Returns the NumPy and SciPy scoring engine of the VSM, compiling it on first use and after documents are added.
+
+        Returns:
+            SparseScoringEngine: The engine, holding the term-document weight matrix.
+        """
+        if not self.finalized:
+            self.finalize(self.quantize_bits)
+        if self._sparse_engine is None:
+            # Imported here so that the VSM works without NumPy and SciPy unless they are asked for
+            from vsm_sparse import SparseScoringEngine
+            self._sparse_engine = SparseScoringEngine(self)
+        return self._sparse_engine
+
+    def live_impact_postings(self):
+        """
+        Yields the live impact postings of every term, merged over the segments.
+
+        Yields:
+            tuple: A (term, doc numbers, impacts) tuple per term of a live document, sorted by decreasing impact.
+        """
+        segments, tombstones = self._snapshot()
+        for term in self.live_df:
+            live = live_postings(segments, term, tombstones)
+            if live is not None:
+                yield term, live[0], live[1]
+
+    def matched_query_terms(self, query_terms, doc_ids):
+        """
+        Collects the frequency of the query terms found in some documents, from the term frequencies kept per document
+        by the segments instead of from the postings of the query terms.
+
+        Args:
+            query_terms (iterable): The preprocessed query terms.
+            doc_ids (list): The identifiers of the documents.
+
+        Returns:
+            dict: A dictionary of document identifier to a dictionary of the frequency of every query term it contains.
+        """
+        query_terms = list(dict.fromkeys(query_terms))
+        segments, _ = self._snapshot()
+        matched_terms = {}
+        for doc_id in doc_ids:
+            doc_number = self.doc_numbers[doc_id]
+            segment = next(segment for segment in segments if doc_number in segment.doc_terms)
+            matched_terms[doc_id] = segment.term_frequencies(doc_number, query_terms)
+        return matched_terms
 
 
     # def get_matching_preview(self, doc_id, query, matched_terms, window_size=200):
@@ -245,10 +574,6 @@ class VectorSpaceModel:
         Returns:
             tuple: The highlighted preview text, best score, and starting position.
         """
-        # Reading the document from the corpus
-        with open(os.path.join(self.corpus_dir, doc_id), 'r', encoding='utf-8', errors='ignore') as file:
-            content = file.read()
-
         # Preprocessing the query into individual terms
         query_terms = set(func_to_preprocess_text(query))
         
@@ -256,29 +581,46 @@ class VectorSpaceModel:
         best_score = 0
         best_start = 0
         
-        # Tokenizing the content of the document while keeping track of original positions
-        tokken_with_positions = []
-        current_pos = 0
-        for token in word_tokenize(content.lower()):
-            start = content.lower().find(token, current_pos)
-            end = start + len(token)
-            tokken_with_positions.append((token, start, end))
-            current_pos = end
-        
-        # Find the most relevant portion of the document matching the query terms
-        for i in range(len(tokken_with_positions) - window_size + 1):
-            window = tokken_with_positions[i:i + window_size]
-            window_text = content[window[0][1]:window[-1][2]]
-            match_count = sum(1 for term in query_terms if term in [token for token, _, _ in window])
-            score = match_count / len(query_terms)
-            
-            # Track the best scoring window
-            if score > best_score:
-                best_score = score
-                best_window = window_text
-                best_start = window[0][1]
+        # Streaming the tokens of the document while keeping track of their original positions, with a sliding window of
+        # the last window_size tokens as (token, start, end, length of the text before it, text since the previous token)
+        window = deque()
+        # The number of occurrences of every query term in the window
+        window_matches = Counter()
+        chunk_start = 0
+        leftover = ''
+        with open(os.path.join(self.corpus_dir, doc_id), 'r', encoding='utf-8', errors='ignore') as file:
+            for chunk in iter_text_chunks(file):
+                lowered = chunk.lower()
+                current_pos = 0
+                for token in get_preprocessor().tokenize(lowered):
+                    start = lowered.find(token, current_pos)
+                    if start < 0:
+                        # Tokens rewritten by the tokenizer, such as the quotes of nltk, are not in the text and take no room in it
+                        start = end = current_pos
+                    else:
+                        end = start + len(token)
+                    window.append((token, chunk_start + start, chunk_start + end, len(leftover) + start - current_pos, leftover + chunk[current_pos:end]))
+                    leftover = ''
+                    current_pos = end
+                    if token in query_terms:
+                        window_matches[token] += 1
+                    if len(window) > window_size:
+                        dropped = window.popleft()[0]
+                        if dropped in query_terms:
+                            window_matches[dropped] -= 1
+                            if not window_matches[dropped]:
+                                del window_matches[dropped]
+                    
+                    # Find the most relevant portion of the document matching the query terms, the first window with the best score
+                    if len(window) == window_size and query_terms:
+                        score = len(window_matches) / len(query_terms)
+                        if score > best_score:
+                            best_score = score
+                            best_window = ''.join(text for _, _, _, _, text in window)[window[0][3]:]
+                            best_start = window[0][1]
+                leftover += chunk[current_pos:]
+                chunk_start += len(chunk)
         
-        # If a relevant portion is found, highlight the best window
         if best_score > 0:
             # Try to highlight and underline the entire query first
             highlighted_window = best_window
@@ -300,28 +642,54 @@ class VectorSpaceModel:
 
 
 
-def func_to_load_corpus_data(corpus_dir):
+def func_to_load_corpus_data(corpus_dir, workers=1, quantize_bits=None):
     """
-    Loads the document corpus and adds each document to the Vector Space Model.
+    Loads the document corpus, adds each document to the Vector Space Model and finalizes it for ranking.
     
     Args:
         corpus_dir (str): The directory path containing the documents.
+        workers (int): Number of worker processes that compute the term frequencies of the documents in parallel.
+        quantize_bits (int): The number of bits to quantize the posting impacts to, None to keep them exact.
     
     Returns:
         VectorSpaceModel: The initialized Vector Space Model with added documents.
     """
     vsm = VectorSpaceModel()
     vsm.corpus_dir = corpus_dir  # Added this line to define corpus_dir
-    #reading the content of the files and sending it to vsm fucntion to calcualte term frequency and posting lists
-    for filename in os.listdir(corpus_dir):
-        if filename.endswith(".txt"):
-            document_path = os.path.join(corpus_dir, filename)
-            with open(document_path, 'r', encoding='utf-8', errors='ignore') as file:
-                text = file.read()
-                vsm.update_docs_in_vsm(filename, text)
+    #the manifest of the corpus lets func_to_refresh_corpus_data only process the documents changed since
+    vsm.manifest = build_manifest(corpus_dir)
+    filenames = list(vsm.manifest)
+    #the workers tokenize the files and calculate the term frequency and length of each document, which are
+    #added to the posting lists in directory order so the result is the same as adding the files one by one
+    for filename, term_freq, doc_length in iter_document_statistics(corpus_dir, filenames, workers):
+        vsm.add_document_statistics(filename, term_freq, doc_length)
+    vsm.finalize(quantize_bits)
     return vsm
 
 
+def func_to_refresh_corpus_data(vsm, workers=1):
+    """
+    Updates a Vector Space Model loaded by func_to_load_corpus_data for the documents of its corpus added, modified or
+    removed since, only tokenizing the added and modified ones.
+    
+    Args:
+        vsm (VectorSpaceModel): The Vector Space Model of the corpus.
+        workers (int): Number of worker processes that compute the term frequencies of the changed documents in parallel.
+    
+    Returns:
+        tuple: The number of documents added or modified, and the number of documents removed.
+    """
+    vsm.manifest, changed, removed = update_manifest(vsm.corpus_dir, vsm.manifest)
+    for filename in removed:
+        vsm.delete_document(filename)
+    #adding a document already in the vsm replaces it
+    for filename, term_freq, doc_length in iter_document_statistics(vsm.corpus_dir, changed, workers):
+        vsm.add_document_statistics(filename, term_freq, doc_length)
+    if changed or removed:
+        vsm.finalize(vsm.quantize_bits)
+    return len(changed), len(removed)
+
+
 def func_to_print_relevant_docs(relevant_documents, corpus_pathh, query, vsm):
     """
     Displays the results of the search query.
@@ -383,18 +751,51 @@ def main():
     # Sidebar to enter the folder/corpus path as input
     corpus_pathh = st.sidebar.text_input("Enter the path to your corpus folder:", r"C:\Users\ravee\Downloads\Corpus")
 
+    # Number of processes used to tokenize the corpus
+    workers = st.sidebar.number_input("Number of worker processes for indexing:", min_value=1, value=os.cpu_count() or 1)
+
+    # Tokenizer used to split the documents and queries into words
+    tokenizer = st.sidebar.selectbox("Tokenizer:", TOKENIZERS)
+
+    # Number of ranked documents shown for a query
+    top_k = st.sidebar.number_input("Number of results:", min_value=1, value=10)
+
+    # Document at a time ranking skipping the documents that cannot make the top k, with the same results
+    pruning = st.sidebar.checkbox("Skip documents that cannot reach the top results (MaxScore)")
+
+    # Without pruning, the postings adding less than this to a score are not read, 0 reads them all
+    min_contribution = st.sidebar.number_input("Minimum score contribution (approximate ranking):", min_value=0.0, value=0.0, step=0.005, format="%.3f")
+
+    # Accumulating the scores with NumPy into an array indexed by document number instead of a dict
+    array_accumulator = st.sidebar.checkbox("Accumulate scores in a NumPy array")
+
+    # Storing the posting weights as 8 bit integers instead of floats, with slightly approximate scores
+    quantize = st.sidebar.checkbox("Quantize the document weights to 8 bits")
+
     if st.sidebar.button("Create VSM"):
         with st.spinner("Creating Vector Space Model..."):
-            vsm = func_to_load_corpus_data(corpus_pathh)
-            st.session_state.vsm = vsm
+            set_tokenizer(tokenizer)
+            #the vsm of this session is updated for the documents changed since it was created, if built the same way
+            vsm_settings = (corpus_pathh, tokenizer, quantize)
+            if st.session_state.get("vsm_settings") == vsm_settings:
+                changed, removed = func_to_refresh_corpus_data(st.session_state.vsm, workers)
+                st.sidebar.caption(f"Documents re-processed: {changed}, removed: {removed}")
+            else:
+                st.session_state.vsm = func_to_load_corpus_data(corpus_pathh, workers, 8 if quantize else None)
+            st.session_state.vsm_settings = vsm_settings
+            st.session_state.tokenizer = tokenizer
             st.session_state.vsm_created = True
         st.success("Vector Space Model created successfully!")
     # take the input query from the user and send it for precrossing and cosine cimiarity score calculation
     if st.session_state.vsm_created:
+        #queries have to be tokenized the same way as the documents of the vsm
+        set_tokenizer(st.session_state.tokenizer)
         query = st.text_input("Enter your search query:")
         if st.button("Search"):
-            relevant_documents, matched_terms = st.session_state.vsm.func_to_rank_documents(query)
+            relevant_documents, matched_terms = st.session_state.vsm.func_to_rank_documents(query, int(top_k), pruning, min_contribution or None, array_accumulator)
             st.session_state.vsm.matched_terms = matched_terms
+            ranking_stats = st.session_state.vsm.ranking_stats
+            st.caption(f"Postings evaluated: {ranking_stats['evaluated']}, skipped: {ranking_stats['skipped']}")
             func_to_print_relevant_docs(relevant_documents, corpus_pathh, query, st.session_state.vsm)
     #dispaly warning if there is no path of corpus
     else:
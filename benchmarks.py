@@ -0,0 +1,830 @@
+import os
+import math
+import time
+import heapq
+import random
+import timeit
+import pickle
+import fnmatch
+import argparse
+import tempfile
+import tracemalloc
+from collections import Counter
+import assignment1
+import assignment2
+from indexing import add_biphrases, build_indexes, iter_document_statistics
+from array import array
+from postings import (BiphraseIndex, CompressedPostingList, DocumentTable, PostingListBuilder, Vocabulary,
+                      gallop_intersect, intersect_sorted)
+from preprocessing import TOKENIZERS, TextPreprocessor, get_preprocessor
+from spelling import SpellingIndex, bounded_edit_distance
+from spimi import build_spimi_index
+from term_dictionary import TermDictionary
+from query_parser import evaluate_boolean_query, parse_boolean_query
+
+
+def read_corpus(folder_path):
+    """
+    Reads the content of every text document of a corpus folder.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+
+    Returns:
+        list: A list of (filename, content) tuples.
+    """
+    documents = []
+    for filename in sorted(os.listdir(folder_path)):
+        if filename.endswith(".txt"):
+            with open(os.path.join(folder_path, filename), 'r', encoding='utf-8', errors='ignore') as file:
+                documents.append((filename, file.read()))
+    return documents
+
+
+def benchmark_preprocessing(folder_path):
+    """
+    Measures the throughput of the preprocessing pipeline on a corpus, with and without the stem cache.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+
+    Returns:
+        dict: Documents and tokens per second of the uncached and cached pipelines, and the hit rate of the stem cache.
+    """
+    texts = [content for _, content in read_corpus(folder_path)]
+    report = {"documents": len(texts)}
+    for name, cache_size in (("uncached", 0), ("cached", None)):
+        preprocessor = TextPreprocessor() if cache_size is None else TextPreprocessor(stem_cache_size=cache_size)
+        start = time.perf_counter()
+        tokens = sum(len(document_tokens) for document_tokens in preprocessor.process_batch(texts))
+        elapsed = time.perf_counter() - start
+        report[f"{name}_docs_per_second"] = len(texts) / elapsed
+        report[f"{name}_tokens_per_second"] = tokens / elapsed
+        if cache_size is None:
+            cache_info = preprocessor.normalize_token.cache_info()
+            report["stem_cache_hit_rate"] = cache_info.hits / max(1, cache_info.hits + cache_info.misses)
+    return report
+
+
+def compare_tokenizers(folder_path, top_differences=15):
+    """
+    Compares the preprocessed output and the speed of the NLTK and regex tokenizers on a corpus.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+        top_differences (int): Number of most frequent differing tokens to report in each direction.
+
+    Returns:
+        dict: Tokenizing and full preprocessing time of each tokenizer, the number of documents and tokens whose
+        output differs, and the tokens produced more often by one tokenizer than by the other.
+    """
+    texts = [content.lower() for _, content in read_corpus(folder_path)]
+    report = {"documents": len(texts)}
+    outputs = {}
+    for tokenizer in TOKENIZERS:
+        preprocessor = TextPreprocessor(tokenizer)
+        start = time.perf_counter()
+        for text in texts:
+            preprocessor.tokenize(text)
+        report[f"{tokenizer}_tokenize_seconds"] = time.perf_counter() - start
+        start = time.perf_counter()
+        outputs[tokenizer] = preprocessor.process_batch(texts)
+        report[f"{tokenizer}_preprocess_seconds"] = time.perf_counter() - start
+        report[f"{tokenizer}_tokens"] = sum(len(tokens) for tokens in outputs[tokenizer])
+    report["tokenize_speedup"] = report["nltk_tokenize_seconds"] / max(report["regex_tokenize_seconds"], 1e-9)
+    report["preprocess_speedup"] = report["nltk_preprocess_seconds"] / max(report["regex_preprocess_seconds"], 1e-9)
+
+    # Multiset differences of the normalized tokens, document by document
+    only_nltk, only_regex = Counter(), Counter()
+    differing_documents = 0
+    for nltk_tokens, regex_tokens in zip(outputs["nltk"], outputs["regex"]):
+        if nltk_tokens != regex_tokens:
+            differing_documents += 1
+            nltk_counts, regex_counts = Counter(nltk_tokens), Counter(regex_tokens)
+            only_nltk.update(nltk_counts - regex_counts)
+            only_regex.update(regex_counts - nltk_counts)
+    report["differing_documents"] = differing_documents
+    report["tokens_only_in_nltk"] = sum(only_nltk.values())
+    report["tokens_only_in_regex"] = sum(only_regex.values())
+    report["most_common_only_in_nltk"] = only_nltk.most_common(top_differences)
+    report["most_common_only_in_regex"] = only_regex.most_common(top_differences)
+    return report
+
+
+def benchmark_index_memory(folder_path):
+    """
+    Compares the memory taken by the array-backed inverted index with the nested dict of filename to list of positions layout it replaced.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+
+    Returns:
+        dict: Memory of the inverted index in both layouts, in megabytes, and the reduction factor.
+    """
+    tracemalloc.start()
+    inverted_index, _, _ = build_indexes(folder_path, build_biphrase=False)
+    report = {}
+    name = "inverted"
+    # Measuring each layout as the memory allocated while copying the index into it
+    start = tracemalloc.get_traced_memory()[0]
+    array_copy = {term: pickle.loads(pickle.dumps(postings)) for term, postings in inverted_index.items()}
+    array_megabytes = (tracemalloc.get_traced_memory()[0] - start) / 2**20
+    start = tracemalloc.get_traced_memory()[0]
+    doc_names = inverted_index.documents.names
+    legacy_copy = {term: {doc_names[doc_id]: list(positions) for doc_id, positions in postings.items()} for term, postings in inverted_index.items()}
+    legacy_megabytes = (tracemalloc.get_traced_memory()[0] - start) / 2**20
+    report[f"{name}_array_megabytes"] = array_megabytes
+    report[f"{name}_legacy_megabytes"] = legacy_megabytes
+    report[f"{name}_reduction"] = legacy_megabytes / max(array_megabytes, 1e-9)
+    del array_copy, legacy_copy
+    tracemalloc.stop()
+    return report
+
+
+def benchmark_compression(folder_path):
+    """
+    Measures the compression ratio of delta and variable-byte encoded posting lists and their decoding throughput.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+
+    Returns:
+        dict: Raw and compressed size of the inverted index, the compression ratio, and the
+        number of document IDs and positions decoded per second.
+    """
+    inverted_index, _, _ = build_indexes(folder_path, build_biphrase=False)
+    report = {}
+    name = "inverted"
+    compressed = [CompressedPostingList.from_postings(postings) for postings in inverted_index.values()]
+    raw_bytes = sum(postings.data.itemsize * len(postings.data) for postings in inverted_index.values())
+    compressed_bytes = sum(len(postings.data) for postings in compressed)
+    report[f"{name}_raw_megabytes"] = raw_bytes / 2**20
+    report[f"{name}_compressed_megabytes"] = compressed_bytes / 2**20
+    report[f"{name}_compression_ratio"] = raw_bytes / max(compressed_bytes, 1)
+
+    start = time.perf_counter()
+    doc_ids = sum(len(postings.doc_ids) for postings in compressed)
+    report[f"{name}_doc_ids_decoded_per_second"] = doc_ids / (time.perf_counter() - start)
+    start = time.perf_counter()
+    positions = sum(len(positions) for postings in compressed for _, positions in postings.items())
+    report[f"{name}_positions_decoded_per_second"] = positions / (time.perf_counter() - start)
+    return report
+
+
+def _microseconds_per_call(function, repeats):
+    """
+    Times a function with timeit, keeping the fastest of five rounds so that one-off stalls do not skew the mean.
+
+    Args:
+        function (callable): The function to time, called without arguments.
+        repeats (int): Number of calls per round.
+
+    Returns:
+        float: Microseconds per call.
+    """
+    return min(timeit.repeat(function, number=repeats, repeat=5)) / repeats * 1e6
+
+
+def benchmark_boolean(folder_path, repeats=200):
+    """
+    Compares Boolean AND, OR and NOT over the most frequent terms evaluated on document bitmaps and on sets of document IDs.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+        repeats (int): Number of times each operation is evaluated per timing round.
+
+    Returns:
+        dict: Microseconds per operation with bitmaps and with sets, the speedups, and the number of terms having a precomputed bitmap.
+    """
+    inverted_index, _, _ = build_indexes(folder_path)
+    first, second = sorted(inverted_index, key=lambda term: len(inverted_index[term]), reverse=True)[:2]
+    all_ids = set(range(len(inverted_index.documents)))
+    # Each evaluation looks the posting lists up as a query would
+    operations = {
+        "and": (lambda: inverted_index.doc_set(first) & inverted_index.doc_set(second),
+                lambda: set(inverted_index[first].keys()) & set(inverted_index[second].keys())),
+        "or": (lambda: inverted_index.doc_set(first) | inverted_index.doc_set(second),
+               lambda: set(inverted_index[first].keys()) | set(inverted_index[second].keys())),
+        "and_not": (lambda: inverted_index.doc_set(first) - inverted_index.doc_set(second),
+                    lambda: set(inverted_index[first].keys()) - set(inverted_index[second].keys())),
+        "not": (lambda: inverted_index.all_docs() - inverted_index.doc_set(first),
+                lambda: all_ids - set(inverted_index[first].keys())),
+    }
+    report = {"documents": len(inverted_index.documents), "dense_terms": len(inverted_index.bitmaps)}
+    for name, (bitmap_operation, set_operation) in operations.items():
+        report[f"{name}_bitmap_microseconds"] = _microseconds_per_call(bitmap_operation, repeats)
+        report[f"{name}_set_microseconds"] = _microseconds_per_call(set_operation, repeats)
+        report[f"{name}_speedup"] = report[f"{name}_set_microseconds"] / max(report[f"{name}_bitmap_microseconds"], 1e-9)
+    return report
+
+
+def benchmark_query_planner(folder_path, repeats=200):
+    """
+    Compares planned evaluation of nested Boolean queries with their evaluation in the order they are written.
+
+    The queries mix the most frequent terms of the corpus, whose bitmaps are precomputed, with less frequent terms
+    whose bitmaps are built on demand, a rare term and a term missing from the index, so that reordering the AND
+    operands and stopping on an empty intermediate result can pay off.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+        repeats (int): Number of times each query is evaluated per timing round.
+
+    Returns:
+        dict: Microseconds per query in written order and planned, and the speedup, for every query, or the reason
+        a query was skipped when the corpus has too few terms to build it.
+    """
+    inverted_index, _, _ = build_indexes(folder_path)
+    by_frequency = sorted(inverted_index, key=lambda term: len(inverted_index[term]), reverse=True)
+    frequent = by_frequency[:4]
+    sparse = [term for term in by_frequency if term not in inverted_index.bitmaps][:3]
+    rare = by_frequency[-1] if by_frequency else None
+    # Every query with the number of frequent terms and of terms without a precomputed bitmap it needs
+    queries = {
+        "nested": (3, 2, lambda: f"({frequent[0]} or {frequent[1]}) and {sparse[0]} and {sparse[1]} and not ({frequent[2]} or {rare})"),
+        "rare_last": (0, 3, lambda: f"{sparse[0]} and {sparse[1]} and {sparse[2]} and {rare}"),
+        "missing_first": (2, 0, lambda: f"not {frequent[0]} and not {frequent[1]} and qqqqzzzz"),
+        "negations": (4, 0, lambda: f"{frequent[0]} and not {frequent[1]} and not {frequent[2]} and not {frequent[3]}"),
+    }
+    report = {"documents": len(inverted_index.documents)}
+    for name, (frequent_needed, sparse_needed, build_query) in queries.items():
+        if len(frequent) < frequent_needed or len(sparse) < sparse_needed:
+            report[f"{name}_skipped"] = (f"needs {frequent_needed} frequent terms and {sparse_needed} terms without a precomputed bitmap, "
+                                         f"the corpus has {len(by_frequency)} terms, {len(sparse)} of them without a bitmap")
+            continue
+        tree = parse_boolean_query(build_query())
+        in_order = _microseconds_per_call(lambda: evaluate_boolean_query(tree, inverted_index, optimize=False), repeats)
+        planned = _microseconds_per_call(lambda: evaluate_boolean_query(tree, inverted_index, optimize=True), repeats)
+        report[f"{name}_in_order_microseconds"] = in_order
+        report[f"{name}_planned_microseconds"] = planned
+        report[f"{name}_speedup"] = in_order / max(planned, 1e-9)
+    return report
+
+
+def benchmark_intersection(folder_path=None, long_length=200000, ratios=(1, 4, 16, 64, 256, 1024, 4096), repeats=5):
+    """
+    Microbenchmarks the intersection of sorted document ID lists for increasingly skewed list lengths.
+
+    The lists are random sorted arrays of document IDs like the posting lists of the index, so no corpus is needed.
+
+    Args:
+        folder_path (str): Unused, accepted for the command line interface.
+        long_length (int): Number of document IDs of the longer list.
+        ratios (tuple): The ratios between the lengths of the longer and of the shorter list.
+        repeats (int): Number of intersections per timing round.
+
+    Returns:
+        dict: Microseconds per intersection with galloping, with a set of the shorter list, and with
+        intersect_sorted, which picks between the two, for every ratio.
+    """
+    generator = random.Random(0)
+    universe = range(4 * long_length)
+    large = array('I', sorted(generator.sample(universe, long_length)))
+    report = {}
+    for ratio in ratios:
+        small = array('I', sorted(generator.sample(universe, max(1, long_length // ratio))))
+        report[f"ratio_{ratio}_gallop_microseconds"] = _microseconds_per_call(lambda: gallop_intersect(small, large), repeats)
+        report[f"ratio_{ratio}_hash_microseconds"] = _microseconds_per_call(lambda: sorted(set(small).intersection(large)), repeats)
+        report[f"ratio_{ratio}_intersect_sorted_microseconds"] = _microseconds_per_call(lambda: intersect_sorted(small, large), repeats)
+    return report
+
+
+def benchmark_phrase_queries(folder_path, queries_per_length=50, lengths=(2, 3, 4)):
+    """
+    Compares phrase queries answered from the positions of the inverted index with biword queries on the biphrase index.
+
+    The phrases are runs of consecutive tokens drawn at random from the documents, so every one of them has a match.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+        queries_per_length (int): Number of phrases drawn for every phrase length.
+        lengths (tuple): The phrase lengths, in tokens.
+
+    Returns:
+        dict: Build time and memory with and without the biphrase index, then for every phrase length the mean latency
+        of both paths and the mean number of documents the biphrase path returns that do not contain the phrase.
+    """
+    report = {}
+    tracemalloc.start()
+    for name, build_biphrase in (("with_biphrase", True), ("without_biphrase", False)):
+        start_memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        indexes = build_indexes(folder_path, build_biphrase=build_biphrase)
+        report[f"build_{name}_seconds"] = time.perf_counter() - start
+        report[f"build_{name}_megabytes"] = (tracemalloc.get_traced_memory()[0] - start_memory) / 2**20
+        if build_biphrase:
+            inverted_index, biphrase_index, _ = indexes
+        del indexes
+    tracemalloc.stop()
+
+    generator = random.Random(0)
+    documents = [get_preprocessor().process(content) for _, content in read_corpus(folder_path)]
+    for length in lengths:
+        long_enough = [tokens for tokens in documents if len(tokens) > length]
+        if not long_enough:
+            report[f"length_{length}_skipped"] = f"no document has more than {length} tokens"
+            continue
+        phrases = []
+        for _ in range(queries_per_length):
+            tokens = generator.choice(long_enough)
+            start = generator.randrange(len(tokens) - length)
+            phrases.append(" ".join(tokens[start:start + length]))
+        start = time.perf_counter()
+        biword_results = [assignment1.biphrase_processing_function(phrase, biphrase_index) for phrase in phrases]
+        report[f"length_{length}_biword_milliseconds"] = (time.perf_counter() - start) / len(phrases) * 1e3
+        start = time.perf_counter()
+        phrase_results = [assignment1.phrase_query_processing_function(phrase, inverted_index) for phrase in phrases]
+        report[f"length_{length}_phrase_milliseconds"] = (time.perf_counter() - start) / len(phrases) * 1e3
+        report[f"length_{length}_biword_false_positives"] = sum(
+            len(biword_docs - phrase_docs) for biword_docs, phrase_docs in zip(biword_results, phrase_results)) / len(phrases)
+    return report
+
+
+def benchmark_biphrase_memory(folder_path):
+    """
+    Compares the biphrase index keyed by packed term IDs with the string-keyed positional biphrase index it replaced.
+
+    Both indexes are built from the same preprocessed documents, while tracing the memory allocated by the build.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+
+    Returns:
+        dict: Build time, peak memory allocated during the build and memory retained by the index, in megabytes,
+        of both layouts, and the reduction factors.
+    """
+    token_lists = get_preprocessor().process_batch(content for _, content in read_corpus(folder_path))
+
+    def build_string_keyed():
+        # The layout replaced: one "first second" string per pair, with the positions of the pair in every document
+        index = {}
+        for doc_id, tokens in enumerate(token_lists):
+            biphrase_positions = {}
+            for position in range(len(tokens) - 1):
+                biphrase_positions.setdefault(f"{tokens[position]} {tokens[position + 1]}", []).append(position)
+            for biphrase, positions in biphrase_positions.items():
+                index.setdefault(biphrase, PostingListBuilder()).add(doc_id, positions)
+        return {biphrase: postings.build() for biphrase, postings in index.items()}
+
+    def build_packed():
+        postings, vocabulary = {}, {}
+        for doc_id, tokens in enumerate(token_lists):
+            add_biphrases(postings, vocabulary, doc_id, tokens)
+        return BiphraseIndex.from_postings(postings, Vocabulary(vocabulary), DocumentTable())
+
+    report = {"biphrases": None}
+    for name, build in (("string_keyed", build_string_keyed), ("packed", build_packed)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        index = build()
+        report[f"{name}_build_seconds"] = time.perf_counter() - start
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report[f"{name}_peak_megabytes"] = peak / 2**20
+        report[f"{name}_retained_megabytes"] = retained / 2**20
+        if name == "packed":
+            report["biphrases"] = len(index)
+        del index
+    report["peak_reduction"] = report["string_keyed_peak_megabytes"] / max(report["packed_peak_megabytes"], 1e-9)
+    report["retained_reduction"] = report["string_keyed_retained_megabytes"] / max(report["packed_retained_megabytes"], 1e-9)
+    return report
+
+
+def benchmark_spelling(folder_path, queries=200, max_distance=2):
+    """
+    Compares spelling correction with the k-gram index against a scan of the whole vocabulary.
+
+    The queries are vocabulary terms with one or two random character edits.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+        queries (int): Number of misspelled words looked up, at most one per vocabulary term.
+        max_distance (int): The largest edit distance of the matches.
+
+    Returns:
+        dict: The vocabulary size, the index build time, the number of queries, the mean lookup time with the index and
+        with a full scan, the mean number of candidate terms verified by the index, and whether both returned the same
+        matches.
+    """
+    inverted_index, _, _ = build_indexes(folder_path, build_biphrase=False)
+    start = time.perf_counter()
+    spelling_index = SpellingIndex(inverted_index.term_dictionary)
+    report = {"terms": len(spelling_index.terms), "build_seconds": time.perf_counter() - start}
+
+    # A vocabulary smaller than the number of queries is looked up in full, one misspelling per term
+    queries = min(queries, len(spelling_index.terms))
+    report["queries"] = queries
+    if not queries:
+        report["skipped"] = "the corpus has no terms"
+        return report
+    generator = random.Random(0)
+    alphabet = "abcdefghijklmnopqrstuvwxyz"
+    words = []
+    for term in generator.sample(spelling_index.terms, queries):
+        characters = list(term)
+        for _ in range(generator.randint(1, 2)):
+            edit = generator.randrange(3) if characters else 1
+            position = generator.randrange(len(characters) + (edit == 1))
+            if edit == 0:
+                del characters[position]
+            elif edit == 1:
+                characters.insert(position, generator.choice(alphabet))
+            else:
+                characters[position] = generator.choice(alphabet)
+        words.append("".join(characters))
+
+    start = time.perf_counter()
+    indexed = [spelling_index.lookup(word, max_distance) for word in words]
+    report["indexed_milliseconds"] = (time.perf_counter() - start) / queries * 1e3
+    report["mean_candidates"] = sum(len(spelling_index.candidates(word, max_distance)) for word in words) / queries
+    start = time.perf_counter()
+    scanned = []
+    for word in words:
+        matches = [(term, bounded_edit_distance(word, term, max_distance)) for term in spelling_index.terms]
+        scanned.append(sorted(((term, distance) for term, distance in matches if distance is not None), key=lambda match: (match[1], match[0])))
+    report["scan_milliseconds"] = (time.perf_counter() - start) / queries * 1e3
+    report["speedup"] = report["scan_milliseconds"] / max(report["indexed_milliseconds"], 1e-9)
+    report["same_matches"] = indexed == scanned
+    return report
+
+
+def benchmark_wildcard(folder_path, synthetic_terms=1000000, patterns=("comput*", "*tion", "c*t*r", "*zz*q", "re*ing")):
+    """
+    Measures wildcard expansion over the term dictionary, on the vocabulary of a corpus and on a large synthetic one.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+        synthetic_terms (int): Number of random terms of the synthetic vocabulary.
+        patterns (tuple): The wildcard patterns expanded.
+
+    Returns:
+        dict: For both vocabularies, the number of terms, the build time, and for every pattern the number of matching
+        terms and the expansion time, along with whether the matches agree with a scan of the whole vocabulary.
+    """
+    inverted_index, _, _ = build_indexes(folder_path, build_biphrase=False)
+    generator = random.Random(0)
+    alphabet = "abcdefghijklmnopqrstuvwxyz"
+    synthetic = {"".join(generator.choice(alphabet) for _ in range(generator.randint(3, 12))) for _ in range(synthetic_terms)}
+
+    report = {}
+    for name, terms in (("corpus", list(inverted_index)), ("synthetic", list(synthetic))):
+        start = time.perf_counter()
+        dictionary = TermDictionary(terms)
+        report[f"{name}_terms"] = len(dictionary)
+        report[f"{name}_build_seconds"] = time.perf_counter() - start
+        same_matches = True
+        for pattern in patterns:
+            matches = dictionary.expand(pattern)
+            report[f"{name}_{pattern}_matches"] = len(matches)
+            report[f"{name}_{pattern}_milliseconds"] = _microseconds_per_call(lambda: dictionary.expand(pattern), 3) / 1e3
+            same_matches = same_matches and matches == sorted(term for term in terms if fnmatch.fnmatchcase(term, pattern))
+        report[f"{name}_same_matches"] = same_matches
+    return report
+
+
+def _broad_vsm_queries(vsm, lengths=(1, 2, 4, 8)):
+    # Queries made of the most frequent terms that are not in every document, matching most of the collection
+    by_frequency = sorted(vsm.live_df, key=vsm.live_df.get, reverse=True)
+    broad_terms = [term for term in by_frequency if vsm.live_df[term] < vsm.document_frequencyy]
+    return {f"broad_{length}": " ".join(broad_terms[:length]) for length in lengths}
+
+
+def benchmark_vsm_ranking(folder_path, k=10, repeats=5):
+    """
+    Compares ranking the k best documents with a bounded heap against sorting every scored document.
+
+    The queries are made of the most frequent terms of the corpus, so that they score most of the documents.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+        k (int): The number of documents returned.
+        repeats (int): Number of times each query is ranked per timing round.
+
+    Returns:
+        dict: For every query, the number of scored documents, the milliseconds per query with the full sort and with
+        the heap, the speedup, and whether both returned the same top k.
+    """
+    vsm = assignment2.func_to_load_corpus_data(folder_path)
+    report = {"documents": vsm.document_frequencyy}
+    for name, query in _broad_vsm_queries(vsm).items():
+        ranking, _ = vsm.func_to_rank_documents(query, None)
+        report[f"{name}_scored"] = len(ranking)
+        full_sort = _microseconds_per_call(lambda: vsm.func_to_rank_documents(query, None), repeats) / 1e3
+        top_k = _microseconds_per_call(lambda: vsm.func_to_rank_documents(query, k), repeats) / 1e3
+        report[f"{name}_full_sort_milliseconds"] = full_sort
+        report[f"{name}_top_k_milliseconds"] = top_k
+        report[f"{name}_speedup"] = full_sort / max(top_k, 1e-9)
+        report[f"{name}_same_top_k"] = vsm.func_to_rank_documents(query, k)[0] == ranking[:k]
+    return report
+
+
+def benchmark_vsm_pruning(folder_path, k=10, repeats=5):
+    """
+    Compares exhaustive term-at-a-time VSM ranking with document-at-a-time ranking with MaxScore pruning.
+
+    Besides broad queries, the queries mix frequent terms with rarer ones, whose higher weights let the frequent
+    terms become non-essential once the top k fills up.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+        k (int): The number of documents returned.
+        repeats (int): Number of times each query is ranked per timing round.
+
+    Returns:
+        dict: For every query, the postings evaluated and skipped with pruning, the milliseconds per query of both
+        strategies, the speedup, and whether both returned the same top k.
+    """
+    vsm = assignment2.func_to_load_corpus_data(folder_path)
+    by_frequency = sorted(vsm.live_df, key=vsm.live_df.get, reverse=True)
+    queries = _broad_vsm_queries(vsm, lengths=(2, 4))
+    middle = by_frequency[len(by_frequency) // 100:len(by_frequency) // 100 + 2]
+    queries["mixed"] = " ".join(by_frequency[1:4] + middle)
+    queries["frequent_and_rare"] = " ".join(by_frequency[1:3] + by_frequency[len(by_frequency) // 10:len(by_frequency) // 10 + 1])
+    report = {"documents": vsm.document_frequencyy}
+    for name, query in queries.items():
+        exhaustive = vsm.func_to_rank_documents(query, k)
+        pruned = vsm.func_to_rank_documents(query, k, pruning=True)
+        report[f"{name}_evaluated"] = vsm.ranking_stats["evaluated"]
+        report[f"{name}_skipped"] = vsm.ranking_stats["skipped"]
+        exhaustive_time = _microseconds_per_call(lambda: vsm.func_to_rank_documents(query, k), repeats) / 1e3
+        pruned_time = _microseconds_per_call(lambda: vsm.func_to_rank_documents(query, k, pruning=True), repeats) / 1e3
+        report[f"{name}_exhaustive_milliseconds"] = exhaustive_time
+        report[f"{name}_maxscore_milliseconds"] = pruned_time
+        report[f"{name}_speedup"] = exhaustive_time / max(pruned_time, 1e-9)
+        report[f"{name}_same_top_k"] = exhaustive == pruned
+    return report
+
+
+def _rank_from_frequencies(vsm, query, k):
+    # Reference ranking recomputing the IDF and the lnc weight of every posting visited, as before finalize existed
+    query_frequency = Counter(assignment2.func_to_preprocess_text(query))
+    weights = {term: (1 + math.log10(freq)) * math.log10(vsm.document_frequencyy / vsm.live_df[term])
+               for term, freq in query_frequency.items() if term in vsm.live_df}
+    norm = math.sqrt(sum(weight ** 2 for weight in weights.values()))
+    scores = Counter()
+    for term, query_weight in weights.items():
+        for doc_id, freq in vsm.postings(term):
+            scores[doc_id] += (1 + math.log10(freq)) * query_weight
+    normalised = ((doc_id, score / (vsm.document_lenggth[doc_id] * norm)) for doc_id, score in scores.items())
+    return heapq.nsmallest(k, normalised, key=lambda item: (-item[1], item[0]))
+
+
+def benchmark_vsm_impacts(folder_path, k=10, repeats=5, min_contributions=(0.005, 0.01, 0.02)):
+    """
+    Measures VSM ranking from precomputed, impact-sorted postings, exact, quantized and with early termination.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+        k (int): The number of documents returned.
+        repeats (int): Number of times each query is ranked per timing round.
+        min_contributions (tuple): The minimum score contributions tried for impact-ordered early termination.
+
+    Returns:
+        dict: The finalize time and impact bytes with float and 8 bit impacts, and for every query the milliseconds
+        per query recomputing the weights and accumulating impacts, the speedup, and the number of top k documents
+        shared with the exact ranking when quantized and when terminating early, with the fraction of postings skipped.
+    """
+    vsm = assignment2.func_to_load_corpus_data(folder_path)
+    report = {"documents": vsm.document_frequencyy}
+    for name, bits in (("quantized", 8), ("float", None)):
+        start = time.perf_counter()
+        vsm.finalize(bits)
+        report[f"{name}_finalize_seconds"] = time.perf_counter() - start
+        report[f"{name}_impact_bytes"] = sum(impacts.itemsize * len(impacts) for segment in vsm.segments for _, impacts, _ in segment.postings.values())
+    vsm.finalize()
+    quantized = assignment2.func_to_load_corpus_data(folder_path, quantize_bits=8)
+
+    queries = _broad_vsm_queries(vsm, lengths=(2, 4))
+    by_frequency = sorted(vsm.live_df, key=vsm.live_df.get, reverse=True)
+    queries["mixed"] = " ".join(by_frequency[1:4] + by_frequency[len(by_frequency) // 100:len(by_frequency) // 100 + 2])
+    for name, query in queries.items():
+        exact, _ = vsm.func_to_rank_documents(query, k)
+        exact_ids = {doc_id for doc_id, _ in exact}
+        recomputed = _microseconds_per_call(lambda: _rank_from_frequencies(vsm, query, k), repeats) / 1e3
+        accumulated = _microseconds_per_call(lambda: vsm.func_to_rank_documents(query, k), repeats) / 1e3
+        report[f"{name}_recomputed_milliseconds"] = recomputed
+        report[f"{name}_impacts_milliseconds"] = accumulated
+        report[f"{name}_speedup"] = recomputed / max(accumulated, 1e-9)
+        report[f"{name}_same_as_recomputed"] = [doc_id for doc_id, _ in exact] == [doc_id for doc_id, _ in _rank_from_frequencies(vsm, query, k)]
+        report[f"{name}_quantized_overlap"] = len(exact_ids & {doc_id for doc_id, _ in quantized.func_to_rank_documents(query, k)[0]})
+        for min_contribution in min_contributions:
+            approximate, _ = vsm.func_to_rank_documents(query, k, min_contribution=min_contribution)
+            stats = vsm.ranking_stats
+            report[f"{name}_min_{min_contribution}_overlap"] = len(exact_ids & {doc_id for doc_id, _ in approximate})
+            report[f"{name}_min_{min_contribution}_skipped_fraction"] = stats["skipped"] / max(stats["evaluated"] + stats["skipped"], 1)
+    return report
+
+
+def benchmark_vsm_batch(folder_path, queries=2000, k=10):
+    """
+    Compares ranking a batch of queries as sparse matrix products with ranking them one at a time.
+
+    The queries are random combinations of one to five terms, mostly frequent ones so that they match many documents.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+        queries (int): Number of queries in the batch.
+        k (int): The number of documents returned per query.
+
+    Returns:
+        dict: The time to compile the term-document matrix, the queries per second ranked in a batch and one at a
+        time, the speedup, and the number of queries for which both returned the same documents in the same order.
+    """
+    vsm = assignment2.func_to_load_corpus_data(folder_path)
+    generator = random.Random(0)
+    by_frequency = sorted(vsm.live_df, key=vsm.live_df.get, reverse=True)
+    batch = [" ".join(generator.choice(by_frequency[:300] if generator.random() < 0.7 else by_frequency) for _ in range(generator.randint(1, 5)))
+             for _ in range(queries)]
+    report = {"documents": vsm.document_frequencyy, "queries": queries}
+    start = time.perf_counter()
+    vsm.rank_batch(batch[:1], k)
+    report["compile_seconds"] = time.perf_counter() - start
+    start = time.perf_counter()
+    batch_rankings = vsm.rank_batch(batch, k)
+    report["batch_queries_per_second"] = queries / (time.perf_counter() - start)
+    start = time.perf_counter()
+    single_rankings = [vsm.func_to_rank_documents(query, k)[0] for query in batch]
+    report["single_queries_per_second"] = queries / (time.perf_counter() - start)
+    report["speedup"] = report["batch_queries_per_second"] / report["single_queries_per_second"]
+    report["same_rankings"] = sum([doc_id for doc_id, _ in batch_ranking] == [doc_id for doc_id, _ in single_ranking]
+                                  for batch_ranking, single_ranking in zip(batch_rankings, single_rankings))
+    return report
+
+
+def benchmark_vsm_accumulators(folder_path, queries=300, k=10):
+    """
+    Compares the per-query latency of VSM ranking accumulating the scores in a dict and in a NumPy array.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+        queries (int): Number of random queries of one to five terms, mostly frequent ones, ranked with both.
+        k (int): The number of documents returned per query.
+
+    Returns:
+        dict: The mean, median and 95th percentile milliseconds per query of both accumulators over the random queries,
+        the milliseconds per broad query of both, the mean speedup, and the number of queries ranked the same by both.
+    """
+    vsm = assignment2.func_to_load_corpus_data(folder_path)
+    vsm.sparse_engine()
+    generator = random.Random(0)
+    by_frequency = sorted(vsm.live_df, key=vsm.live_df.get, reverse=True)
+    random_queries = [" ".join(generator.choice(by_frequency[:300] if generator.random() < 0.7 else by_frequency) for _ in range(generator.randint(1, 5)))
+                      for _ in range(queries)]
+    report = {"documents": vsm.document_frequencyy}
+    rankings = {}
+    for name, array_accumulator in (("dict", False), ("array", True)):
+        latencies = []
+        rankings[name] = []
+        for query in random_queries:
+            start = time.perf_counter()
+            ranking, _ = vsm.func_to_rank_documents(query, k, array_accumulator=array_accumulator)
+            latencies.append((time.perf_counter() - start) * 1e3)
+            rankings[name].append([doc_id for doc_id, _ in ranking])
+        latencies.sort()
+        report[f"{name}_mean_milliseconds"] = sum(latencies) / len(latencies)
+        report[f"{name}_median_milliseconds"] = latencies[len(latencies) // 2]
+        report[f"{name}_p95_milliseconds"] = latencies[int(len(latencies) * 0.95)]
+        for query_name, query in _broad_vsm_queries(vsm, lengths=(2, 8)).items():
+            report[f"{query_name}_{name}_milliseconds"] = _microseconds_per_call(
+                lambda: vsm.func_to_rank_documents(query, k, array_accumulator=array_accumulator), 5) / 1e3
+    report["mean_speedup"] = report["dict_mean_milliseconds"] / max(report["array_mean_milliseconds"], 1e-9)
+    report["same_rankings"] = sum(first == second for first, second in zip(rankings["dict"], rankings["array"]))
+    return report
+
+
+def benchmark_vsm_incremental(folder_path, changes=300, batch_size=50, k=10):
+    """
+    Measures updating a loaded VSM in place, against rebuilding it from every document.
+
+    A third of the changes replace the statistics of a document with those of another one, a third delete a document
+    and a third add a new one, applied in batches each followed by finalize.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+        changes (int): The number of documents added, updated or deleted.
+        batch_size (int): The number of changes per finalize.
+        k (int): The number of documents returned per query compared.
+
+    Returns:
+        dict: The seconds of a full build, of every batch of changes with its finalize and of rebuilding the updated
+        collection, the number of segments and tombstones left, and whether the updated VSM ranks the broad queries
+        like the rebuilt one, with and without pruning.
+    """
+    filenames = sorted(filename for filename in os.listdir(folder_path) if filename.endswith(".txt"))
+    statistics = list(iter_document_statistics(folder_path, filenames))
+    start = time.perf_counter()
+    vsm = assignment2.VectorSpaceModel()
+    for filename, term_freq, doc_length in statistics:
+        vsm.add_document_statistics(filename, term_freq, doc_length)
+    vsm.finalize()
+    report = {"documents": vsm.document_frequencyy, "build_seconds": time.perf_counter() - start}
+
+    generator = random.Random(0)
+    live = {filename: (term_freq, doc_length) for filename, term_freq, doc_length in statistics}
+    batch_seconds = []
+    for batch_start in range(0, changes, batch_size):
+        start = time.perf_counter()
+        for change in range(batch_start, min(batch_start + batch_size, changes)):
+            _, term_freq, doc_length = generator.choice(statistics)
+            if change % 3 == 0:
+                doc_id = generator.choice(sorted(live))
+            elif change % 3 == 1:
+                doc_id = generator.choice(sorted(live))
+                vsm.delete_document(doc_id)
+                del live[doc_id]
+                continue
+            else:
+                doc_id = f"added_{change}.txt"
+            vsm.add_document_statistics(doc_id, term_freq, doc_length)
+            live[doc_id] = (term_freq, doc_length)
+        vsm.finalize()
+        batch_seconds.append(time.perf_counter() - start)
+    report["batch_mean_seconds"] = sum(batch_seconds) / max(len(batch_seconds), 1)
+    report["batch_max_seconds"] = max(batch_seconds, default=0.0)
+    report["segments"] = len(vsm.segments)
+    report["tombstones"] = len(vsm.tombstones)
+
+    start = time.perf_counter()
+    rebuilt = assignment2.VectorSpaceModel()
+    for doc_id, (term_freq, doc_length) in live.items():
+        rebuilt.add_document_statistics(doc_id, term_freq, doc_length)
+    rebuilt.finalize()
+    report["rebuild_seconds"] = time.perf_counter() - start
+    queries = list(_broad_vsm_queries(rebuilt).values())
+    report["same_rankings"] = all(vsm.func_to_rank_documents(query, k) == rebuilt.func_to_rank_documents(query, k) for query in queries)
+    report["same_pruned_rankings"] = all(vsm.func_to_rank_documents(query, k, pruning=True) == rebuilt.func_to_rank_documents(query, k, pruning=True)
+                                         for query in queries)
+    return report
+
+
+def benchmark_spimi(folder_path, memory_budgets=(1, 4, 16)):
+    """
+    Compares the peak memory of building the inverted index in memory and with SPIMI under several memory budgets.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+        memory_budgets (tuple): The memory budgets tried, in megabytes.
+
+    Returns:
+        dict: The seconds and peak traced megabytes of every build, and whether every SPIMI index holds the same
+        postings as the in-memory one.
+    """
+    get_preprocessor().process("warming up the tokenizer")
+    tracemalloc.start()
+    start = time.perf_counter()
+    inverted_index, _, _ = build_indexes(folder_path, build_biphrase=False)
+    report = {"documents": len(inverted_index.documents), "in_memory_seconds": time.perf_counter() - start,
+              "in_memory_peak_megabytes": tracemalloc.get_traced_memory()[1] / 2**20}
+    tracemalloc.stop()
+    with tempfile.TemporaryDirectory() as index_folder:
+        for memory_budget in memory_budgets:
+            tracemalloc.start()
+            start = time.perf_counter()
+            disk_index = build_spimi_index(folder_path, os.path.join(index_folder, "index"), memory_budget << 20)
+            report[f"spimi_{memory_budget}mb_seconds"] = time.perf_counter() - start
+            report[f"spimi_{memory_budget}mb_peak_megabytes"] = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+            report[f"spimi_{memory_budget}mb_same_postings"] = (sorted(disk_index) == sorted(inverted_index)
+                                                                and all(disk_index[term] == postings for term, postings in inverted_index.items()))
+            disk_index.close()
+    return report
+
+
+BENCHMARKS = {
+    "preprocessing": benchmark_preprocessing,
+    "tokenizers": compare_tokenizers,
+    "index_memory": benchmark_index_memory,
+    "compression": benchmark_compression,
+    "boolean": benchmark_boolean,
+    "query_planner": benchmark_query_planner,
+    "intersection": benchmark_intersection,
+    "phrase_queries": benchmark_phrase_queries,
+    "biphrase_memory": benchmark_biphrase_memory,
+    "spelling": benchmark_spelling,
+    "wildcard": benchmark_wildcard,
+    "vsm_ranking": benchmark_vsm_ranking,
+    "vsm_pruning": benchmark_vsm_pruning,
+    "vsm_impacts": benchmark_vsm_impacts,
+    "vsm_batch": benchmark_vsm_batch,
+    "vsm_accumulators": benchmark_vsm_accumulators,
+    "vsm_incremental": benchmark_vsm_incremental,
+    "spimi": benchmark_spimi,
+}
+
+
+def main():
+    """
+    Command line entry point: runs one benchmark on a corpus folder and prints its report.
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks of the indexing and query code on a corpus folder.")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("folder_path", help="Path to the corpus folder.")
+    args = parser.parse_args()
+
+    report = BENCHMARKS[args.benchmark](args.folder_path)
+    for key, value in report.items():
+        print(f"{key}: {value:.4f}" if isinstance(value, float) else f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import hashlib
+
+# Size of the blocks the documents are hashed in, so that large files are never read into memory at once
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_digest(path):
+    """
+    Computes the SHA-256 digest of the content of a file.
+
+    Args:
+        path (str): Path of the file.
+
+    Returns:
+        bytes: The 32 byte digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+def scan_corpus(folder_path):
+    """
+    Lists the text documents of a corpus folder with their size and modification time, without reading them.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+
+    Returns:
+        dict: The filename of every text document mapped to a (size, modification time in nanoseconds) tuple,
+        in directory listing order.
+    """
+    stats = {}
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            if entry.name.endswith(".txt"):
+                stat = entry.stat()
+                stats[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    return stats
+
+
+def build_manifest(folder_path):
+    """
+    Records the size, modification time and content digest of every text document of a corpus folder.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+
+    Returns:
+        dict: The filename of every text document mapped to a (size, modification time, digest) tuple.
+    """
+    return {filename: stat + (file_digest(os.path.join(folder_path, filename)),)
+            for filename, stat in scan_corpus(folder_path).items()}
+
+
+def update_manifest(folder_path, manifest):
+    """
+    Compares a corpus folder with the manifest recorded when it was last indexed.
+
+    Only the documents whose size or modification time differ from the manifest are read, to compare their digest,
+    so a folder that did not change costs a directory scan. A document that was touched without changing its content
+    is not reported as modified.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+        manifest (dict): The manifest of the folder as last indexed, as returned by build_manifest.
+
+    Returns:
+        tuple: The manifest of the folder as it is now, the list of the filenames of the added or modified documents
+        in directory listing order, and the list of the filenames of the removed documents.
+    """
+    current = {}
+    changed = []
+    for filename, stat in scan_corpus(folder_path).items():
+        recorded = manifest.get(filename)
+        if recorded is not None and recorded[:2] == stat:
+            current[filename] = recorded
+            continue
+        digest = file_digest(os.path.join(folder_path, filename))
+        current[filename] = stat + (digest,)
+        if recorded is None or recorded[2] != digest:
+            changed.append(filename)
+    removed = [filename for filename in manifest if filename not in current]
+    return current, changed, removed
@@ -0,0 +1,158 @@
+import gc
+import os
+import struct
+import pickle
+import hashlib
+from preprocessing import get_tokenizer
+
+# File layout of a saved index:
+#   header  = magic (5 bytes) | format version (uint16) | corpus fingerprint (32 bytes) | payload length (uint64)
+#   payload = pickled dict holding the inverted, biphrase and soundex indexes (array-backed posting lists since version 2,
+#             bitmaps of the dense terms since version 3, biphrases keyed by packed term IDs since version 4,
+#             soundex codes mapped to terms instead of postings since version 5, term dictionary since version 6,
+#             corpus manifest and build settings since version 7, compressed posting lists pickled as their bytes
+#             only since version 8, document frequencies in the directory of the on-disk index since version 9,
+#             on-disk index pickled as its path only since version 10)
+# The version must be bumped whenever the in-memory structure of the indexes changes, so that files written
+# by an older build are treated as stale instead of being loaded into the wrong shape.
+MAGIC = b"IRIDX"
+FORMAT_VERSION = 10
+_HEADER = struct.Struct("<5sH32sQ")
+
+
+def corpus_fingerprint(folder_path, build_options=None):
+    """
+    Computes a fingerprint of the corpus folder from the name, size and modification time of every text document.
+
+    The selected tokenizer and the build options are part of the fingerprint as well, since indexes
+    built with other settings are laid out or tokenized differently.
+
+    Args:
+        folder_path (str): Path to the folder containing the text documents.
+        build_options (dict): The options the indexes were built with, such as compression.
+
+    Returns:
+        bytes: A 32 byte SHA-256 digest that changes whenever a document is added, removed or modified or the settings change.
+    """
+    digest = hashlib.sha256(_build_settings(build_options).encode("utf-8"))
+    for filename in sorted(os.listdir(folder_path)):
+        if filename.endswith(".txt"):
+            stat = os.stat(os.path.join(folder_path, filename))
+            digest.update(f"{filename}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8", "surrogateescape"))
+    return digest.digest()
+
+
+def _build_settings(build_options=None):
+    # The tokenizer and build options, which indexes can only be reused or updated with
+    options = sorted((build_options or {}).items())
+    return f"tokenizer={get_tokenizer()}\noptions={options!r}\n"
+
+
+def save_indexes(index_path, folder_path, inverted_index, biphrase_index, soundex_index, build_options=None, manifest=None):
+    """
+    Writes the indexes of a corpus to disk together with the fingerprint of the corpus they were built from.
+
+    Args:
+        index_path (str): Path of the index file to write.
+        folder_path (str): Path to the corpus folder the indexes were built from.
+        inverted_index (dict): The inverted index of the document collection.
+        biphrase_index (dict): The biphrase index of the document collection.
+        soundex_index (dict): The soundex index of the document collection.
+        build_options (dict): The options the indexes were built with.
+        manifest (dict): The manifest of the corpus folder the indexes were built from, which lets them be updated
+            for the documents changed since instead of rebuilt.
+    """
+    payload = pickle.dumps({
+        "inverted_index": inverted_index,
+        "biphrase_index": biphrase_index,
+        "soundex_index": soundex_index,
+        "settings": _build_settings(build_options),
+        "manifest": manifest,
+    }, protocol=pickle.HIGHEST_PROTOCOL)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, corpus_fingerprint(folder_path, build_options), len(payload))
+
+    # Writing to a temporary file first so that an interrupted save never leaves a truncated index behind
+    temp_path = index_path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(header)
+        file.write(payload)
+    os.replace(temp_path, index_path)
+
+
+def read_index_header(index_path):
+    """
+    Reads the header of a saved index file.
+
+    Args:
+        index_path (str): Path of the index file.
+
+    Returns:
+        tuple: The format version, corpus fingerprint and payload length, or None if the file is missing or is not an index file.
+    """
+    try:
+        with open(index_path, "rb") as file:
+            header = file.read(_HEADER.size)
+    except OSError:
+        return None
+    if len(header) != _HEADER.size:
+        return None
+    magic, version, fingerprint, payload_length = _HEADER.unpack(header)
+    if magic != MAGIC:
+        return None
+    return version, fingerprint, payload_length
+
+
+def is_index_stale(index_path, folder_path, build_options=None):
+    """
+    Checks whether a saved index can no longer be used for the given corpus folder.
+
+    Args:
+        index_path (str): Path of the index file.
+        folder_path (str): Path to the corpus folder.
+        build_options (dict): The options the indexes are expected to be built with.
+
+    Returns:
+        bool: True if the file is missing, was written by a different format version or with other options, or the corpus changed since it was saved.
+    """
+    header = read_index_header(index_path)
+    if header is None:
+        return True
+    version, fingerprint, _ = header
+    return version != FORMAT_VERSION or fingerprint != corpus_fingerprint(folder_path, build_options)
+
+
+def load_indexes_for_update(index_path, build_options=None):
+    """
+    Loads saved indexes together with the manifest of the corpus they were built from, even if the corpus changed since,
+    so that they can be updated for the changed documents only.
+
+    Args:
+        index_path (str): Path of the index file.
+        build_options (dict): The options the indexes are expected to be built with.
+
+    Returns:
+        tuple: The (inverted index, biphrase index, soundex index) tuple and the manifest of the corpus, or None if the
+        saved index is missing, truncated, was written by a different format version, or with another tokenizer or options.
+    """
+    header = read_index_header(index_path)
+    if header is None or header[0] != FORMAT_VERSION:
+        return None
+    indexes = _read_payload(index_path)
+    if indexes is None or indexes["settings"] != _build_settings(build_options) or indexes["manifest"] is None:
+        return None
+    return (indexes["inverted_index"], indexes["biphrase_index"], indexes["soundex_index"]), indexes["manifest"]
+
+
+def _read_payload(index_path):
+    # Unpickles the payload of an index file, None if it is truncated
+    with open(index_path, "rb") as file:
+        payload_length = _HEADER.unpack(file.read(_HEADER.size))[3]
+        payload = file.read(payload_length)
+    if len(payload) != payload_length:
+        return None
+    # The payload holds millions of small containers, so the cyclic garbage collector is paused while they are allocated
+    gc.disable()
+    try:
+        return pickle.loads(payload)
+    finally:
+        gc.enable()
@@ -0,0 +1,334 @@
+import os
+import math
+from array import array
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import chain
+from postings import (TERM_ID_BITS, TERM_ID_MASK, BiphraseIndex, DocumentTable, InvertedIndex, PostingListBuilder,
+                      Vocabulary, compress_index)
+from preprocessing import get_preprocessor, get_tokenizer, soundex
+from term_dictionary import TermDictionary
+
+# Every worker gets several shards so that a few unusually large documents do not leave the other cores idle
+SHARDS_PER_WORKER = 4
+
+
+def add_biphrases(biphrase_index, vocabulary, doc_id, tokens):
+    """
+    Adds the pairs of consecutive tokens of a document to a biphrase index, keyed by the packed term IDs of both tokens.
+    
+    Args:
+        biphrase_index (dict): The biphrase keys mapped to an array of the IDs of the documents containing them.
+        vocabulary (dict): The term ID of every term, new terms get the next free ID.
+        doc_id (int): The ID of the document, larger than the IDs already in the index.
+        tokens (iterable): The preprocessed tokens of the document, consumed once.
+    """
+    biphrases = set()
+    previous = None
+    for token in tokens:
+        term_id = vocabulary.setdefault(token, len(vocabulary))
+        if previous is not None:
+            biphrases.add(previous << TERM_ID_BITS | term_id)
+        previous = term_id
+    for biphrase in biphrases:
+        if biphrase not in biphrase_index:
+            biphrase_index[biphrase] = array('I')
+        biphrase_index[biphrase].append(doc_id)
+
+
+def collect_positions(tokens, term_positions):
+    """
+    Records the position of every token of a document while passing the tokens on, so that a stream of tokens can
+    feed the positional index and the biphrase index in a single pass.
+    
+    Args:
+        tokens (iterable): The preprocessed tokens of the document.
+        term_positions (dict): Every term mapped to the list of its positions, filled as the tokens are consumed.
+    
+    Yields:
+        str: Every token, in order.
+    """
+    for position, token in enumerate(tokens):
+        term_positions.setdefault(token, []).append(position)
+        yield token
+
+
+def index_documents(folder_path, filenames, first_doc_id=0, tokenizer=None, build_biphrase=True):
+    """
+    Create the inverted index and biphrase index of a subset of the documents of a folder.
+    
+    Args:
+        folder_path (str): Path to the folder containing text documents.
+        filenames (list): Names of the documents of the folder to index.
+        first_doc_id (int): Document ID of the first document, the following documents get consecutive IDs.
+        tokenizer (str): The tokenizer to preprocess the documents with, defaults to the one selected in this process.
+        build_biphrase (bool): Whether to index the pairs of consecutive tokens, the biphrase index is left empty otherwise.
+    
+    Returns:
+        tuple: A tuple containing the inverted index, with a PostingListBuilder per term, the biphrase index, as a
+        (terms, postings) tuple where postings maps biphrase keys packed from the local term IDs, i.e. the positions
+        in terms, to an array of document IDs.
+    """
+    inverted_index = {}
+    biphrase_index = {}
+    # Term IDs local to these documents, translated to the IDs of the shared vocabulary when the indexes are merged
+    vocabulary = {}
+    preprocessor = get_preprocessor(tokenizer)
+    
+    for doc_id, filename in enumerate(filenames, first_doc_id):
+        filepath = os.path.join(folder_path, filename)
+        
+        # Streaming the tokens of the document, collecting the positions of every term before appending them to the
+        # posting lists, and populating the biphrase index from the same stream
+        term_positions = {}
+        with open(filepath, 'r', encoding='utf-8', errors='ignore') as file:
+            tokens = collect_positions(preprocessor.iter_tokens(file), term_positions)
+            if build_biphrase:
+                add_biphrases(biphrase_index, vocabulary, doc_id, tokens)
+            else:
+                deque(tokens, maxlen=0)
+        
+        # Populating the regular inverted index
+        for token, positions in term_positions.items():
+            if token not in inverted_index:
+                inverted_index[token] = PostingListBuilder()
+            inverted_index[token].add(doc_id, positions)
+    
+    return inverted_index, (list(vocabulary), biphrase_index)
+
+
+def create_soundex_index(terms):
+    """
+    Create the soundex index of a vocabulary, computing the soundex code of every distinct term once.
+    
+    Args:
+        terms (iterable): The distinct terms of the corpus.
+    
+    Returns:
+        dict: The soundex code mapped to the sorted tuple of the terms having that code.
+    """
+    soundex_index = {}
+    for term in terms:
+        soundex_index.setdefault(soundex(term), []).append(term)
+    return {soundex_code: tuple(sorted(words)) for soundex_code, words in soundex_index.items()}
+
+
+def merge_indexes(partial_indexes, documents):
+    """
+    Merge the indexes built for consecutive ranges of document IDs into a single set of indexes.
+    
+    Args:
+        partial_indexes (iterable): Tuples of (inverted index, biphrase index) as returned by index_documents,
+            in increasing order of document IDs.
+        documents (DocumentTable): The filenames and IDs of all the indexed documents.
+    
+    Returns:
+        tuple: A tuple containing the merged inverted index, with a PostingList per term, the merged BiphraseIndex,
+        keyed by the term IDs of a vocabulary shared by all the partial indexes, and the soundex index of the vocabulary.
+    """
+    inverted_index = InvertedIndex(documents)
+    biphrase_index = {}
+    vocabulary = Vocabulary()
+    
+    # The partial indexes hold increasing ranges of document IDs, so appending their posting lists keeps them sorted
+    for partial_inverted, (local_terms, partial_biphrase) in partial_indexes:
+        for term, postings in partial_inverted.items():
+            if term in inverted_index:
+                inverted_index[term].extend(postings)
+            else:
+                inverted_index[term] = postings
+        # Translating the biphrase keys from the term IDs of the partial index to those of the shared vocabulary
+        term_ids = [vocabulary.add(term) for term in local_terms]
+        for local_biphrase, doc_ids in partial_biphrase.items():
+            biphrase = term_ids[local_biphrase >> TERM_ID_BITS] << TERM_ID_BITS | term_ids[local_biphrase & TERM_ID_MASK]
+            if biphrase in biphrase_index:
+                biphrase_index[biphrase].extend(doc_ids)
+            else:
+                biphrase_index[biphrase] = doc_ids
+    
+    # Packing every posting list into its final compact form
+    for term, postings in inverted_index.items():
+        inverted_index[term] = postings.build()
+    biphrase_index = BiphraseIndex.from_postings(biphrase_index, vocabulary, documents)
+    
+    # The sorted term dictionary answers the wildcard terms of Boolean queries
+    inverted_index.term_dictionary = TermDictionary(inverted_index)
+    
+    # The soundex index only maps codes to terms, whose postings are those of the inverted index
+    return inverted_index, biphrase_index, create_soundex_index(inverted_index)
+
+
+def build_indexes(folder_path, workers=1, compress=False, build_biphrase=True):
+    """
+    Create the inverted index, biphrase index, and soundex index of all text documents of a folder, optionally in parallel.
+    
+    Every document gets a dense integer ID, in the order of the directory listing. With more than one worker
+    the documents are split into shards, each shard is tokenized and indexed in a separate process,
+    and the partial indexes are merged in the parent process.
+    
+    Args:
+        folder_path (str): Path to the folder containing text documents.
+        workers (int): Number of worker processes to use, 1 builds the indexes in the current process.
+        compress (bool): Whether to store the posting lists delta and variable-byte compressed.
+        build_biphrase (bool): Whether to build the biphrase index. Phrase queries can be answered from the positions
+            of the inverted index alone, so skipping it saves the memory and time it takes.
+    
+    Returns:
+        tuple: A tuple containing the inverted index, biphrase index, and soundex index of the text documents,
+        the biphrase index being None if it was not built.
+    """
+    filenames = [filename for filename in os.listdir(folder_path) if filename.endswith(".txt")]
+    documents = DocumentTable(filenames)
+    indexes = merge_indexes(_index_shards(folder_path, filenames, 0, workers, build_biphrase), documents)
+    return _finish_indexes(indexes, compress, build_biphrase)
+
+
+def update_indexes(folder_path, indexes, changed, removed, workers=1, compress=False, build_biphrase=True):
+    """
+    Updates the indexes of a corpus folder for the documents added, modified or removed since they were built.
+    
+    Only the added and modified documents are read and tokenized. The postings of the other documents are copied
+    from the current indexes, renumbered so that the document IDs stay dense: the unchanged documents keep their
+    order and the changed ones get the last IDs. The indexes are then merged and packed as by build_indexes.
+    
+    Args:
+        folder_path (str): Path to the folder containing text documents.
+        indexes (tuple): The inverted index, biphrase index (None if not built) and soundex index to update.
+        changed (list): Filenames of the documents added or modified since the indexes were built.
+        removed (list): Filenames of the documents removed since the indexes were built.
+        workers (int): Number of worker processes to use, 1 indexes the changed documents in the current process.
+        compress (bool): Whether to store the posting lists delta and variable-byte compressed.
+        build_biphrase (bool): Whether to build the biphrase index.
+    
+    Returns:
+        tuple: A tuple containing the updated inverted index, biphrase index, and soundex index, the indexes
+        given being returned as they are if no document changed.
+    """
+    if not changed and not removed:
+        return indexes
+    inverted_index, biphrase_index, _ = indexes
+    stale = set(changed) | set(removed)
+    old_names = inverted_index.documents.names
+    # The new ID of every unchanged document, None for the documents that are modified or removed
+    new_ids = []
+    kept = []
+    for name in old_names:
+        new_ids.append(None if name in stale else len(kept))
+        if name not in stale:
+            kept.append(name)
+    documents = DocumentTable(kept + changed)
+    
+    # Copying the postings of the unchanged documents, whose new IDs are in the same order as the old ones
+    kept_inverted = {}
+    for term, postings in inverted_index.items():
+        builder = PostingListBuilder()
+        for doc_id, positions in postings.items():
+            if new_ids[doc_id] is not None:
+                builder.add(new_ids[doc_id], positions)
+        if builder.doc_ids:
+            kept_inverted[term] = builder
+    # Copying the biphrases of the unchanged documents, with the term IDs of their own terms only so that the
+    # vocabulary does not keep the terms of the removed documents
+    local_terms = {}
+    kept_biphrase = {}
+    if build_biphrase and biphrase_index is not None:
+        for key, doc_ids in biphrase_index.items():
+            kept_doc_ids = array('I', [new_ids[doc_id] for doc_id in doc_ids if new_ids[doc_id] is not None])
+            if kept_doc_ids:
+                first, second = biphrase_index.terms_of(key)
+                local_key = local_terms.setdefault(first, len(local_terms)) << TERM_ID_BITS | local_terms.setdefault(second, len(local_terms))
+                kept_biphrase[local_key] = kept_doc_ids
+    
+    partial_indexes = chain([(kept_inverted, (list(local_terms), kept_biphrase))],
+                            _index_shards(folder_path, changed, len(kept), workers, build_biphrase))
+    indexes = merge_indexes(partial_indexes, documents)
+    return _finish_indexes(indexes, compress, build_biphrase)
+
+
+def _index_shards(folder_path, filenames, first_doc_id, workers, build_biphrase):
+    # Yields the partial indexes of consecutive shards of the documents, indexed in worker processes when workers > 1
+    workers = max(1, min(workers, len(filenames)))
+    if workers == 1:
+        yield index_documents(folder_path, filenames, first_doc_id, build_biphrase=build_biphrase)
+        return
+    shard_size = math.ceil(len(filenames) / (workers * SHARDS_PER_WORKER))
+    first_doc_ids = range(first_doc_id, first_doc_id + len(filenames), shard_size)
+    shards = [filenames[start - first_doc_id:start - first_doc_id + shard_size] for start in first_doc_ids]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Passing the tokenizer explicitly since spawned workers do not inherit the selection made in this process
+        yield from executor.map(partial(index_documents, folder_path, tokenizer=get_tokenizer(), build_biphrase=build_biphrase), shards, first_doc_ids)
+
+
+def _finish_indexes(indexes, compress, build_biphrase):
+    # Precomputing the bitmaps of the dense terms and compressing the merged indexes
+    inverted_index, biphrase_index, soundex_index = indexes
+    if not build_biphrase:
+        biphrase_index = None
+    inverted_index.precompute_bitmaps()
+    if compress:
+        compress_index(inverted_index)
+        if biphrase_index is not None:
+            biphrase_index.compress()
+    return inverted_index, biphrase_index, soundex_index
+
+
+def lnc_document_length(term_freq):
+    """
+    Calculates the length of a document vector with logarithmic term frequency weights, used for cosine normalization.
+    
+    Args:
+        term_freq (Counter): The frequency of every term in the document.
+    
+    Returns:
+        float: The euclidean length of the document vector.
+    """
+    return math.sqrt(sum((1 + math.log10(freq))**2 for freq in term_freq.values()))
+
+
+def document_statistics(folder_path, filenames, tokenizer=None):
+    """
+    Computes the term frequencies and vector length of each of the given documents of a folder.
+    
+    Args:
+        folder_path (str): Path to the folder containing text documents.
+        filenames (list): Names of the documents of the folder to process.
+        tokenizer (str): The tokenizer to preprocess the documents with, defaults to the one selected in this process.
+    
+    Returns:
+        list: A list of (filename, term frequency Counter, document length) tuples in the order of filenames.
+    """
+    statistics = []
+    preprocessor = get_preprocessor(tokenizer)
+    for filename in filenames:
+        with open(os.path.join(folder_path, filename), 'r', encoding='utf-8', errors='ignore') as file:
+            term_freq = Counter(preprocessor.iter_tokens(file))
+        statistics.append((filename, term_freq, lnc_document_length(term_freq)))
+    return statistics
+
+
+def iter_document_statistics(folder_path, filenames, workers=1):
+    """
+    Yields the term frequencies and vector length of every given document, computed in worker processes when workers > 1.
+    
+    Shards are consumed in submission order, so the documents are yielded in the order of filenames
+    no matter how many workers are used.
+    
+    Args:
+        folder_path (str): Path to the folder containing text documents.
+        filenames (list): Names of the documents of the folder to process.
+        workers (int): Number of worker processes to use, 1 processes the documents in the current process.
+    
+    Yields:
+        tuple: A (filename, term frequency Counter, document length) tuple per document.
+    """
+    workers = max(1, min(workers, len(filenames)))
+    if workers == 1:
+        yield from document_statistics(folder_path, filenames)
+        return
+    
+    shard_size = math.ceil(len(filenames) / (workers * SHARDS_PER_WORKER))
+    shards = [filenames[start:start + shard_size] for start in range(0, len(filenames), shard_size)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for statistics in executor.map(partial(document_statistics, folder_path, tokenizer=get_tokenizer()), shards):
+            yield from statistics
@@ -0,0 +1,116 @@
+import heapq
+from bisect import bisect_left
+from postings import intersect_many
+
+
+def min_match_distance(position_lists, ordered=False):
+    """
+    Finds the closest occurrence of several terms in a document, in time linear in their number of positions.
+
+    The distance of a match is the number of other words inside it, so two adjacent terms are at distance 0.
+    Without order, the smallest window holding one position of every term is found by advancing the pointer of
+    the term with the smallest position, as in a k-way merge. With order, the terms must appear in the order of
+    the lists, and every start position of the first term is extended greedily with pointers that only move forward.
+
+    Args:
+        position_lists (list): The sorted positions of every term in the document.
+        ordered (bool): Whether the terms must appear in the order of the lists.
+
+    Returns:
+        int: The distance of the closest match, or None if the terms never appear in order.
+    """
+    if not position_lists or not all(position_lists):
+        return None
+    if ordered:
+        span = _min_ordered_span(position_lists)
+    else:
+        span = _min_unordered_span(position_lists)
+    return None if span is None else span + 1 - len(position_lists)
+
+
+def _min_unordered_span(position_lists):
+    # Heap of the current position of every list, the window spanning from the heap top to the largest current position
+    heap = [(positions[0], index, 0) for index, positions in enumerate(position_lists)]
+    heapq.heapify(heap)
+    largest = max(positions[0] for positions in position_lists)
+    best = largest - heap[0][0]
+    while True:
+        _, index, offset = heap[0]
+        positions = position_lists[index]
+        if offset + 1 == len(positions):
+            return best
+        next_position = positions[offset + 1]
+        heapq.heapreplace(heap, (next_position, index, offset + 1))
+        largest = max(largest, next_position)
+        best = min(best, largest - heap[0][0])
+
+
+def _min_ordered_span(position_lists):
+    offsets = [0] * len(position_lists)
+    best = None
+    for start in position_lists[0]:
+        previous = start
+        for index in range(1, len(position_lists)):
+            positions = position_lists[index]
+            # The first position after the previous term, searched from where the last start left off
+            offset = offsets[index]
+            while offset < len(positions) and positions[offset] <= previous:
+                offset += 1
+            offsets[index] = offset
+            if offset == len(positions):
+                return best
+            previous = positions[offset]
+        if best is None or previous - start < best:
+            best = previous - start
+    return best
+
+
+def phrase_positions(position_lists):
+    """
+    Finds the start positions of a phrase in a document from the positions of its terms, by offset-aligned intersection.
+
+    The positions of the i-th term are shifted back by i, so the phrase starts wherever all the shifted lists agree.
+    The lists are aligned from the shortest to the longest, which keeps the candidate start positions few.
+
+    Args:
+        position_lists (list): The sorted positions of every term of the phrase in the document, in phrase order.
+
+    Returns:
+        list: The sorted start positions of the phrase.
+    """
+    if not position_lists or not all(position_lists):
+        return []
+    order = sorted(range(len(position_lists)), key=lambda offset: len(position_lists[offset]))
+    starts = [position - order[0] for position in position_lists[order[0]]]
+    for offset in order[1:]:
+        positions = position_lists[offset]
+        aligned = []
+        low = 0
+        for start in starts:
+            low = bisect_left(positions, start + offset, low)
+            if low == len(positions):
+                break
+            if positions[low] == start + offset:
+                aligned.append(start)
+        starts = aligned
+        if not starts:
+            break
+    return starts
+
+
+def phrase_matches(term_postings):
+    """
+    Finds the documents containing a phrase from the positional posting lists of its terms.
+
+    Args:
+        term_postings (list): The posting list of every term of the phrase, in phrase order.
+
+    Returns:
+        dict: A dict of document ID to the sorted start positions of the phrase in that document.
+    """
+    matches = {}
+    for doc_id in intersect_many([postings.keys() for postings in term_postings]):
+        starts = phrase_positions([postings[doc_id] for postings in term_postings])
+        if starts:
+            matches[doc_id] = starts
+    return matches
@@ -0,0 +1,788 @@
+import re
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+
+
+class DocumentTable:
+    """
+    Maps the filenames of the documents of a corpus to dense integer document IDs and back.
+
+    Attributes:
+        names (list): The filename of every document, indexed by document ID.
+        ids (dict): The document ID of every filename.
+    """
+    def __init__(self, names=()):
+        """
+        Creates a document table, assigning IDs to the given filenames in order.
+
+        Args:
+            names (iterable): Filenames of the documents to register.
+        """
+        self.names = []
+        self.ids = {}
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name):
+        """
+        Registers a document, assigning it the next free document ID.
+
+        Args:
+            name (str): The filename of the document.
+
+        Returns:
+            int: The document ID of the filename.
+        """
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        return self.ids[name]
+
+    def names_of(self, doc_ids):
+        """
+        Translates document IDs back to filenames.
+
+        Args:
+            doc_ids (iterable): The document IDs.
+
+        Returns:
+            set: The filenames of the documents.
+        """
+        names = self.names
+        return {names[doc_id] for doc_id in doc_ids}
+
+    def ids_of(self, names):
+        """
+        Translates filenames to document IDs, ignoring the files that are not part of the table.
+
+        Args:
+            names (iterable): The filenames.
+
+        Returns:
+            set: The document IDs of the known filenames.
+        """
+        ids = self.ids
+        return {ids[name] for name in names if name in ids}
+
+
+class PostingList:
+    """
+    The positional posting list of one term, packed into a single typed array sorted by document ID.
+
+    For a term occurring in n documents the array holds n, then the n document IDs in increasing order,
+    then the n end offsets of the positions of every document, then the positions themselves grouped by document.
+    The posting list behaves like a read-only mapping from document ID to the array of positions of the term in that document.
+
+    Attributes:
+        data (array): The packed posting list.
+    """
+    __slots__ = ('data',)
+
+    def __init__(self, data=None):
+        """
+        Wraps a packed posting list.
+
+        Args:
+            data (array): The packed posting list, an empty posting list if None.
+        """
+        self.data = data if data is not None else array('I', [0])
+
+    @property
+    def doc_ids(self):
+        """array: The IDs of the documents containing the term, in increasing order."""
+        return self.data[1:1 + self.data[0]]
+
+    def _find(self, doc_id):
+        count = self.data[0]
+        index = bisect_left(self.data, doc_id, 1, 1 + count) - 1
+        if index < count and self.data[1 + index] == doc_id:
+            return index
+        return -1
+
+    def _positions_at(self, index):
+        data = self.data
+        count = data[0]
+        start = data[count + index] if index else 0
+        return data[1 + 2 * count + start:1 + 2 * count + data[1 + count + index]]
+
+    def __len__(self):
+        return self.data[0]
+
+    def __eq__(self, other):
+        return isinstance(other, PostingList) and self.data == other.data
+
+    def __iter__(self):
+        return iter(self.doc_ids)
+
+    def __contains__(self, doc_id):
+        return self._find(doc_id) >= 0
+
+    def __getitem__(self, doc_id):
+        index = self._find(doc_id)
+        if index < 0:
+            raise KeyError(doc_id)
+        return self._positions_at(index)
+
+    def get(self, doc_id, default=None):
+        index = self._find(doc_id)
+        if index < 0:
+            return default
+        return self._positions_at(index)
+
+    def keys(self):
+        return self.doc_ids
+
+    def items(self):
+        """
+        Iterates over the documents of the posting list.
+
+        Yields:
+            tuple: The document ID and the array of positions of the term in the document.
+        """
+        for index, doc_id in enumerate(self.doc_ids):
+            yield doc_id, self._positions_at(index)
+
+
+class PostingListBuilder:
+    """
+    Accumulates the postings of one term while documents are being indexed, in increasing order of document ID.
+
+    Attributes:
+        doc_ids (array): The IDs of the documents added so far.
+        end_offsets (array): The number of positions added up to and including every document.
+        positions (array): The positions of the term, grouped by document.
+    """
+    __slots__ = ('doc_ids', 'end_offsets', 'positions')
+
+    def __init__(self):
+        self.doc_ids = array('I')
+        self.end_offsets = array('I')
+        self.positions = array('I')
+
+    def add(self, doc_id, positions):
+        """
+        Appends the positions of the term in a document whose ID is larger than all the IDs already added.
+
+        Args:
+            doc_id (int): The document ID.
+            positions (iterable): The increasing positions of the term in the document.
+        """
+        self.doc_ids.append(doc_id)
+        self.positions.extend(positions)
+        self.end_offsets.append(len(self.positions))
+
+    def extend(self, other):
+        """
+        Appends the postings of another builder whose document IDs are all larger than the IDs of this one.
+
+        Args:
+            other (PostingListBuilder): The builder to append.
+        """
+        shift = len(self.positions)
+        self.doc_ids.extend(other.doc_ids)
+        self.end_offsets.extend(offset + shift for offset in other.end_offsets)
+        self.positions.extend(other.positions)
+
+    def build(self):
+        """
+        Packs the accumulated postings into a posting list.
+
+        Returns:
+            PostingList: The packed posting list.
+        """
+        data = array('I', [len(self.doc_ids)])
+        data.extend(self.doc_ids)
+        data.extend(self.end_offsets)
+        data.extend(self.positions)
+        return PostingList(data)
+
+
+def vbyte_encode(numbers, output):
+    """
+    Appends non-negative integers to a buffer in variable-byte encoding.
+
+    Every number is written as big-endian groups of 7 bits, one per byte, with the high bit
+    set on the last byte of the number, so small numbers such as gaps take a single byte.
+
+    Args:
+        numbers (iterable): The numbers to encode.
+        output (bytearray): The buffer the encoded bytes are appended to.
+    """
+    for number in numbers:
+        if number < 128:
+            output.append(number | 128)
+            continue
+        groups = bytearray()
+        while number >= 128:
+            groups.append(number & 127)
+            number >>= 7
+        groups.append(number)
+        groups.reverse()
+        groups[-1] |= 128
+        output += groups
+
+
+def vbyte_decode(data, start, count):
+    """
+    Decodes a run of variable-byte encoded integers.
+
+    Args:
+        data (bytes): The encoded bytes.
+        start (int): Offset of the first byte to decode.
+        count (int): Number of integers to decode.
+
+    Returns:
+        tuple: The list of decoded integers and the offset of the byte following them.
+    """
+    numbers = []
+    number = 0
+    position = start
+    while len(numbers) < count:
+        byte = data[position]
+        position += 1
+        if byte & 128:
+            numbers.append((number << 7) | (byte & 127))
+            number = 0
+        else:
+            number = (number << 7) | byte
+    return numbers, position
+
+
+def vbyte_decode_range(data, start, end):
+    """
+    Decodes all the variable-byte encoded integers of a byte range.
+
+    Args:
+        data (bytes): The encoded bytes.
+        start (int): Offset of the first byte of the range.
+        end (int): Offset of the byte following the range.
+
+    Returns:
+        list: The decoded integers.
+    """
+    numbers = []
+    number = 0
+    for byte in data[start:end]:
+        if byte & 128:
+            numbers.append((number << 7) | (byte & 127))
+            number = 0
+        else:
+            number = (number << 7) | byte
+    return numbers
+
+
+class CompressedPostingList:
+    """
+    A positional posting list compressed with gap (delta) encoding followed by variable-byte encoding.
+
+    The bytes hold the number of documents n, the n gaps between consecutive document IDs, the byte size of
+    the positions block of every document, then the blocks of position gaps themselves. The positions of a
+    document are only decoded when requested. The document IDs and the offsets of the positions blocks are
+    decoded once, on the first lookup of a document, and kept as a directory that later lookups bisect into;
+    iterating the list decodes them on the fly without keeping them. It offers the same read-only mapping
+    interface as PostingList, and is pickled as its bytes only.
+
+    Attributes:
+        data (bytes): The compressed posting list.
+    """
+    __slots__ = ('data', '_directory')
+
+    def __init__(self, data):
+        self.data = data
+        self._directory = None
+
+    def __getstate__(self):
+        return self.data
+
+    def __setstate__(self, data):
+        self.data = data
+        self._directory = None
+
+    @classmethod
+    def from_postings(cls, postings):
+        """
+        Compresses a posting list.
+
+        Args:
+            postings (PostingList): The posting list to compress.
+
+        Returns:
+            CompressedPostingList: The compressed posting list.
+        """
+        doc_ids = postings.doc_ids
+        blocks = []
+        for _, positions in postings.items():
+            block = bytearray()
+            vbyte_encode((position - previous for position, previous in zip(positions, [0, *positions])), block)
+            blocks.append(block)
+        data = bytearray()
+        vbyte_encode([len(doc_ids)], data)
+        vbyte_encode((doc_id - previous for doc_id, previous in zip(doc_ids, [0, *doc_ids])), data)
+        vbyte_encode((len(block) for block in blocks), data)
+        for block in blocks:
+            data += block
+        return cls(bytes(data))
+
+    def _header(self):
+        """
+        Decodes the document IDs and the location of the positions block of every document.
+
+        Returns:
+            tuple: The document IDs, the block sizes, and the offset of the first positions block.
+        """
+        (count,), position = vbyte_decode(self.data, 0, 1)
+        doc_gaps, position = vbyte_decode(self.data, position, count)
+        block_sizes, position = vbyte_decode(self.data, position, count)
+        return list(accumulate(doc_gaps)), block_sizes, position
+
+    def _lookup_directory(self):
+        """
+        Returns the directory of the posting list, decoding it on first use.
+
+        Returns:
+            tuple: The document IDs, and the offset of the positions block of every document followed by the end of the data.
+        """
+        if self._directory is None:
+            doc_ids, block_sizes, start = self._header()
+            self._directory = (doc_ids, list(accumulate(block_sizes, initial=start)))
+        return self._directory
+
+    def _decode_positions(self, start, size):
+        return list(accumulate(vbyte_decode_range(self.data, start, start + size)))
+
+    @property
+    def doc_ids(self):
+        """list: The IDs of the documents containing the term, in increasing order."""
+        if self._directory is not None:
+            return self._directory[0]
+        return self._header()[0]
+
+    def __len__(self):
+        return vbyte_decode(self.data, 0, 1)[0][0]
+
+    def __eq__(self, other):
+        return isinstance(other, CompressedPostingList) and self.data == other.data
+
+    def __iter__(self):
+        return iter(self.doc_ids)
+
+    def __contains__(self, doc_id):
+        doc_ids = self._lookup_directory()[0]
+        index = bisect_left(doc_ids, doc_id)
+        return index < len(doc_ids) and doc_ids[index] == doc_id
+
+    def __getitem__(self, doc_id):
+        positions = self.get(doc_id)
+        if positions is None:
+            raise KeyError(doc_id)
+        return positions
+
+    def get(self, doc_id, default=None):
+        doc_ids, offsets = self._lookup_directory()
+        index = bisect_left(doc_ids, doc_id)
+        if index == len(doc_ids) or doc_ids[index] != doc_id:
+            return default
+        return self._decode_positions(offsets[index], offsets[index + 1] - offsets[index])
+
+    def keys(self):
+        return self.doc_ids
+
+    def items(self):
+        """
+        Iterates over the documents of the posting list, decoding the positions one document at a time.
+
+        Yields:
+            tuple: The document ID and the list of positions of the term in the document.
+        """
+        doc_ids, block_sizes, start = self._header()
+        for doc_id, size in zip(doc_ids, block_sizes):
+            yield doc_id, self._decode_positions(start, size)
+            start += size
+
+
+def compress_index(index):
+    """
+    Replaces every posting list of an index by its compressed form, in place.
+
+    Args:
+        index (dict): A dict of PostingList, such as an InvertedIndex.
+    """
+    for term, postings in index.items():
+        index[term] = CompressedPostingList.from_postings(postings)
+
+
+# Below this ratio between the lengths of two document ID lists, hashing the shorter one in C beats galloping in Python
+GALLOP_RATIO = 32
+
+
+def gallop_intersect(small, large):
+    """
+    Intersects two sorted lists of document IDs with galloping (exponential) search, in O(m log(n / m)) for lists of m and n IDs.
+
+    Args:
+        small (sequence): The shorter sorted list of document IDs.
+        large (sequence): The longer sorted list of document IDs.
+
+    Returns:
+        list: The document IDs of both lists, in increasing order.
+    """
+    result = []
+    low, size = 0, len(large)
+    for doc_id in small:
+        # Every ID before low is smaller than doc_id: doubling the step until it overshoots, then bisecting the last step
+        step = 1
+        while low + step < size and large[low + step] < doc_id:
+            step *= 2
+        low = bisect_left(large, doc_id, low + step // 2, min(low + step + 1, size))
+        if low == size:
+            break
+        if large[low] == doc_id:
+            result.append(doc_id)
+            low += 1
+    return result
+
+
+def intersect_sorted(first, second):
+    """
+    Intersects two sorted lists of document IDs, in a time that grows with the shorter list when their lengths are skewed.
+
+    Args:
+        first (sequence): A sorted list of document IDs.
+        second (sequence): Another sorted list of document IDs.
+
+    Returns:
+        list: The document IDs of both lists, in increasing order.
+    """
+    small, large = (first, second) if len(first) <= len(second) else (second, first)
+    if not small:
+        return []
+    if len(large) < GALLOP_RATIO * len(small):
+        return sorted(set(small).intersection(large))
+    return gallop_intersect(small, large)
+
+
+def intersect_many(doc_id_lists):
+    """
+    Intersects sorted lists of document IDs from the shortest to the longest, stopping as soon as the result is empty.
+
+    Args:
+        doc_id_lists (iterable): The sorted lists of document IDs.
+
+    Returns:
+        list: The document IDs of every list, in increasing order.
+    """
+    doc_id_lists = sorted(doc_id_lists, key=len)
+    if not doc_id_lists:
+        return []
+    result = doc_id_lists[0]
+    for doc_ids in doc_id_lists[1:]:
+        if not result:
+            break
+        result = intersect_sorted(result, doc_ids)
+    return list(result)
+
+
+# Positions of the set bits of every byte value, used to decode bitmaps one non-zero byte at a time
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+_NON_ZERO_BYTE = re.compile(b'[^\x00]')
+
+# Terms occurring in at least one document in DENSE_TERM_RATIO keep a precomputed bitmap: at that density the
+# bitmap takes no more memory than the array of document IDs it is built from
+DENSE_TERM_RATIO = 32
+
+
+class DocSet:
+    """
+    A set of document IDs stored as a bitmap, bit i being set when document i belongs to the set.
+
+    The bitmap is a Python integer, so AND, OR and NOT run as word-level operations over whole machine words.
+    DocSet supports the set operators &, |, - and ^, len, iteration in increasing order and membership tests.
+
+    Attributes:
+        bits (int): The bitmap.
+    """
+    __slots__ = ('bits',)
+
+    def __init__(self, bits=0):
+        self.bits = bits
+
+    @classmethod
+    def from_ids(cls, doc_ids):
+        """
+        Builds the bitmap of a collection of document IDs.
+
+        Args:
+            doc_ids (iterable): The document IDs.
+
+        Returns:
+            DocSet: The set of the given documents.
+        """
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return cls()
+        bitmap = bytearray(max(doc_ids) // 8 + 1)
+        for doc_id in doc_ids:
+            bitmap[doc_id >> 3] |= 1 << (doc_id & 7)
+        return cls(int.from_bytes(bitmap, 'little'))
+
+    @classmethod
+    def full(cls, size):
+        """
+        Builds the set of all the documents of a collection.
+
+        Args:
+            size (int): The number of documents of the collection.
+
+        Returns:
+            DocSet: The set of the documents 0 to size - 1.
+        """
+        return cls((1 << size) - 1)
+
+    def __and__(self, other):
+        return DocSet(self.bits & other.bits)
+
+    def __or__(self, other):
+        return DocSet(self.bits | other.bits)
+
+    def __sub__(self, other):
+        return DocSet(self.bits & ~other.bits)
+
+    def __xor__(self, other):
+        return DocSet(self.bits ^ other.bits)
+
+    def __eq__(self, other):
+        return isinstance(other, DocSet) and self.bits == other.bits
+
+    def __bool__(self):
+        return self.bits != 0
+
+    def __len__(self):
+        return self.bits.bit_count()
+
+    def __contains__(self, doc_id):
+        return self.bits >> doc_id & 1 == 1
+
+    def __iter__(self):
+        bitmap = self.bits.to_bytes((self.bits.bit_length() + 7) // 8, 'little')
+        for match in _NON_ZERO_BYTE.finditer(bitmap):
+            base = match.start() * 8
+            for bit in _BYTE_BITS[bitmap[match.start()]]:
+                yield base + bit
+
+
+class InvertedIndex(dict):
+    """
+    A dictionary from terms to their PostingList, together with the DocumentTable of the corpus.
+
+    The indexes built from the same corpus share one document table, so the document IDs of
+    their posting lists can be translated back to filenames with any of them.
+
+    Attributes:
+        documents (DocumentTable): The filenames and IDs of the indexed documents.
+        bitmaps (dict): The precomputed document bitmap of the dense terms.
+        term_dictionary (TermDictionary): The sorted dictionary of the terms, for wildcard queries, or None if not built yet.
+    """
+    def __init__(self, documents=None):
+        super().__init__()
+        self.documents = documents if documents is not None else DocumentTable()
+        self.bitmaps = {}
+        self.term_dictionary = None
+
+    def precompute_bitmaps(self):
+        """
+        Precomputes the document bitmap of every dense term, i.e. every term occurring in at least one document in DENSE_TERM_RATIO.
+        """
+        min_documents = max(1, len(self.documents) // DENSE_TERM_RATIO)
+        self.bitmaps = {term: DocSet.from_ids(postings.keys()) for term, postings in self.items() if len(postings) >= min_documents}
+
+    def doc_set(self, term):
+        """
+        Returns the set of documents containing a term.
+
+        Args:
+            term (str): The term.
+
+        Returns:
+            DocSet: The documents containing the term, empty if the term is not in the index.
+        """
+        if term in self.bitmaps:
+            return self.bitmaps[term]
+        if term in self:
+            return DocSet.from_ids(self[term].keys())
+        return DocSet()
+
+    def document_frequency(self, term):
+        """
+        Returns the number of documents containing a term, without decoding its posting list.
+
+        Args:
+            term (str): The term.
+
+        Returns:
+            int: The length of the posting list of the term, 0 if the term is not in the index.
+        """
+        postings = self.get(term)
+        return len(postings) if postings is not None else 0
+
+    def all_docs(self):
+        """
+        Returns the set of all the indexed documents.
+
+        Returns:
+            DocSet: The documents of the document table.
+        """
+        return DocSet.full(len(self.documents))
+
+
+class Vocabulary(DocumentTable):
+    """
+    Maps the distinct terms of a corpus to dense integer term IDs and back, with the same interface as DocumentTable.
+
+    Attributes:
+        names (list): The term of every term ID.
+        ids (dict): The term ID of every term.
+    """
+
+
+# Number of bits of the second term ID in a packed biphrase key
+TERM_ID_BITS = 32
+TERM_ID_MASK = (1 << TERM_ID_BITS) - 1
+
+
+class BiphraseIndex:
+    """
+    An index of the pairs of consecutive terms of a corpus, mapping the packed term IDs of both terms to the sorted
+    IDs of the documents containing the pair.
+
+    A key is the term ID of the first term shifted left by TERM_ID_BITS, ORed with the term ID of the second term.
+    Rather than a dict holding a key object and a posting list object per pair, the index is three flat arrays:
+    the sorted keys, searched by bisection, the offset of the postings of every key, and all the postings
+    concatenated. Once compressed, the postings are the variable-byte encoded gaps between document IDs and the
+    offsets are byte offsets.
+
+    Attributes:
+        vocabulary (Vocabulary): The terms of the corpus and their term IDs.
+        documents (DocumentTable): The filenames and IDs of the indexed documents.
+        keys (array): The sorted keys of the biphrases.
+        offsets (array): The offset of the postings of every key, followed by the length of the postings.
+        postings (array or bytes): The document IDs of every key, in key order.
+        compressed (bool): Whether the postings are variable-byte encoded gaps.
+    """
+    def __init__(self, vocabulary=None, documents=None):
+        self.vocabulary = vocabulary if vocabulary is not None else Vocabulary()
+        self.documents = documents if documents is not None else DocumentTable()
+        self.keys = array('Q')
+        self.offsets = array('Q', [0])
+        self.postings = array('I')
+        self.compressed = False
+
+    @classmethod
+    def from_postings(cls, postings, vocabulary, documents):
+        """
+        Packs a dict of biphrase keys to document IDs into a biphrase index.
+
+        Args:
+            postings (dict): The packed keys of the biphrases mapped to the sorted IDs of the documents containing them.
+            vocabulary (Vocabulary): The vocabulary the keys are packed from.
+            documents (DocumentTable): The filenames and IDs of the indexed documents.
+
+        Returns:
+            BiphraseIndex: The index of the biphrases.
+        """
+        index = cls(vocabulary, documents)
+        for key in sorted(postings):
+            index.keys.append(key)
+            index.postings.extend(postings[key])
+            index.offsets.append(len(index.postings))
+        return index
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __eq__(self, other):
+        return (isinstance(other, BiphraseIndex) and self.vocabulary.names == other.vocabulary.names
+                and self.keys == other.keys and self.offsets == other.offsets and self.postings == other.postings)
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def _find(self, key):
+        index = bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            return index
+        return None
+
+    def _doc_ids_at(self, index):
+        start, end = self.offsets[index], self.offsets[index + 1]
+        if self.compressed:
+            return list(accumulate(vbyte_decode_range(self.postings, start, end)))
+        return self.postings[start:end]
+
+    def key(self, first, second):
+        """
+        Packs the term IDs of a pair of terms into a key of the index.
+
+        Args:
+            first (str): The first term of the pair.
+            second (str): The second term of the pair.
+
+        Returns:
+            int: The key of the pair, or None if a term is not in the vocabulary.
+        """
+        ids = self.vocabulary.ids
+        if first not in ids or second not in ids:
+            return None
+        return ids[first] << TERM_ID_BITS | ids[second]
+
+    def terms_of(self, key):
+        """
+        Unpacks a key of the index into its pair of terms.
+
+        Args:
+            key (int): The packed term IDs.
+
+        Returns:
+            tuple: The first and second term of the pair.
+        """
+        terms = self.vocabulary.names
+        return terms[key >> TERM_ID_BITS], terms[key & TERM_ID_MASK]
+
+    def doc_ids(self, first, second):
+        """
+        Returns the documents containing a pair of consecutive terms.
+
+        Args:
+            first (str): The first term of the pair.
+            second (str): The second term of the pair.
+
+        Returns:
+            sequence: The sorted IDs of the documents containing the pair, or None if the pair never occurs.
+        """
+        key = self.key(first, second)
+        index = None if key is None else self._find(key)
+        return None if index is None else self._doc_ids_at(index)
+
+    def items(self):
+        """
+        Iterates over the biphrases of the index.
+
+        Returns:
+            generator: (key, document IDs) tuples, in increasing key order.
+        """
+        return ((key, self._doc_ids_at(index)) for index, key in enumerate(self.keys))
+
+    def compress(self):
+        """
+        Replaces the document IDs by their variable-byte encoded gaps, in place.
+        """
+        if self.compressed:
+            return
+        postings, offsets = bytearray(), array('Q', [0])
+        for _, doc_ids in self.items():
+            vbyte_encode((doc_id - previous for previous, doc_id in zip((0, *doc_ids), doc_ids)), postings)
+            offsets.append(len(postings))
+        self.postings, self.offsets, self.compressed = bytes(postings), offsets, True
@@ -0,0 +1,247 @@
+import os
+import re
+from functools import lru_cache
+from nltk.corpus import stopwords
+from nltk.stem import PorterStemmer
+
+NON_WORD_PATTERN = re.compile(r'\W+')
+
+# Fast alternative to NLTK's word_tokenize. It reproduces the splits of the Treebank tokenizer that survive the
+# \W+ stripping done after stemming: clitics ("do" + "n't", "dog" + "'s") and "cannot" are split off, while
+# hyphenated words, dotted names, decimals and other single-character joins stay one token as they do in NLTK.
+REGEX_TOKEN_PATTERN = re.compile(r"""
+    \w+(?=n't\b) | n't\b | can(?=not\b)
+    | '(?:s|m|d|ll|re|ve)\b
+    | \w+(?:(?:[-./+=^~|\\]|'(?!(?:s|m|d|ll|re|ve|t)\b)|(?<=\d)[,:](?=\d))\w+)*
+""", re.VERBOSE)
+
+TOKENIZERS = ('nltk', 'regex')
+
+# Number of characters read at once from a document whose tokens are streamed
+STREAM_CHUNK_SIZE = 1 << 20
+
+# Word frequencies follow Zipf's law, so a cache of the most recent distinct tokens serves the vast majority of lookups
+DEFAULT_STEM_CACHE_SIZE = 200000
+
+# Soundex code of every coded letter, the digits of the word itself are deleted so that only codes remain as digits
+SOUNDEX_TABLE = str.maketrans({
+    **{letter: code for letters, code in (('BFPV', '1'), ('CGJKQSXZ', '2'), ('DT', '3'), ('L', '4'), ('MN', '5'), ('R', '6'))
+       for letter in letters},
+    **{digit: None for digit in '0123456789'},
+})
+SOUNDEX_NON_CODE_PATTERN = re.compile(r'[^1-6]')
+SOUNDEX_RUN_PATTERN = re.compile(r'(\d)\1+')
+
+
+class TextPreprocessor:
+    """
+    A reusable text preprocessing pipeline: lowercasing, tokenizing, stopword removal, Porter stemming and removal of non-alphanumeric characters.
+
+    The stopword set and the stemmer are built once per pipeline, and the normalized form of every token
+    is memoized in a bounded LRU cache, so repeated tokens are neither stemmed nor cleaned twice.
+
+    Attributes:
+        tokenizer (str): The name of the tokenizer splitting the lowercased text into tokens.
+        tokenize (callable): The tokenizer itself, mapping a text to its list of raw tokens.
+        stop_words (frozenset): The English stopwords, matched against the raw lowercased tokens.
+        stemmer (PorterStemmer): The stemmer applied to every token that is not a stopword.
+    """
+    def __init__(self, tokenizer='nltk', stem_cache_size=DEFAULT_STEM_CACHE_SIZE):
+        """
+        Builds the tokenizer, the stopword set and the stemmer of the pipeline.
+
+        Args:
+            tokenizer (str): 'nltk' for NLTK's word_tokenize, or 'regex' for the precompiled regular expression tokenizer.
+            stem_cache_size (int): Maximum number of distinct tokens whose normalized form is memoized.
+        """
+        if tokenizer not in TOKENIZERS:
+            raise ValueError(f"Unknown tokenizer {tokenizer!r}, expected one of {TOKENIZERS}")
+        if tokenizer == 'nltk':
+            # Imported here so that the regex mode works without NLTK's punkt model
+            from nltk.tokenize import word_tokenize
+            self.tokenize = word_tokenize
+        else:
+            self.tokenize = REGEX_TOKEN_PATTERN.findall
+        self.tokenizer = tokenizer
+        self.stop_words = frozenset(stopwords.words('english'))
+        self.stemmer = PorterStemmer()
+        self.normalize_token = lru_cache(maxsize=stem_cache_size)(self._normalize_token)
+
+    def _normalize_token(self, token):
+        """
+        Normalizes a single lowercased token.
+
+        Args:
+            token (str): The token as produced by the tokenizer.
+
+        Returns:
+            str: The stemmed token without non-alphanumeric characters, or an empty string for stopwords and punctuation.
+        """
+        if token in self.stop_words:
+            return ''
+        return NON_WORD_PATTERN.sub('', self.stemmer.stem(token))
+
+    def process(self, text):
+        """
+        Preprocesses a text into its list of normalized tokens.
+
+        Args:
+            text (str): The input text to be preprocessed.
+
+        Returns:
+            list: A list of preprocessed tokens.
+        """
+        return [token for token in map(self.normalize_token, self.tokenize(text.lower())) if token]
+
+    def iter_tokens(self, file, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        Preprocesses an open text file into its normalized tokens, reading it in chunks.
+
+        The chunks are cut after whitespace, so no token spans two chunks, and only one chunk and its tokens are
+        held in memory whatever the size of the file. The tokens are those of process on the whole content with the
+        regex tokenizer, NLTK's sentence splitting also ending a sentence at every chunk boundary.
+
+        Args:
+            file (TextIO): The file, opened in text mode.
+            chunk_size (int): The number of characters read at once.
+
+        Yields:
+            str: Every preprocessed token of the file, in order.
+        """
+        for chunk in iter_text_chunks(file, chunk_size):
+            yield from self.process(chunk)
+
+    def process_batch(self, texts):
+        """
+        Preprocesses many texts, such as the documents of a corpus, in one call.
+
+        Args:
+            texts (iterable): The input texts to be preprocessed.
+
+        Returns:
+            list: A list holding the list of preprocessed tokens of every text.
+        """
+        return [self.process(text) for text in texts]
+
+    def process_terms(self, terms):
+        """
+        Preprocesses query terms in one call, keeping only the first normalized token of each term.
+
+        Args:
+            terms (iterable): The raw query terms.
+
+        Returns:
+            list: The normalized token of every term, or None for terms that are stopwords or punctuation only.
+        """
+        return [tokens[0] if tokens else None for tokens in self.process_batch(terms)]
+
+
+def iter_text_chunks(file, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Reads an open text file in chunks of about chunk_size characters that end after whitespace.
+
+    The characters after the last whitespace of a chunk are carried over to the next one, so that the chunks can be
+    tokenized independently. A run of more than chunk_size characters without whitespace is cut where it stands.
+
+    Args:
+        file (TextIO): The file, opened in text mode.
+        chunk_size (int): The number of characters read at once.
+
+    Yields:
+        str: The consecutive chunks of the file, whose concatenation is its whole content.
+    """
+    tail = ''
+    while True:
+        block = file.read(chunk_size)
+        if not block:
+            break
+        text = tail + block
+        cut = len(text)
+        while cut > 0 and not text[cut - 1].isspace():
+            cut -= 1
+        if cut == 0 and len(text) > chunk_size:
+            cut = len(text)
+        if cut:
+            yield text[:cut]
+        tail = text[cut:]
+    if tail:
+        yield tail
+
+
+# The tokenizer used by pre_processing_function, which can be preset through the IR_TOKENIZER environment variable
+_default_tokenizer = os.environ.get('IR_TOKENIZER', 'nltk')
+_preprocessors = {}
+
+
+def set_tokenizer(tokenizer):
+    """
+    Selects the tokenizer used by pre_processing_function and get_preprocessor in this process.
+
+    Args:
+        tokenizer (str): 'nltk' or 'regex'.
+    """
+    global _default_tokenizer
+    if tokenizer not in TOKENIZERS:
+        raise ValueError(f"Unknown tokenizer {tokenizer!r}, expected one of {TOKENIZERS}")
+    _default_tokenizer = tokenizer
+
+
+def get_tokenizer():
+    """
+    Returns the name of the tokenizer currently selected in this process.
+
+    Returns:
+        str: 'nltk' or 'regex'.
+    """
+    return _default_tokenizer
+
+
+def get_preprocessor(tokenizer=None):
+    """
+    Returns the preprocessing pipeline shared by the indexing and query code of this process, creating it on first use.
+
+    Args:
+        tokenizer (str): The tokenizer of the pipeline, defaults to the one selected with set_tokenizer.
+
+    Returns:
+        TextPreprocessor: The shared preprocessing pipeline.
+    """
+    tokenizer = tokenizer or _default_tokenizer
+    if tokenizer not in _preprocessors:
+        _preprocessors[tokenizer] = TextPreprocessor(tokenizer)
+    return _preprocessors[tokenizer]
+
+
+def pre_processing_function(text):
+    """
+    Preprocess text by lowercasing, removing stopwords, stemming, and removing non-alphanumeric characters.
+
+    Args:
+    text (str): The input text to be preprocessed
+
+    Returns:
+    list: A list of preprocessed tokens
+    """
+    return get_preprocessor().process(text)
+
+
+def soundex(name):
+    """
+    Implement the Soundex algorithm to convert words into soundex codes for spelling matching.
+
+    The letters are coded with a translation table. Characters without a code, such as vowels and digits, are
+    dropped without separating the codes around them, and runs of the same code, including a run continuing the
+    first character, are collapsed.
+
+    Args:
+    name (str): The input word to be converted to Soundex code.
+
+    Returns:
+    str: The Soundex code of the input word.
+    """
+    name = name.upper()
+    codes = SOUNDEX_NON_CODE_PATTERN.sub('', name[1:].translate(SOUNDEX_TABLE))
+    codes = SOUNDEX_RUN_PATTERN.sub(r'\1', codes)
+    if codes[:1] == name[0]:
+        codes = codes[1:]
+    return (name[0] + codes[:3]).ljust(4, '0')
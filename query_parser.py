@@ -0,0 +1,355 @@
+import re
+from postings import DocSet, intersect_many
+from term_dictionary import WILDCARD, TermDictionary
+from preprocessing import get_preprocessor
+
+# Query syntax: terms, the operators AND, OR and NOT (case insensitive) and parentheses, AND binding tighter than OR.
+# A term containing '*' is a wildcard pattern, matched against the indexed terms as they are, i.e. stemmed.
+# Like the original left to right evaluation, two operands written next to each other are joined by the last
+# binary operator seen so far (AND before the first one), so "a or b c" means "a or b or c".
+QUERY_TOKEN_PATTERN = re.compile(r'[()]|[^\s()]+')
+BINARY_OPERATORS = ('and', 'or')
+OPERATORS = frozenset(BINARY_OPERATORS + ('not',))
+PARENTHESES = ('(', ')')
+
+# Expression tree nodes are tuples:
+#   ('term', token)            the documents containing a preprocessed term
+#   ('wildcard', pattern)      the documents containing any indexed term matching a wildcard pattern
+#   ('not', node)              the documents not matching node
+#   ('and', [node, ...])       the documents matching every node
+#   ('or', [node, ...])        the documents matching any node
+
+
+def tokenize_query(query, preprocessor=None):
+    """
+    Splits a Boolean query into operators, parentheses and preprocessed terms.
+
+    Terms that preprocess to nothing, such as stopwords, are dropped, and an implicit operator is inserted between
+    two adjacent operands. Operators that have nothing to apply to, such as a trailing AND, are dropped as well.
+
+    Args:
+        query (str): The Boolean query string.
+        preprocessor (TextPreprocessor): The pipeline normalizing the terms, defaults to the shared one.
+
+    Returns:
+        list: A list of ('op', operator), ('paren', '(' or ')'), ('term', token) and ('wildcard', pattern) tuples.
+    """
+    preprocessor = preprocessor or get_preprocessor()
+    words = QUERY_TOKEN_PATTERN.findall(query.lower())
+    terms = iter(preprocessor.process_terms([word for word in words if word not in OPERATORS and word not in PARENTHESES
+                                             and WILDCARD not in word]))
+
+    lexemes = []
+    for word in words:
+        if word in OPERATORS:
+            lexemes.append(('op', word))
+        elif word in PARENTHESES:
+            lexemes.append(('paren', word))
+        elif WILDCARD in word:
+            # Stemming would mangle a pattern, which is used as typed
+            lexemes.append(('wildcard', word))
+        else:
+            token = next(terms)
+            if token is not None:
+                lexemes.append(('term', token))
+
+    tokens = []
+    sticky_operator = 'and'
+    pending_operator = None
+    for kind, value in lexemes:
+        ends_operand = bool(tokens) and (tokens[-1][0] in ('term', 'wildcard') or tokens[-1] == ('paren', ')'))
+        if kind == 'op' and value in BINARY_OPERATORS:
+            # Kept only if it ends up between two operands; repeated operators keep the last one
+            sticky_operator = value
+            pending_operator = value if ends_operand else None
+            negations = len(tokens)
+            while negations and tokens[negations - 1] == ('op', 'not'):
+                negations -= 1
+            if negations < len(tokens) and negations and tokens[negations - 1][0] == 'op':
+                # In "a not or b" the operator still joins the negated operand to the previous one
+                tokens[negations - 1] = ('op', value)
+            continue
+        if kind == 'paren' and value == ')':
+            # A NOT with nothing to apply to is dropped, with the operator before it
+            while tokens and tokens[-1][0] == 'op':
+                tokens.pop()
+            pending_operator = None
+            tokens.append((kind, value))
+            continue
+        # The token starts an operand: a term, a wildcard, an opening parenthesis or NOT
+        if ends_operand:
+            tokens.append(('op', pending_operator or sticky_operator))
+        pending_operator = None
+        if kind == 'op' and tokens and tokens[-1] == ('op', 'not'):
+            # NOT is a flag in the original evaluation, so repeating it does not negate twice
+            continue
+        tokens.append((kind, value))
+    while tokens and tokens[-1][0] == 'op':
+        tokens.pop()
+    return tokens
+
+
+class _Parser:
+    """
+    A recursive descent parser of the token list produced by tokenize_query.
+
+    Grammar:
+        expression := conjunction ('or' conjunction)*
+        conjunction := negation ('and' negation)*
+        negation := 'not' negation | primary
+        primary := term | wildcard | '(' expression ')'
+
+    Unbalanced parentheses are tolerated: a missing ')' is implied at the end of the query and extra ones are ignored.
+    Empty groups such as "()" parse to None and are dropped from their parent.
+    """
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def advance(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def parse(self):
+        node = self.expression()
+        while self.peek() is not None:
+            # Skipping an unmatched ')' and parsing the rest of the query, joined with the operator that follows it
+            self.advance()
+            operator = self.advance() if self.peek() in (('op', 'and'), ('op', 'or')) else ('op', 'and')
+            node = _combine(operator[1], [node, self.expression()])
+        return node
+
+    def expression(self):
+        nodes = [self.conjunction()]
+        while self.peek() == ('op', 'or'):
+            self.advance()
+            nodes.append(self.conjunction())
+        return _combine('or', nodes)
+
+    def conjunction(self):
+        nodes = [self.negation()]
+        while self.peek() == ('op', 'and'):
+            self.advance()
+            nodes.append(self.negation())
+        return _combine('and', nodes)
+
+    def negation(self):
+        if self.peek() == ('op', 'not'):
+            self.advance()
+            node = self.negation()
+            return None if node is None else ('not', node)
+        return self.primary()
+
+    def primary(self):
+        token = self.advance()
+        if token is None:
+            return None
+        if token[0] in ('term', 'wildcard'):
+            return token
+        if token == ('paren', '('):
+            node = self.expression()
+            if self.peek() == ('paren', ')'):
+                self.advance()
+            return node
+        # An unexpected ')' where an operand was expected, as in "()", yields nothing
+        self.position -= 1
+        return None
+
+
+def _combine(operator, nodes):
+    """
+    Joins nodes with AND or OR, dropping empty nodes and flattening nested nodes of the same operator.
+
+    Args:
+        operator (str): 'and' or 'or'.
+        nodes (list): The nodes to join, some of which may be None.
+
+    Returns:
+        tuple: The joined node, the single node if only one is left, or None if none is left.
+    """
+    children = []
+    for node in nodes:
+        if node is None:
+            continue
+        if node[0] == operator:
+            children.extend(node[1])
+        else:
+            children.append(node)
+    if not children:
+        return None
+    return children[0] if len(children) == 1 else (operator, children)
+
+
+def parse_boolean_query(query, preprocessor=None):
+    """
+    Parses a Boolean query into an expression tree.
+
+    Args:
+        query (str): The Boolean query string, with AND, OR, NOT and parentheses.
+        preprocessor (TextPreprocessor): The pipeline normalizing the terms, defaults to the shared one.
+
+    Returns:
+        tuple: The root node of the expression tree, or None if the query has no term left after preprocessing.
+    """
+    return _Parser(tokenize_query(query, preprocessor)).parse()
+
+
+def estimate_size(node, inverted_index, sizes=None, expansions=None):
+    """
+    Estimates the number of documents matching a node from the document frequencies of its terms.
+
+    Args:
+        node (tuple): A node of the expression tree.
+        inverted_index (InvertedIndex): The inverted index of the document collection.
+        sizes (dict): The estimates already made, keyed by the id of their node, which this call adds to.
+        expansions (dict): The terms of the wildcard patterns already expanded, which this call adds to.
+
+    Returns:
+        int: The document frequency of a term, an upper bound for AND and OR, and the complement for NOT.
+    """
+    if sizes is None:
+        sizes = {}
+    if id(node) in sizes:
+        return sizes[id(node)]
+    operator = node[0]
+    if operator == 'term':
+        size = inverted_index.document_frequency(node[1])
+    elif operator == 'wildcard':
+        terms = _expand_once(node[1], inverted_index, expansions)
+        size = min(sum(inverted_index.document_frequency(term) for term in terms), len(inverted_index.documents))
+    elif operator == 'not':
+        size = len(inverted_index.documents) - estimate_size(node[1], inverted_index, sizes, expansions)
+    else:
+        child_sizes = [estimate_size(child, inverted_index, sizes, expansions) for child in node[1]]
+        size = min(child_sizes) if operator == 'and' else min(sum(child_sizes), len(inverted_index.documents))
+    sizes[id(node)] = size
+    return size
+
+
+def expand_wildcard(pattern, inverted_index):
+    """
+    Finds the indexed terms matching a wildcard pattern, building the term dictionary of the index on first use.
+
+    Args:
+        pattern (str): The pattern, '*' standing for any sequence of characters.
+        inverted_index (InvertedIndex): The inverted index of the document collection.
+
+    Returns:
+        list: The matching terms, in sorted order.
+    """
+    if inverted_index.term_dictionary is None:
+        inverted_index.term_dictionary = TermDictionary(inverted_index)
+    return inverted_index.term_dictionary.expand(pattern)
+
+
+def _expand_once(pattern, inverted_index, expansions=None):
+    # Expands a wildcard pattern, reusing the expansion made earlier in the same evaluation if any
+    if expansions is None:
+        return expand_wildcard(pattern, inverted_index)
+    if pattern not in expansions:
+        expansions[pattern] = expand_wildcard(pattern, inverted_index)
+    return expansions[pattern]
+
+
+def _wildcard_docs(pattern, inverted_index, expansions=None):
+    docs = DocSet()
+    for term in _expand_once(pattern, inverted_index, expansions):
+        docs = docs | inverted_index.doc_set(term)
+    return docs
+
+
+def evaluate_boolean_query(node, inverted_index, universe=None, optimize=False):
+    """
+    Evaluates an expression tree on document bitmaps.
+
+    The planner evaluates the operands of an AND from the smallest estimated result to the largest, stops as soon
+    as the intermediate result is empty, and subtracts negated operands from it instead of complementing them.
+    The size of every node is estimated once, from the document frequencies of its terms, and every wildcard is
+    expanded once. An AND of terms that all have a precomputed bitmap is not reordered, since intersecting bitmaps
+    costs about the same in any order. Planning is off by default: on the benchmark queries of benchmarks.py it
+    does not beat evaluating the operands in the order they are written.
+
+    Args:
+        node (tuple): The root node of the expression tree, or None for an empty query.
+        inverted_index (InvertedIndex): The inverted index of the document collection.
+        universe (DocSet): The documents NOT complements against, defaults to all the indexed documents.
+        optimize (bool): Whether to plan the evaluation, or to evaluate the operands in the order of the query.
+
+    Returns:
+        DocSet: The IDs of the documents matching the query.
+    """
+    if node is None:
+        return DocSet()
+    if universe is None:
+        universe = inverted_index.all_docs()
+    if optimize:
+        return _evaluate_planned(node, inverted_index, universe, {}, {})
+    return _evaluate_in_order(node, inverted_index, universe)
+
+
+def _evaluate_in_order(node, inverted_index, universe):
+    operator = node[0]
+    if operator == 'term':
+        return inverted_index.doc_set(node[1])
+    if operator == 'wildcard':
+        return _wildcard_docs(node[1], inverted_index)
+    if operator == 'not':
+        return universe - _evaluate_in_order(node[1], inverted_index, universe)
+    result = _evaluate_in_order(node[1][0], inverted_index, universe)
+    for child in node[1][1:]:
+        child_docs = _evaluate_in_order(child, inverted_index, universe)
+        result = result & child_docs if operator == 'and' else result | child_docs
+    return result
+
+
+def _evaluate_planned(node, inverted_index, universe, sizes, expansions):
+    operator = node[0]
+    if operator == 'term':
+        return inverted_index.doc_set(node[1])
+    if operator == 'wildcard':
+        return _wildcard_docs(node[1], inverted_index, expansions)
+    if operator == 'not':
+        return universe - _evaluate_planned(node[1], inverted_index, universe, sizes, expansions)
+    if operator == 'or':
+        result = DocSet()
+        for child in node[1]:
+            result = result | _evaluate_planned(child, inverted_index, universe, sizes, expansions)
+        return result
+
+    bitmaps = inverted_index.bitmaps
+    if all(child[0] == 'term' and child[1] in bitmaps or child[0] == 'not' and child[1][0] == 'term' and child[1][1] in bitmaps
+           for child in node[1]):
+        # Intersecting precomputed bitmaps costs about the same in any order, so there is nothing to plan
+        return _evaluate_in_order(node, inverted_index, universe)
+
+    # AND: intersecting the positive operands smallest first, then subtracting the negated ones
+    positives = [child for child in node[1] if child[0] != 'not']
+    negatives = [child[1] for child in node[1] if child[0] == 'not']
+    positives.sort(key=lambda child: estimate_size(child, inverted_index, sizes, expansions))
+    negatives.sort(key=lambda child: estimate_size(child, inverted_index, sizes, expansions), reverse=True)
+    result = None
+    sparse_terms = [child for child in positives if child[0] == 'term' and child[1] not in bitmaps]
+    if len(sparse_terms) > 1:
+        # Terms without a precomputed bitmap are intersected on their sorted document IDs, galloping over the
+        # longer lists, so that only the bitmap of their common documents has to be built
+        doc_id_lists = [inverted_index[term].keys() if term in inverted_index else () for _, term in sparse_terms]
+        result = DocSet.from_ids(intersect_many(doc_id_lists))
+        if not result:
+            return result
+        positives = [child for child in positives if child not in sparse_terms]
+    for child in positives:
+        child_docs = _evaluate_planned(child, inverted_index, universe, sizes, expansions)
+        result = child_docs if result is None else result & child_docs
+        if not result:
+            return result
+    if result is None:
+        result = universe
+    for child in negatives:
+        result = result - _evaluate_planned(child, inverted_index, universe, sizes, expansions)
+        if not result:
+            break
+    return result
@@ -0,0 +1,133 @@
+import heapq
+from collections import defaultdict
+from bisect import bisect_left
+
+# Relative slack on the score bounds, so that rounding differences between a bound and the score it bounds never
+# prune a document that belongs in the top k
+BOUND_SLACK = 1e-9
+
+
+def impact_ordered_scores(term_postings, min_contribution=None):
+    """
+    Accumulates the scores of the documents term at a time from impact-sorted posting lists.
+
+    The postings of every term are read by decreasing impact, so with a minimum contribution the rest of a list,
+    whose postings would each add less than that to a score, is skipped as soon as one posting falls below it.
+    The lists of frequent terms, which have small query weights, are cut the most.
+
+    Args:
+        term_postings (list): A (query weight, doc numbers, impacts) tuple per query term, in query order, the
+            postings being sorted by decreasing impact.
+        min_contribution (float): The smallest query weight times impact read, None to read every posting.
+
+    Returns:
+        tuple: A dict of every scored doc number to the sum of its impacts weighted by the query weights, and a dict
+        of the number of postings read and of those skipped.
+    """
+    scores = defaultdict(float)
+    evaluated = skipped = 0
+    for query_weight, doc_numbers, impacts in term_postings:
+        length = len(doc_numbers)
+        if min_contribution is not None:
+            # The impacts are in decreasing order, so the postings to read are a prefix of the list
+            low, high = 0, length
+            while low < high:
+                middle = (low + high) // 2
+                if query_weight * impacts[middle] < min_contribution:
+                    high = middle
+                else:
+                    low = middle + 1
+            length = low
+        for doc_number, impact in zip(doc_numbers[:length], impacts[:length]):
+            scores[doc_number] += query_weight * impact
+        evaluated += length
+        skipped += len(doc_numbers) - length
+    return scores, {"evaluated": evaluated, "skipped": skipped}
+
+
+def maxscore_top_k(term_postings, impact_scale, query_norm, tie_ranks, k):
+    """
+    Ranks the k documents with the highest cosine score document at a time, skipping those that cannot make the top k.
+
+    Every query term has an upper bound on what it can add to the score of a document. Sorting the terms by bound,
+    the terms whose bounds add up to less than the score of the k-th best document so far are non-essential: a
+    document found only in their posting lists cannot enter the top k, so candidates are only taken from the other,
+    essential lists. The non-essential lists are then probed by bisection for every candidate, from the largest bound
+    down, and the candidate is dropped as soon as its partial score plus the remaining bounds falls below the threshold.
+
+    Scores are summed in the order of the query terms, so they are bit for bit those of impact_ordered_scores.
+
+    Args:
+        term_postings (list): A (query weight, doc numbers, impacts, largest impact) tuple per query term, in query
+            order, where the doc numbers are sorted and the impacts are aligned with them.
+        impact_scale (float): The factor turning stored impacts into weights.
+        query_norm (float): The length of the query vector.
+        tie_ranks (list): The rank of every document among equally scored ones, indexed by doc number.
+        k (int): The number of documents to return.
+
+    Returns:
+        tuple: The (doc number, score) tuples of the top k documents, best first and ties broken by tie rank, and a
+        dict of the number of postings whose weight was evaluated and of those skipped.
+    """
+    total_postings = sum(len(doc_numbers) for _, doc_numbers, _, _ in term_postings)
+    bounds = [query_weight * largest_impact * impact_scale / query_norm for query_weight, _, _, largest_impact in term_postings]
+    order = sorted(range(len(term_postings)), key=lambda term: bounds[term])
+    # cumulative_bounds[i] bounds the score a document gets from the i first terms of order
+    cumulative_bounds = [0.0]
+    for term in order:
+        cumulative_bounds.append(cumulative_bounds[-1] + bounds[term])
+
+    pointers = [0] * len(term_postings)
+    # Min-heap of (score, -tie rank, doc number), its top being the worst of the k best documents so far
+    heap = []
+    threshold = None
+    first_essential = 0
+    evaluated = 0
+    while first_essential < len(order):
+        essential = order[first_essential:]
+        candidates = [term_postings[term][1][pointers[term]] for term in essential if pointers[term] < len(term_postings[term][1])]
+        if not candidates:
+            break
+        doc_number = min(candidates)
+
+        contributions = {}
+        for term in essential:
+            query_weight, doc_numbers, impacts, _ = term_postings[term]
+            pointer = pointers[term]
+            if pointer < len(doc_numbers) and doc_numbers[pointer] == doc_number:
+                contributions[term] = query_weight * impacts[pointer]
+                pointers[term] = pointer + 1
+                evaluated += 1
+        estimate = sum(contributions.values()) * impact_scale / query_norm + cumulative_bounds[first_essential]
+
+        pruned = False
+        for position in range(first_essential - 1, -1, -1):
+            if threshold is not None and estimate * (1 + BOUND_SLACK) < threshold:
+                pruned = True
+                break
+            term = order[position]
+            query_weight, doc_numbers, impacts, _ = term_postings[term]
+            pointer = pointers[term] = bisect_left(doc_numbers, doc_number, pointers[term])
+            estimate -= bounds[term]
+            if pointer < len(doc_numbers) and doc_numbers[pointer] == doc_number:
+                contributions[term] = query_weight * impacts[pointer]
+                estimate += contributions[term] * impact_scale / query_norm
+                evaluated += 1
+        if pruned or (threshold is not None and estimate * (1 + BOUND_SLACK) < threshold):
+            continue
+
+        score = 0.0
+        for term in sorted(contributions):
+            score += contributions[term]
+        entry = (score * impact_scale / query_norm, -tie_ranks[doc_number], doc_number)
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+        if len(heap) == k:
+            threshold = heap[0][0]
+            while first_essential < len(order) and cumulative_bounds[first_essential + 1] * (1 + BOUND_SLACK) < threshold:
+                first_essential += 1
+
+    ranking = [(doc_number, score) for score, _, doc_number in sorted(heap, reverse=True)]
+    return ranking, {"evaluated": evaluated, "skipped": total_postings - evaluated}
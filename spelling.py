@@ -0,0 +1,138 @@
+from array import array
+from collections import Counter
+
+# Length of the character k-grams, the words being padded with one boundary marker on each side
+KGRAM_LENGTH = 2
+BOUNDARY = '$'
+
+
+def kgrams(word, k=KGRAM_LENGTH):
+    """
+    Splits a word into its overlapping character k-grams, padded with boundary markers.
+
+    Args:
+        word (str): The word.
+        k (int): The length of the k-grams.
+
+    Returns:
+        list: The k-grams of the word, with repetitions, in order.
+    """
+    padded = BOUNDARY + word + BOUNDARY
+    return [padded[start:start + k] for start in range(len(padded) - k + 1)]
+
+
+def bounded_edit_distance(first, second, max_distance):
+    """
+    Computes the Levenshtein distance between two words, giving up as soon as it exceeds a bound.
+
+    Only the diagonal band of width 2 * max_distance + 1 of the dynamic programming matrix is filled, and the
+    computation stops when a whole row exceeds the bound.
+
+    Args:
+        first (str): The first word.
+        second (str): The second word.
+        max_distance (int): The largest distance of interest.
+
+    Returns:
+        int: The edit distance, or None if it is larger than max_distance.
+    """
+    if abs(len(first) - len(second)) > max_distance:
+        return None
+    too_far = max_distance + 1
+    previous = list(range(len(second) + 1))
+    for row, first_char in enumerate(first, 1):
+        low, high = max(1, row - max_distance), min(len(second), row + max_distance)
+        current = [row if row <= max_distance else too_far] + [too_far] * len(second)
+        for column in range(low, high + 1):
+            current[column] = min(
+                previous[column] + 1,
+                current[column - 1] + 1,
+                previous[column - 1] + (first_char != second[column - 1]),
+            )
+        if min(current[low - 1:high + 1]) > max_distance:
+            return None
+        previous = current
+    distance = previous[len(second)]
+    return distance if distance <= max_distance else None
+
+
+class SpellingIndex:
+    """
+    Spelling correction over the k-gram index of a term dictionary, returning the terms within a given edit distance of a word.
+
+    Every edit changes at most k of the k-grams of a word, so a term within distance d of a word shares at least
+    max(|G(word)|, |G(term)|) - k * d k-grams with it (the q-gram lemma). Candidates are counted only over the posting
+    lists of the k-grams of the word, filtered on length and on that bound, and only the survivors are verified with
+    a bounded edit distance. Words too short for the bound to prune anything are compared with the terms of close length.
+
+    Attributes:
+        k (int): The length of the k-grams.
+        terms (list): The terms of the vocabulary, indexed by term ID, i.e. by rank in the term dictionary.
+        kgram_index (dict): The k-gram mapped to the array of the IDs of the terms containing it, shared with the term dictionary.
+        terms_by_length (dict): The length of the terms mapped to the array of the IDs of the terms of that length.
+    """
+    def __init__(self, term_dictionary):
+        """
+        Prepares spelling correction over the vocabulary of a term dictionary, reusing its k-gram index.
+
+        Args:
+            term_dictionary (TermDictionary): The sorted dictionary of the terms of the index.
+        """
+        self.k = KGRAM_LENGTH
+        self.terms = list(term_dictionary)
+        self.kgram_index = term_dictionary.kgram_index
+        self.terms_by_length = {}
+        for term_id, term in enumerate(self.terms):
+            self.terms_by_length.setdefault(len(term), array('I')).append(term_id)
+
+    def candidates(self, word, max_distance):
+        """
+        Returns the IDs of the terms that may be within an edit distance of a word, without false negatives.
+
+        Args:
+            word (str): The word to look up.
+            max_distance (int): The largest edit distance.
+
+        Returns:
+            iterable: The IDs of the candidate terms.
+        """
+        word_kgrams = kgrams(word, self.k)
+        distinct_kgrams = set(word_kgrams)
+        # Counting distinct k-grams, a k-gram repeated in the word can make up for one less shared k-gram
+        slack = self.k * max_distance + len(word_kgrams) - len(distinct_kgrams)
+        if len(word_kgrams) - slack <= 0:
+            # The bound cannot rule any term out, so every term of close enough length is a candidate
+            lengths = range(max(0, len(word) - max_distance), len(word) + max_distance + 1)
+            return [term_id for length in lengths for term_id in self.terms_by_length.get(length, ())]
+
+        shared = Counter()
+        for kgram in distinct_kgrams:
+            if kgram in self.kgram_index:
+                shared.update(self.kgram_index[kgram])
+        terms = self.terms
+        # A padded term of length n has n + 3 - k k-grams
+        padding = 3 - self.k
+        return [
+            term_id for term_id, count in shared.items()
+            if abs(len(terms[term_id]) - len(word)) <= max_distance
+            and count >= max(len(word_kgrams), len(terms[term_id]) + padding) - slack
+        ]
+
+    def lookup(self, word, max_distance=2):
+        """
+        Finds the terms of the vocabulary within an edit distance of a word.
+
+        Args:
+            word (str): The word to look up.
+            max_distance (int): The largest edit distance.
+
+        Returns:
+            list: (term, distance) tuples, closest terms first.
+        """
+        matches = []
+        for term_id in self.candidates(word, max_distance):
+            term = self.terms[term_id]
+            distance = bounded_edit_distance(word, term, max_distance)
+            if distance is not None:
+                matches.append((term, distance))
+        return sorted(matches, key=lambda match: (match[1], match[0]))
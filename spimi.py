@@ -0,0 +1,460 @@
+import os
+import mmap
+import heapq
+import shutil
+import struct
+import tempfile
+from array import array
+from collections import deque
+from collections.abc import Mapping
+from itertools import groupby
+from operator import itemgetter
+from indexing import collect_positions, create_soundex_index
+from postings import (DENSE_TERM_RATIO, CompressedPostingList, DocSet, DocumentTable, PostingList, PostingListBuilder)
+from preprocessing import get_preprocessor
+from term_dictionary import TermDictionary
+
+# Memory budget of the in-memory blocks when none is given, in bytes
+DEFAULT_MEMORY_BUDGET = 256 << 20
+# Estimated bytes taken by a term of a block besides its postings: the dict entry, the string and the empty
+# arrays of its PostingListBuilder
+TERM_OVERHEAD_BYTES = 400
+# Bytes per document ID, end offset and position held in the arrays of a PostingListBuilder
+POSTING_ITEM_BYTES = 4
+# Maximum number of runs merged at once, so that the open files and their buffers stay bounded
+MAX_MERGE_FANIN = 64
+
+# File layout of a run:  a record per term in sorted order, record = term length (uint32) | postings length (uint32) |
+#                        UTF-8 term | postings as the bytes of a CompressedPostingList
+# File layout of the final index:
+#   header    = magic (5 bytes) | version (uint16) | compressed flag (uint8) | bitmaps offset (uint64) |
+#               terms offset (uint64) | directory offset (uint64) | number of terms (uint64)
+#   postings  = the posting list of every term, as the bytes of a PostingList array or of a CompressedPostingList
+#   bitmaps   = the document bitmap of every dense term, as the little-endian bytes of its DocSet
+#   terms     = the UTF-8 bytes of every term, in sorted order
+#   directory = a fixed-size record per term in sorted order, record = term offset (uint64) | term length (uint32) |
+#               postings offset (uint64) | postings length (uint32) | document frequency (uint32) |
+#               bitmap offset (uint64) | bitmap length (uint32), the term and bitmap offsets being relative to their section
+_RECORD = struct.Struct("<II")
+MAGIC = b"SPIMI"
+FORMAT_VERSION = 2
+_HEADER = struct.Struct("<5sHBQQQQ")
+_DIRECTORY_RECORD = struct.Struct("<QIQIIQI")
+
+
+class _DiskDirectory(Mapping):
+    """
+    The sorted term directory of an index file, read from its memory map and searched by bisection, so that it
+    takes no memory whatever the size of the vocabulary. Every term is mapped to its directory record.
+    """
+    def __init__(self, data, terms_offset, records_offset, size):
+        self.data = data
+        self.terms_offset = terms_offset
+        self.records_offset = records_offset
+        self.size = size
+
+    def record(self, index):
+        return _DIRECTORY_RECORD.unpack_from(self.data, self.records_offset + index * _DIRECTORY_RECORD.size)
+
+    def _term_bytes(self, record):
+        start = self.terms_offset + record[0]
+        return self.data[start:start + record[1]]
+
+    def find(self, term):
+        """
+        Looks up the directory record of a term.
+
+        Args:
+            term (str): The term.
+
+        Returns:
+            tuple: The directory record of the term, or None if the term is not in the index.
+        """
+        # UTF-8 preserves the code point order, so the encoded terms are sorted like the terms
+        key = term.encode("utf-8")
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._term_bytes(self.record(middle)) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.size:
+            record = self.record(low)
+            if self._term_bytes(record) == key:
+                return record
+        return None
+
+    def records(self):
+        """
+        Iterates over the directory in sorted term order.
+
+        Yields:
+            tuple: Every term and its directory record.
+        """
+        for index in range(self.size):
+            record = self.record(index)
+            yield self._term_bytes(record).decode("utf-8"), record
+
+    def __getitem__(self, term):
+        record = self.find(term)
+        if record is None:
+            raise KeyError(term)
+        return record
+
+    def __iter__(self):
+        for term, _ in self.records():
+            yield term
+
+    def __len__(self):
+        return self.size
+
+
+class _DiskBitmaps(Mapping):
+    """
+    The bitmaps of the dense terms of an index file, read from its memory map when they are looked up.
+    """
+    def __init__(self, data, directory, bitmaps_offset):
+        self.data = data
+        self.directory = directory
+        self.bitmaps_offset = bitmaps_offset
+
+    def bitmap(self, record):
+        start = self.bitmaps_offset + record[5]
+        return DocSet(int.from_bytes(self.data[start:start + record[6]], "little"))
+
+    def __getitem__(self, term):
+        record = self.directory.find(term)
+        if record is None or not record[6]:
+            raise KeyError(term)
+        return self.bitmap(record)
+
+    def __iter__(self):
+        for term, record in self.directory.records():
+            if record[6]:
+                yield term
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class DiskInvertedIndex:
+    """
+    An inverted index kept on disk, in the file written by build_spimi_index.
+
+    The posting lists, the bitmaps of the dense terms and the sorted term directory are read from the memory-mapped
+    file when they are looked up, so the index offers the read-only interface of InvertedIndex to the query functions
+    while only the document table is held in memory. The term dictionary of wildcard and spelling queries is built
+    from the directory on first use. Pickling the index keeps the path of the file, not its content, and the file is
+    mapped again on the next lookup.
+
+    Attributes:
+        path (str): Path of the index file.
+        documents (DocumentTable): The filenames and IDs of the indexed documents.
+        compressed (bool): Whether the posting lists are CompressedPostingList bytes instead of PostingList arrays.
+        directory (Mapping): Every term mapped to its record in the directory of the file.
+        bitmaps (Mapping): The document bitmap of the dense terms.
+        term_dictionary (TermDictionary): The sorted dictionary of the terms, for wildcard queries.
+    """
+    def __init__(self, path, documents):
+        self.path = path
+        self.documents = documents
+        self._data = None
+        self._term_dictionary = None
+
+    @classmethod
+    def open(cls, path, documents):
+        """
+        Opens an index file written by build_spimi_index.
+
+        Args:
+            path (str): Path of the index file.
+            documents (DocumentTable): The filenames and IDs of the indexed documents.
+
+        Returns:
+            DiskInvertedIndex: The index.
+        """
+        index = cls(path, documents)
+        index._map()
+        return index
+
+    def _map(self):
+        # Maps the file on first use, and after the index was closed or unpickled
+        if self._data is None:
+            with open(self.path, "rb") as file:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, compressed, bitmaps_offset, terms_offset, records_offset, size = _HEADER.unpack_from(data, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                data.close()
+                raise ValueError(f"{self.path} is not a SPIMI index file of version {FORMAT_VERSION}")
+            self._compressed = bool(compressed)
+            self._directory = _DiskDirectory(data, terms_offset, records_offset, size)
+            self._bitmaps = _DiskBitmaps(data, self._directory, bitmaps_offset)
+            self._data = data
+        return self._data
+
+    def close(self):
+        """
+        Unmaps the index file, so that it can be replaced or deleted. The next lookup maps it again.
+        """
+        if self._data is not None:
+            data, self._data = self._data, None
+            self._directory = self._bitmaps = None
+            data.close()
+
+    def __getstate__(self):
+        return {"path": self.path, "documents": self.documents}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["documents"])
+
+    @property
+    def compressed(self):
+        self._map()
+        return self._compressed
+
+    @property
+    def directory(self):
+        self._map()
+        return self._directory
+
+    @property
+    def bitmaps(self):
+        self._map()
+        return self._bitmaps
+
+    @property
+    def term_dictionary(self):
+        if self._term_dictionary is None:
+            self._term_dictionary = TermDictionary(self.directory)
+        return self._term_dictionary
+
+    def _postings(self, record):
+        data = self._map()
+        start, length = record[2], record[3]
+        if self._compressed:
+            return CompressedPostingList(data[start:start + length])
+        postings = array('I')
+        postings.frombytes(data[start:start + length])
+        return PostingList(postings)
+
+    def __len__(self):
+        return len(self.directory)
+
+    def __iter__(self):
+        return iter(self.directory)
+
+    def __contains__(self, term):
+        return self.directory.find(term) is not None
+
+    def __getitem__(self, term):
+        return self._postings(self.directory[term])
+
+    def get(self, term, default=None):
+        record = self.directory.find(term)
+        return self._postings(record) if record is not None else default
+
+    def keys(self):
+        return self.directory.keys()
+
+    def items(self):
+        """
+        Iterates over the posting lists of the index, reading them one at a time.
+
+        Yields:
+            tuple: Every term and its posting list.
+        """
+        for term, record in self.directory.records():
+            yield term, self._postings(record)
+
+    def doc_set(self, term):
+        """
+        Returns the set of documents containing a term.
+
+        Args:
+            term (str): The term.
+
+        Returns:
+            DocSet: The documents containing the term, empty if the term is not in the index.
+        """
+        record = self.directory.find(term)
+        if record is None:
+            return DocSet()
+        if record[6]:
+            return self._bitmaps.bitmap(record)
+        return DocSet.from_ids(self._postings(record).keys())
+
+    def document_frequency(self, term):
+        """
+        Returns the number of documents containing a term, from the directory without reading its posting list.
+
+        Args:
+            term (str): The term.
+
+        Returns:
+            int: The document frequency of the term, 0 if the term is not in the index.
+        """
+        record = self.directory.find(term)
+        return record[4] if record is not None else 0
+
+    def all_docs(self):
+        """
+        Returns the set of all the indexed documents.
+
+        Returns:
+            DocSet: The documents of the document table.
+        """
+        return DocSet.full(len(self.documents))
+
+
+def _write_run(postings, run_path):
+    # Writes (term, PostingList) tuples in sorted term order to a run file, compressed
+    with open(run_path, "wb") as file:
+        for term, term_postings in postings:
+            term_bytes = term.encode("utf-8")
+            data = CompressedPostingList.from_postings(term_postings).data
+            file.write(_RECORD.pack(len(term_bytes), len(data)))
+            file.write(term_bytes)
+            file.write(data)
+
+
+def _read_run(run_path):
+    # Yields the (term, compressed postings) records of a run file, reading one record at a time
+    with open(run_path, "rb") as file:
+        while True:
+            record = file.read(_RECORD.size)
+            if not record:
+                return
+            term_length, postings_length = _RECORD.unpack(record)
+            yield file.read(term_length).decode("utf-8"), file.read(postings_length)
+
+
+def _merge_records(run_paths):
+    # Groups the records of runs by term in sorted order, heapq.merge keeping the records of equal terms in run order,
+    # i.e. in increasing order of document IDs
+    records = heapq.merge(*(_read_run(run_path) for run_path in run_paths), key=itemgetter(0))
+    for term, term_records in groupby(records, key=itemgetter(0)):
+        builder = PostingListBuilder()
+        for _, run_postings in term_records:
+            for doc_id, positions in CompressedPostingList(run_postings).items():
+                builder.add(doc_id, positions)
+        yield term, builder.build()
+
+
+def _merge_runs(run_paths, run_path):
+    # Merges consecutive runs into one run
+    _write_run(_merge_records(run_paths), run_path)
+    for merged_path in run_paths:
+        os.remove(merged_path)
+
+
+def build_spimi_index(folder_path, index_path, memory_budget=DEFAULT_MEMORY_BUDGET, compress=False, temp_dir=None):
+    """
+    Builds the positional inverted index of all text documents of a folder into a file, in bounded memory, with
+    single-pass in-memory indexing (SPIMI).
+
+    The documents are indexed into an in-memory block until the estimated size of its postings reaches the memory
+    budget. The block is then written to disk as a run, sorted by term with variable-byte compressed postings, and
+    a new block is started. The runs hold increasing ranges of document IDs, so a k-way merge of their sorted terms
+    only has to concatenate the postings of every term, in run order, to write the final index. Only one record per
+    run and the posting list of one term are held in memory while merging. The bitmaps of the dense terms, the
+    terms and the directory records are streamed to side files while merging, then appended to the index file.
+
+    The memory budget bounds the postings, which grow with the size of the corpus. What it does not bound is the
+    document table, one filename per document, the posting list of the most frequent term while it is merged, and
+    the soundex index and term dictionary built from the vocabulary by build_spimi_indexes and by wildcard queries.
+
+    Args:
+        folder_path (str): Path to the folder containing text documents.
+        index_path (str): Path of the index file to write.
+        memory_budget (int): Estimated bytes of postings held in memory before a block is written to disk.
+        compress (bool): Whether to store the posting lists delta and variable-byte compressed.
+        temp_dir (str): Folder of the run files, next to the index file if None.
+
+    Returns:
+        DiskInvertedIndex: The index, reading its posting lists from the file.
+    """
+    filenames = [filename for filename in os.listdir(folder_path) if filename.endswith(".txt")]
+    documents = DocumentTable(filenames)
+    preprocessor = get_preprocessor()
+    run_folder = tempfile.mkdtemp(prefix="spimi-", dir=temp_dir or os.path.dirname(os.path.abspath(index_path)))
+    try:
+        run_paths = []
+        block = {}
+        block_bytes = 0
+        for doc_id, filename in enumerate(filenames):
+            term_positions = {}
+            with open(os.path.join(folder_path, filename), 'r', encoding='utf-8', errors='ignore') as file:
+                deque(collect_positions(preprocessor.iter_tokens(file), term_positions), maxlen=0)
+            for token, positions in term_positions.items():
+                if token not in block:
+                    block[token] = PostingListBuilder()
+                    block_bytes += TERM_OVERHEAD_BYTES + len(token)
+                block[token].add(doc_id, positions)
+                block_bytes += (len(positions) + 2) * POSTING_ITEM_BYTES
+            if block_bytes >= memory_budget:
+                run_paths.append(os.path.join(run_folder, f"run{len(run_paths)}"))
+                _write_run(((term, block[term].build()) for term in sorted(block)), run_paths[-1])
+                block, block_bytes = {}, 0
+        if block:
+            run_paths.append(os.path.join(run_folder, f"run{len(run_paths)}"))
+            _write_run(((term, block[term].build()) for term in sorted(block)), run_paths[-1])
+            block = None
+
+        # Merging consecutive runs in passes until they can all be opened at once
+        while len(run_paths) > MAX_MERGE_FANIN:
+            merged_paths = []
+            for start in range(0, len(run_paths), MAX_MERGE_FANIN):
+                merged_paths.append(os.path.join(run_folder, f"run{len(run_paths)}_{start}"))
+                _merge_runs(run_paths[start:start + MAX_MERGE_FANIN], merged_paths[-1])
+            run_paths = merged_paths
+
+        min_documents = max(1, len(documents) // DENSE_TERM_RATIO)
+        temp_path = index_path + ".tmp"
+        with open(temp_path, "wb") as file, open(os.path.join(run_folder, "bitmaps"), "w+b") as bitmaps_file, \
+                open(os.path.join(run_folder, "terms"), "w+b") as terms_file, open(os.path.join(run_folder, "directory"), "w+b") as directory_file:
+            file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, compress, 0, 0, 0, 0))
+            size = 0
+            for term, postings in _merge_records(run_paths):
+                bitmap = b""
+                if len(postings) >= min_documents:
+                    bits = DocSet.from_ids(postings.keys()).bits
+                    bitmap = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+                data = CompressedPostingList.from_postings(postings).data if compress else postings.data.tobytes()
+                term_bytes = term.encode("utf-8")
+                directory_file.write(_DIRECTORY_RECORD.pack(terms_file.tell(), len(term_bytes), file.tell(), len(data), len(postings),
+                                                            bitmaps_file.tell(), len(bitmap)))
+                terms_file.write(term_bytes)
+                bitmaps_file.write(bitmap)
+                file.write(data)
+                size += 1
+            offsets = []
+            for side_file in (bitmaps_file, terms_file, directory_file):
+                offsets.append(file.tell())
+                side_file.seek(0)
+                shutil.copyfileobj(side_file, file)
+            file.seek(0)
+            file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, compress, *offsets, size))
+        os.replace(temp_path, index_path)
+    finally:
+        shutil.rmtree(run_folder, ignore_errors=True)
+    return DiskInvertedIndex(index_path, documents)
+
+
+def build_spimi_indexes(folder_path, index_path, memory_budget=DEFAULT_MEMORY_BUDGET, compress=False):
+    """
+    Builds the indexes of a folder like indexing.build_indexes, with the inverted index on disk.
+
+    The biphrase index is not built, since phrase queries are answered from the positions of the inverted index.
+
+    Args:
+        folder_path (str): Path to the folder containing text documents.
+        index_path (str): Path of the file of the inverted index.
+        memory_budget (int): Estimated bytes of postings held in memory before a block is written to disk.
+        compress (bool): Whether to store the posting lists delta and variable-byte compressed.
+
+    Returns:
+        tuple: The DiskInvertedIndex, None for the biphrase index, and the soundex index of the text documents.
+    """
+    inverted_index = build_spimi_index(folder_path, index_path, memory_budget, compress)
+    return inverted_index, None, create_soundex_index(inverted_index)
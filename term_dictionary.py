@@ -0,0 +1,189 @@
+import re
+from array import array
+from bisect import bisect_right
+from postings import intersect_many
+from spelling import kgrams
+
+# Number of terms per front-coded block: the first term of a block is stored whole, the others as the length of the
+# prefix they share with the previous term followed by the rest of the term
+BLOCK_SIZE = 16
+WILDCARD = '*'
+
+
+class TermDictionary:
+    """
+    A sorted dictionary of the terms of an index, front coded in blocks, with a k-gram index for wildcard queries
+    and spelling correction.
+
+    Terms are identified by their rank in sorted order. A prefix maps to a contiguous range of ranks, found by
+    bisecting the first terms of the blocks and decoding at most two blocks. Other wildcards are answered by
+    intersecting the k-gram posting lists of the fixed parts of the pattern, then checking the pattern on the
+    surviving terms.
+
+    Attributes:
+        block_heads (list): The first term of every block, searched by bisection.
+        blocks (list): The other terms of every block, front coded into one string: for every term, the length of
+            the shared prefix and the length of the suffix as single characters, followed by the suffix.
+        size (int): The number of terms.
+        kgram_index (dict): The k-gram of spelling.kgrams mapped to the sorted array of the ranks of the terms containing it.
+    """
+    def __init__(self, terms):
+        """
+        Builds the dictionary of a vocabulary.
+
+        Args:
+            terms (iterable): The distinct terms of the vocabulary, in any order.
+        """
+        terms = sorted(terms)
+        self.size = len(terms)
+        self.block_heads = []
+        self.blocks = []
+        for start in range(0, len(terms), BLOCK_SIZE):
+            block = terms[start:start + BLOCK_SIZE]
+            self.block_heads.append(block[0])
+            encoded = []
+            for previous, term in zip(block, block[1:]):
+                shared = 0
+                while shared < min(len(previous), len(term)) and previous[shared] == term[shared]:
+                    shared += 1
+                encoded.append(chr(shared) + chr(len(term) - shared) + term[shared:])
+            self.blocks.append(''.join(encoded))
+
+        self.kgram_index = {}
+        for rank, term in enumerate(terms):
+            for kgram in set(kgrams(term)):
+                self.kgram_index.setdefault(kgram, array('I')).append(rank)
+
+    def __len__(self):
+        return self.size
+
+    def _decode_block(self, block_index):
+        """
+        Decodes the terms of a block.
+
+        Args:
+            block_index (int): The index of the block.
+
+        Returns:
+            list: The terms of the block, in sorted order.
+        """
+        terms = [self.block_heads[block_index]]
+        encoded = self.blocks[block_index]
+        position = 0
+        while position < len(encoded):
+            shared, suffix_length = ord(encoded[position]), ord(encoded[position + 1])
+            position += 2
+            terms.append(terms[-1][:shared] + encoded[position:position + suffix_length])
+            position += suffix_length
+        return terms
+
+    def __getitem__(self, rank):
+        if not 0 <= rank < self.size:
+            raise IndexError(rank)
+        return self._decode_block(rank // BLOCK_SIZE)[rank % BLOCK_SIZE]
+
+    def __iter__(self):
+        for block_index in range(len(self.blocks)):
+            yield from self._decode_block(block_index)
+
+    def lower_bound(self, term):
+        """
+        Returns the rank of the first term not smaller than a string.
+
+        Args:
+            term (str): The string.
+
+        Returns:
+            int: The rank of the first term >= term, or the number of terms if there is none.
+        """
+        block_index = bisect_right(self.block_heads, term) - 1
+        if block_index < 0:
+            return 0
+        for offset, block_term in enumerate(self._decode_block(block_index)):
+            if block_term >= term:
+                return block_index * BLOCK_SIZE + offset
+        return min((block_index + 1) * BLOCK_SIZE, self.size)
+
+    def prefix_range(self, prefix):
+        """
+        Returns the range of ranks of the terms starting with a prefix.
+
+        Args:
+            prefix (str): The prefix.
+
+        Returns:
+            range: The ranks of the terms starting with the prefix.
+        """
+        start = self.lower_bound(prefix)
+        # The terms starting with the prefix are those before the smallest string greater than all of them
+        successor = prefix.rstrip(chr(0x10FFFF))
+        if not successor:
+            return range(start, self.size)
+        successor = successor[:-1] + chr(ord(successor[-1]) + 1)
+        return range(start, self.lower_bound(successor))
+
+    def terms_in(self, ranks):
+        """
+        Decodes the terms of a range of ranks.
+
+        Args:
+            ranks (range): Consecutive ranks.
+
+        Returns:
+            list: The terms of the range, in sorted order.
+        """
+        if not ranks:
+            return []
+        first_block, last_block = ranks.start // BLOCK_SIZE, (ranks.stop - 1) // BLOCK_SIZE
+        terms = []
+        for block_index in range(first_block, last_block + 1):
+            terms.extend(self._decode_block(block_index))
+        offset = first_block * BLOCK_SIZE
+        return terms[ranks.start - offset:ranks.stop - offset]
+
+    def terms_at(self, ranks):
+        """
+        Decodes the terms of sorted ranks, decoding every block once.
+
+        Args:
+            ranks (iterable): Ranks in increasing order.
+
+        Returns:
+            list: The terms of the ranks, in the same order.
+        """
+        terms = []
+        block_index, block = None, None
+        for rank in ranks:
+            if rank // BLOCK_SIZE != block_index:
+                block_index = rank // BLOCK_SIZE
+                block = self._decode_block(block_index)
+            terms.append(block[rank % BLOCK_SIZE])
+        return terms
+
+    def expand(self, pattern):
+        """
+        Finds the terms matching a wildcard pattern, where '*' stands for any sequence of characters.
+
+        Args:
+            pattern (str): The pattern, such as "comput*", "*tion" or "c*t*r".
+
+        Returns:
+            list: The matching terms, in sorted order.
+        """
+        if WILDCARD not in pattern:
+            ranks = self.prefix_range(pattern)
+            return [pattern] if ranks and self[ranks.start] == pattern else []
+        prefix = pattern[:pattern.index(WILDCARD)]
+        if pattern == prefix + WILDCARD:
+            return self.terms_in(self.prefix_range(prefix))
+
+        # The k-grams of the fixed parts of the pattern, anchored with boundary markers at both ends
+        pattern_kgrams = {kgram for kgram in kgrams(pattern) if WILDCARD not in kgram}
+        matcher = re.compile('.*'.join(re.escape(part) for part in pattern.split(WILDCARD)), re.DOTALL)
+        if pattern_kgrams:
+            ranks = intersect_many([self.kgram_index.get(kgram, ()) for kgram in pattern_kgrams])
+            candidates = self.terms_at(ranks)
+        else:
+            # The fixed parts are too short to have k-grams: narrowing to the prefix range, if any, then scanning
+            candidates = self.terms_in(self.prefix_range(prefix))
+        return [term for term in candidates if matcher.fullmatch(term)]
@@ -0,0 +1,127 @@
+import random
+import pytest
+from indexing import build_indexes
+from postings import DocSet
+from preprocessing import get_preprocessor, get_tokenizer, set_tokenizer
+from query_parser import evaluate_boolean_query, parse_boolean_query
+
+DOCUMENTS = {
+    "a.txt": "alpha beta gamma",
+    "b.txt": "alpha delta",
+    "c.txt": "beta gamma delta",
+    "d.txt": "gamma epsilon",
+    "e.txt": "alpha beta epsilon delta",
+    "f.txt": "zeta",
+}
+WORDS = ("alpha", "beta", "gamma", "delta", "epsilon", "zeta", "missing", "the")
+
+
+@pytest.fixture(scope="module")
+def inverted_index(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("corpus")
+    for filename, text in DOCUMENTS.items():
+        (folder / filename).write_text(text, encoding="utf-8")
+    tokenizer = get_tokenizer()
+    set_tokenizer("regex")
+    yield build_indexes(str(folder), build_biphrase=False)[0]
+    set_tokenizer(tokenizer)
+
+
+def term(word):
+    return ('term', word)
+
+
+def evaluate_left_to_right(query, inverted_index):
+    # The evaluator the parser replaced: operands are combined left to right with the last operator seen, and NOT
+    # negates the next operand
+    universe = inverted_index.all_docs()
+    words = query.lower().split()
+    terms = iter(get_preprocessor().process_terms([word for word in words if word not in ('and', 'or', 'not')]))
+    matched, operator, negate, first = DocSet(), 'and', False, True
+    for word in words:
+        if word in ('and', 'or', 'not'):
+            if word == 'not':
+                negate = True
+            else:
+                operator = word
+            continue
+        token = next(terms)
+        if token is None:
+            continue
+        docs = inverted_index.doc_set(token)
+        if negate:
+            docs, negate = universe - docs, False
+        if first:
+            matched, first = docs, False
+        else:
+            matched = matched & docs if operator == 'and' else matched | docs
+    return matched
+
+
+def test_and_binds_tighter_than_or(inverted_index):
+    assert parse_boolean_query("alpha or beta and gamma") == ('or', [term('alpha'), ('and', [term('beta'), term('gamma')])])
+    assert parse_boolean_query("alpha and beta or gamma") == ('or', [('and', [term('alpha'), term('beta')]), term('gamma')])
+
+
+def test_not_binds_tighter_than_and(inverted_index):
+    assert parse_boolean_query("not alpha and beta") == ('and', [('not', term('alpha')), term('beta')])
+
+
+def test_parentheses_override_precedence(inverted_index):
+    assert parse_boolean_query("(alpha or beta) and gamma") == ('and', [('or', [term('alpha'), term('beta')]), term('gamma')])
+    assert parse_boolean_query("not (alpha or beta)") == ('not', ('or', [term('alpha'), term('beta')]))
+    assert parse_boolean_query("((alpha))") == term('alpha')
+
+
+def test_unbalanced_and_empty_parentheses(inverted_index):
+    assert parse_boolean_query("(alpha or beta") == parse_boolean_query("(alpha or beta)")
+    assert parse_boolean_query("alpha and () beta") == ('and', [term('alpha'), term('beta')])
+    assert parse_boolean_query("()") is None
+
+
+def test_parenthesized_query_results(inverted_index):
+    names = inverted_index.documents.names_of
+    assert names(evaluate_boolean_query(parse_boolean_query("(alpha or zeta) and not beta"), inverted_index)) == {"b.txt", "f.txt"}
+    assert names(evaluate_boolean_query(parse_boolean_query("alpha or beta and gamma"), inverted_index)) == {"a.txt", "b.txt", "c.txt", "e.txt"}
+
+
+def test_flat_queries_keep_their_left_to_right_meaning(inverted_index):
+    # Without parentheses and with a single binary operator, precedence cannot change the result
+    generator = random.Random(0)
+    for _ in range(500):
+        operator = generator.choice(('and', 'or'))
+        words = []
+        for _ in range(generator.randint(1, 6)):
+            if generator.random() < 0.3:
+                words.append('not')
+            if generator.random() < 0.2:
+                words.append('not')
+            words.append(generator.choice(WORDS))
+            if generator.random() < 0.7:
+                words.append(operator)
+        query = " ".join(words)
+        tree = parse_boolean_query(query)
+        expected = evaluate_left_to_right(query, inverted_index)
+        assert evaluate_boolean_query(tree, inverted_index) == expected, query
+        assert evaluate_boolean_query(tree, inverted_index, optimize=True) == expected, query
+
+
+def test_planned_evaluation_matches_in_order(inverted_index):
+    generator = random.Random(1)
+    for _ in range(300):
+        words = []
+        depth = 0
+        for _ in range(generator.randint(1, 8)):
+            if generator.random() < 0.2:
+                words.append('(')
+                depth += 1
+            if generator.random() < 0.3:
+                words.append('not')
+            words.append(generator.choice(WORDS + ("al*", "*ta", "g*a")))
+            if depth and generator.random() < 0.3:
+                words.append(')')
+                depth -= 1
+            words.append(generator.choice(('and', 'or')))
+        query = " ".join(words)
+        tree = parse_boolean_query(query)
+        assert evaluate_boolean_query(tree, inverted_index, optimize=True) == evaluate_boolean_query(tree, inverted_index), query
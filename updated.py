@@ -1,170 +1,34 @@
 import streamlit as st
 import os
-import re
 import base64
-from collections import defaultdict
-from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer
-from nltk.tokenize import word_tokenize
+from indexing import build_indexes, create_soundex_index as create_vocabulary_soundex_index
+from preprocessing import TOKENIZERS, get_preprocessor, set_tokenizer
+# The index layout is shared with assignment1, so its query functions are reused as they are
+import assignment1
 
-# Include all your existing functions here (preprocess, create_indexes, boolean_and, boolean_or, boolean_not, 
+# Include all your existing functions here (preprocess, create_indexes, 
 # process_boolean_query, process_biword_query, soundex, process_proximity_query, process_soundex_query, create_soundex_index)
 
 # ... (paste all the functions from your original code here)
 def preprocess(text):
-    text = text.lower()
-    tokens = word_tokenize(text)
-    stop_words = set(stopwords.words('english'))
-    tokens = [word for word in tokens if word not in stop_words]
-    ps = PorterStemmer()
-    tokens = [ps.stem(word) for word in tokens]
-    tokens = [re.sub(r'\W+', '', word) for word in tokens if re.sub(r'\W+', '', word) != '']
-    return tokens
+    return get_preprocessor().process(text)
 
 
-def create_indexes(folder_path):
-    inverted_index = defaultdict(lambda: defaultdict(list))
-    biword_index = defaultdict(lambda: defaultdict(list))
-    soundex_index = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-    
-    for filename in os.listdir(folder_path):
-        if filename.endswith(".txt"):
-            filepath = os.path.join(folder_path, filename)
-            
-            with open(filepath, 'r', encoding='utf-8', errors='ignore') as file:
-                content = file.read()
-                
-            tokens = preprocess(content)
-            
-            for position, token in enumerate(tokens):
-                # Regular inverted index
-                inverted_index[token][filename].append(position)
-                
-                # Biword index
-                if position < len(tokens) - 1:
-                    biword = f"{token} {tokens[position + 1]}"
-                    biword_index[biword][filename].append(position)
-                
-                # Soundex index
-                soundex_code = soundex(token)
-                soundex_index[soundex_code][token][filename].append(position)
-    
-    return inverted_index, biword_index, soundex_index
-
-def boolean_and(list1, list2):
-    return list1.intersection(list2)
-
-def boolean_or(list1, list2):
-    return list1.union(list2)
-
-def boolean_not(list1, total_docs):
-    return total_docs - list1
+def create_indexes(folder_path, workers=1):
+    # Tokenizing and indexing shards of the corpus in worker processes when workers > 1
+    return build_indexes(folder_path, workers)
 
-def process_boolean_query(query, inverted_index, total_docs):
-    tokens = query.lower().split()
-    result = set()
-    current_op = 'and'
-    negate_next = False
-    first_term = True
-
-    for token in tokens:
-        if token in {'and', 'or', 'not'}:
-            if token == 'not':
-                negate_next = True
-            else:
-                current_op = token
-        else:
-            # Preprocess the token
-            processed_tokens = preprocess(token)
-            if processed_tokens:
-                token = processed_tokens[0]  # Take the first processed token
-                posting_list = set(inverted_index[token].keys()) if token in inverted_index else set()
-
-                if negate_next:
-                    posting_list = total_docs - posting_list
-                    negate_next = False
-
-                if first_term:
-                    result = posting_list
-                    first_term = False
-                elif current_op == 'and':
-                    result = boolean_and(result, posting_list)
-                elif current_op == 'or':
-                    result = boolean_or(result, posting_list)
-
-    return result
+def process_boolean_query(query, inverted_index, total_docs=None):
+    return assignment1.process_boolean_query(query, inverted_index, total_docs)
 
 def process_biword_query(query, biword_index):
-    tokens = preprocess(query)
-    result_docs = set()
-    
-    for i in range(len(tokens) - 1):
-        biword = f"{tokens[i]} {tokens[i+1]}"
-        if biword in biword_index:
-            if not result_docs:
-                result_docs = set(biword_index[biword].keys())
-            else:
-                result_docs &= set(biword_index[biword].keys())
-    
-    return result_docs
+    return assignment1.biphrase_processing_function(query, biword_index)
 
-def soundex(name):
-    name = name.upper()
-    soundex = name[0]
-    
-    # Conversion table
-    conversions = {
-        'BFPV': '1', 'CGJKQSXZ': '2', 'DT': '3',
-        'L': '4', 'MN': '5', 'R': '6'
-    }
-    
-    # Convert name to Soundex code
-    for char in name[1:]:
-        for key in conversions:
-            if char in key:
-                code = conversions[key]
-                if code != soundex[-1]:  # Only add if not the same as the last code
-                    soundex += code
-                break
-        if len(soundex) == 4:
-            break
-    
-    # Pad with zeros if necessary
-    soundex = soundex.ljust(4, '0')
-    
-    return soundex
+def process_phrase_query(query, inverted_index):
+    return assignment1.phrase_query_processing_function(query, inverted_index)
 
-def process_proximity_query(query, inverted_index, proximity):
-    tokens = preprocess(query)
-    tokens = [token for token in tokens if token not in {'and'}]
-    
-    if len(tokens) != 2:
-        print("Error: Proximity query should contain exactly two terms.")
-        return {}
-    
-    token1, token2 = tokens
-    
-    docs1 = inverted_index.get(token1, {})
-    docs2 = inverted_index.get(token2, {})
-    
-    common_docs = set(docs1.keys()) & set(docs2.keys())
-    
-    result = {}
-    for doc in common_docs:
-        positions1 = docs1[doc]
-        positions2 = docs2[doc]
-        
-        for pos1 in positions1:
-            for pos2 in positions2:
-                distance = abs(pos2 - pos1) - 1  # Subtract 1 to get words between
-                if distance <= proximity:
-                    if doc in result:
-                        result[doc].append(distance)
-                    else:
-                        result[doc] = [distance]
-                    break
-    
-    return result
+def process_proximity_query(query, inverted_index, proximity, ordered=False):
+    return assignment1.proximity_processing_function(query, inverted_index, proximity, ordered)
 
 # def process_soundex_query(query, soundex_index, inverted_index):
 #     tokens = preprocess(query)
@@ -193,38 +57,11 @@ def process_proximity_query(query, inverted_index, proximity):
     
 #     return result_docs
 def process_soundex_query(query, soundex_index, inverted_index):
-    tokens = query.lower().split()
-    result = set()
-    matched_words = {}
-    
-    for token in tokens:
-        if token not in {'and', 'or', 'not'}:
-            soundex_code = soundex(token)
-            similar_words = soundex_index.get(soundex_code, set())
-            token_result = set()
-            token_matched_words = set()
-            for word in similar_words:
-                if word in inverted_index:
-                    token_result.update(inverted_index[word])
-                    token_matched_words.add(word)
-            if not result:
-                result = token_result
-                matched_words[token] = token_matched_words
-            else:
-                result.intersection_update(token_result)
-                matched_words[token] = token_matched_words
-    
-    return result, matched_words
+    return assignment1.soundex_processing_function(query, soundex_index, inverted_index)
 
 def create_soundex_index(inverted_index):
-    soundex_index = {}
-    for word in inverted_index:
-        soundex_code = soundex(word)
-        if soundex_code in soundex_index:
-            soundex_index[soundex_code].add(word)
-        else:
-            soundex_index[soundex_code] = {word}
-    return soundex_index
+    # One soundex code per distinct term, the indexes built by create_indexes already include it
+    return create_vocabulary_soundex_index(inverted_index)
 # Streamlit app
 def main():
     st.title("Info-Web")
@@ -236,24 +73,28 @@ def main():
     # Sidebar for folder path input
     folder_path = st.sidebar.text_input("Enter the path to your corpus folder:", r"C:\Users\ravee\Downloads\Corpus")
 
+    workers = st.sidebar.number_input("Number of worker processes for indexing:", min_value=1, value=os.cpu_count() or 1)
+    tokenizer = st.sidebar.selectbox("Tokenizer:", TOKENIZERS)
+
     if st.sidebar.button("Create Indexes"):
         with st.spinner("Creating indexes..."):
-            inverted_index, biword_index, soundex_index = create_indexes(folder_path)
-            total_docs = set(os.listdir(folder_path))
+            set_tokenizer(tokenizer)
+            inverted_index, biword_index, soundex_index = create_indexes(folder_path, workers)
             st.session_state.inverted_index = inverted_index
             st.session_state.biword_index = biword_index
             st.session_state.soundex_index = soundex_index
-            st.session_state.total_docs = total_docs
+            st.session_state.tokenizer = tokenizer
             st.session_state.indexes_created = True
         st.success("Indexes created successfully!")
 
     if st.session_state.indexes_created:
-        query_type = st.selectbox("Select Query Type", ["Boolean Query", "Biword Query", "Proximity Query", "Soundex Query"])
+        set_tokenizer(st.session_state.tokenizer)
+        query_type = st.selectbox("Select Query Type", ["Boolean Query", "Biword Query", "Phrase Query", "Proximity Query", "Soundex Query"])
 
         if query_type == "Boolean Query":
             query = st.text_input("Enter your Boolean query:")
             if st.button("Search"):
-                result_docs = process_boolean_query(query, st.session_state.inverted_index, st.session_state.total_docs)
+                result_docs = process_boolean_query(query, st.session_state.inverted_index)
                 display_results(result_docs, folder_path)
 
         elif query_type == "Biword Query":
@@ -262,12 +103,22 @@ def main():
                 result_docs = process_biword_query(query, st.session_state.biword_index)
                 display_results(result_docs, folder_path)
 
+        elif query_type == "Phrase Query":
+            query = st.text_input("Enter your Phrase query:")
+            if st.button("Search"):
+                result_docs = process_phrase_query(query, st.session_state.inverted_index)
+                display_results(result_docs, folder_path)
+
         elif query_type == "Proximity Query":
             query = st.text_input("Enter your Proximity query:")
             proximity = st.number_input("Enter the proximity (number of words):", min_value=1, value=1)
             if st.button("Search"):
-                result_docs = process_proximity_query(query, st.session_state.inverted_index, proximity)
-                display_results(result_docs.keys(), folder_path)
+                try:
+                    result_docs = process_proximity_query(query, st.session_state.inverted_index, proximity)
+                except ValueError as error:
+                    st.error(str(error))
+                else:
+                    display_results(result_docs.keys(), folder_path)
 
         elif query_type == "Soundex Query":
             query = st.text_input("Enter your Soundex query:")
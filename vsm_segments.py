@@ -0,0 +1,226 @@
+import math
+from array import array
+from bisect import bisect_left
+
+# Tiered merge policy: as soon as MERGE_FACTOR segments are in the same size tier, they are merged into one segment
+# of the next tier, so a document is rewritten about log(documents) / log(MERGE_FACTOR) times in total
+MERGE_FACTOR = 8
+# A segment whose share of deleted documents reaches this is rewritten without them
+MAX_DELETED_RATIO = 0.3
+
+
+def document_impact(freq, doc_length, quantize_bits=None, scale=1.0):
+    """
+    Computes the impact of a term in a document, its lnc weight divided by the length of the document vector.
+
+    Args:
+        freq (int): The frequency of the term in the document.
+        doc_length (float): The length of the document vector.
+        quantize_bits (int): The number of bits of quantized impacts, None for float impacts.
+        scale (float): The weight of one quantization step, as given by impact_scale.
+
+    Returns:
+        float: The impact, or an int between 1 and 2 ** quantize_bits - 1 when quantized, so that quantization never
+        drops a matching document.
+    """
+    impact = (1 + math.log10(freq)) / doc_length
+    if quantize_bits is None:
+        return impact
+    return min((1 << quantize_bits) - 1, max(1, round(impact / scale)))
+
+
+def impact_scale(quantize_bits=None):
+    """
+    Returns the weight of one quantization step of the impacts.
+
+    An lnc impact is a component of a unit vector, so it is at most 1 and the levels cover [0, 1] whatever the corpus.
+    Every segment thus shares the same step, and documents added later are quantized exactly as in a fresh build.
+
+    Args:
+        quantize_bits (int): The number of bits of quantized impacts, None for float impacts.
+
+    Returns:
+        float: 1 for float impacts, 1 divided by the number of quantization levels otherwise.
+    """
+    if quantize_bits is None:
+        return 1.0
+    return 1 / ((1 << quantize_bits) - 1)
+
+
+def _impact_typecode(quantize_bits=None):
+    return 'd' if quantize_bits is None else 'B' if quantize_bits <= 8 else 'H'
+
+
+class Segment:
+    """
+    An immutable batch of documents of the VSM, with the postings of every term sorted by decreasing impact.
+
+    Segments are never modified: deleted documents are only masked by the tombstones of the VSM until the segment
+    is merged with others or rewritten, which drops them.
+
+    Attributes:
+        postings (dict): Every term mapped to a (doc numbers, impacts, frequencies) tuple of aligned arrays, sorted by
+            decreasing impact then doc number.
+        doc_terms (dict): The doc number of every document of the segment mapped to the sorted tuple of its distinct
+            terms, used to update the document frequencies when it is deleted.
+        doc_freqs (dict): The doc number of every document of the segment mapped to the array of the frequencies of
+            its terms, aligned with doc_terms.
+        quantize_bits (int): The number of bits of the quantized impacts, None for float impacts.
+        scale (float): The weight of one quantization step, 1 for float impacts.
+    """
+    def __init__(self, postings, doc_terms, doc_freqs, quantize_bits=None, scale=1.0):
+        self.postings = postings
+        self.doc_terms = doc_terms
+        self.doc_freqs = doc_freqs
+        self.quantize_bits = quantize_bits
+        self.scale = scale
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    @classmethod
+    def from_documents(cls, documents, quantize_bits=None, scale=1.0):
+        """
+        Builds a segment from the statistics of its documents.
+
+        Args:
+            documents (iterable): A (doc number, term frequency Counter, document length) tuple per document.
+            quantize_bits (int): The number of bits to quantize the impacts to, None to keep them as floats.
+            scale (float): The weight of one quantization step.
+
+        Returns:
+            Segment: The segment of the documents.
+        """
+        entries = {}
+        doc_terms = {}
+        doc_freqs = {}
+        for doc_number, term_freq, doc_length in documents:
+            doc_terms[doc_number] = tuple(sorted(term_freq))
+            doc_freqs[doc_number] = array('I', [term_freq[term] for term in doc_terms[doc_number]])
+            for term, freq in term_freq.items():
+                entries.setdefault(term, []).append((document_impact(freq, doc_length, quantize_bits, scale), doc_number, freq))
+        return cls(_pack_postings(entries, quantize_bits), doc_terms, doc_freqs, quantize_bits, scale)
+
+    def term_frequencies(self, doc_number, terms):
+        """
+        Looks up the frequencies of some terms in a document of the segment.
+
+        Args:
+            doc_number (int): The doc number of the document.
+            terms (iterable): The terms to look up.
+
+        Returns:
+            dict: The frequency of every given term found in the document, in the order of the terms.
+        """
+        doc_terms = self.doc_terms[doc_number]
+        doc_freqs = self.doc_freqs[doc_number]
+        frequencies = {}
+        for term in terms:
+            index = bisect_left(doc_terms, term)
+            if index < len(doc_terms) and doc_terms[index] == term:
+                frequencies[term] = doc_freqs[index]
+        return frequencies
+
+    def deleted_count(self, tombstones):
+        """
+        Counts the documents of the segment that are deleted.
+
+        Args:
+            tombstones (set): The doc numbers of the deleted documents.
+
+        Returns:
+            int: The number of deleted documents of the segment.
+        """
+        if len(tombstones) < len(self.doc_terms):
+            return sum(1 for doc_number in tombstones if doc_number in self.doc_terms)
+        return sum(1 for doc_number in self.doc_terms if doc_number in tombstones)
+
+
+def _pack_postings(entries, quantize_bits):
+    # Sorting the (impact, doc number, frequency) entries of every term by decreasing impact into aligned arrays
+    typecode = _impact_typecode(quantize_bits)
+    postings = {}
+    for term, term_entries in entries.items():
+        term_entries.sort(key=lambda entry: (-entry[0], entry[1]))
+        postings[term] = (array('I', [doc_number for _, doc_number, _ in term_entries]),
+                          array(typecode, [impact for impact, _, _ in term_entries]),
+                          array('I', [freq for _, _, freq in term_entries]))
+    return postings
+
+
+def live_postings(segments, term, tombstones):
+    """
+    Merges the postings of a term over several segments, without the deleted documents.
+
+    Args:
+        segments (list): The segments, all with the same impact quantization.
+        term (str): The term.
+        tombstones (set): The doc numbers of the deleted documents.
+
+    Returns:
+        tuple: The (doc numbers, impacts, frequencies) arrays of the term sorted by decreasing impact, or None if
+        no live document contains it.
+    """
+    lists = [segment.postings[term] for segment in segments if term in segment.postings]
+    if len(lists) == 1 and not tombstones:
+        # A single segment without deletions needs no copy
+        return lists[0]
+    entries = [(impact, doc_number, freq) for doc_numbers, impacts, freqs in lists
+               for doc_number, impact, freq in zip(doc_numbers, impacts, freqs) if doc_number not in tombstones]
+    if not entries:
+        return None
+    return _pack_postings({term: entries}, segments[0].quantize_bits)[term]
+
+
+def merge_segments(segments, tombstones):
+    """
+    Merges segments into one, dropping their deleted documents. The impacts are copied as they are.
+
+    Args:
+        segments (list): The segments to merge, all with the same impact quantization and scale.
+        tombstones (set): The doc numbers of the deleted documents.
+
+    Returns:
+        Segment: The merged segment.
+    """
+    entries = {}
+    for segment in segments:
+        for term, (doc_numbers, impacts, freqs) in segment.postings.items():
+            term_entries = [(impact, doc_number, freq) for doc_number, impact, freq in zip(doc_numbers, impacts, freqs) if doc_number not in tombstones]
+            if term_entries:
+                entries.setdefault(term, []).extend(term_entries)
+    doc_terms = {doc_number: terms for segment in segments for doc_number, terms in segment.doc_terms.items() if doc_number not in tombstones}
+    doc_freqs = {doc_number: segment.doc_freqs[doc_number] for segment in segments for doc_number in segment.doc_terms if doc_number not in tombstones}
+    quantize_bits = segments[0].quantize_bits if segments else None
+    scale = segments[0].scale if segments else 1.0
+    return Segment(_pack_postings(entries, quantize_bits), doc_terms, doc_freqs, quantize_bits, scale)
+
+
+def select_merges(segments, tombstones):
+    """
+    Chooses the segments to merge under the tiered merge policy.
+
+    Segments are grouped in tiers by the logarithm of their number of documents in base MERGE_FACTOR, and the
+    MERGE_FACTOR smallest segments of a tier holding that many are merged. A segment with too many deleted documents
+    is rewritten on its own.
+
+    Args:
+        segments (list): The segments of the VSM.
+        tombstones (set): The doc numbers of the deleted documents.
+
+    Returns:
+        list: Disjoint lists of segments, each to be merged into one segment.
+    """
+    merges = []
+    tiers = {}
+    for segment in segments:
+        deleted = segment.deleted_count(tombstones)
+        if deleted and deleted >= MAX_DELETED_RATIO * len(segment):
+            merges.append([segment])
+            continue
+        tier = int(math.log(max(len(segment) - deleted, 1), MERGE_FACTOR))
+        tiers.setdefault(tier, []).append(segment)
+    for tier_segments in tiers.values():
+        if len(tier_segments) >= MERGE_FACTOR:
+            merges.append(sorted(tier_segments, key=len)[:MERGE_FACTOR])
+    return merges
@@ -0,0 +1,177 @@
+import math
+from collections import Counter
+import numpy as np
+from scipy import sparse
+from preprocessing import get_preprocessor
+
+# Number of queries scored per matrix product, bounding the size of the score matrix held at once
+QUERY_BATCH_SIZE = 256
+
+
+def top_k_positions(scores, tie_ranks, k):
+    """
+    Returns the positions of the k highest scores, keeping every score tied with the k-th before breaking the ties.
+
+    Args:
+        scores (ndarray): The scores.
+        tie_ranks (ndarray): The rank breaking the ties of every score, the lowest first.
+        k (int): The number of positions to return.
+
+    Returns:
+        ndarray: The positions of the k best scores, best first.
+    """
+    candidates = np.arange(len(scores))
+    if len(scores) > k:
+        kth_score = np.partition(scores, len(scores) - k)[len(scores) - k]
+        candidates = candidates[scores >= kth_score]
+    return candidates[np.lexsort((tie_ranks[candidates], -scores[candidates]))][:k]
+
+
+class SparseScoringEngine:
+    """
+    Scores queries against a finalized VectorSpaceModel with NumPy and SciPy, in batches as sparse matrix products,
+    or one at a time by accumulating the rows of the matrix into an array indexed by doc number.
+
+    The live impact postings of the model, merged over its segments, are compiled into a term-document CSR matrix of
+    normalized document weights. A batch of queries becomes a query-term CSR matrix of normalized ltc weights, so the cosine scores of every query
+    against every document are the rows of their product, and the top k of every row is selected by partitioning its
+    nonzero scores. The scores are those of VectorSpaceModel.func_to_rank_documents up to floating point rounding,
+    except that documents scoring 0 are never returned.
+
+    Attributes:
+        vsm (VectorSpaceModel): The finalized model the engine was compiled from.
+        term_ids (dict): The row of every term in the matrix.
+        matrix (csr_matrix): The weight of every term in every document, with a row per term and a column per doc number.
+        tie_ranks (ndarray): The rank of every doc number in sorted order of the document identifiers, breaking ties.
+        accumulator (ndarray): The score of every doc number, preallocated and reset after every query.
+        matched (ndarray): Whether every doc number has a posting read for the current query.
+    """
+    def __init__(self, vsm):
+        """
+        Compiles the live impact postings of a model into a term-document matrix.
+
+        Args:
+            vsm (VectorSpaceModel): The model, finalized first if documents were added since.
+        """
+        if not vsm.finalized:
+            vsm.finalize(vsm.quantize_bits)
+        self.vsm = vsm
+        postings = list(vsm.live_impact_postings())
+        self.term_ids = {term: term_id for term_id, (term, _, _) in enumerate(postings)}
+        lengths = np.fromiter((len(doc_numbers) for _, doc_numbers, _ in postings), dtype=np.int64, count=len(postings))
+        indptr = np.zeros(len(self.term_ids) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        # The posting arrays are read without copying, then concatenated once
+        indices = np.concatenate([np.frombuffer(doc_numbers, dtype=np.uint32) for _, doc_numbers, _ in postings] or [np.empty(0, np.uint32)])
+        data = np.concatenate([np.frombuffer(impacts, dtype=impacts.typecode) for _, _, impacts in postings] or [np.empty(0)])
+        data = data.astype(np.float64) * vsm.impact_scale
+        self.matrix = sparse.csr_matrix((data, indices.astype(np.int32), indptr), shape=(len(self.term_ids), len(vsm.doc_names)))
+        self.tie_ranks = np.empty(len(vsm.doc_names), dtype=np.int64)
+        self.tie_ranks[np.array(sorted(range(len(vsm.doc_names)), key=vsm.doc_names.__getitem__), dtype=np.int64)] = np.arange(len(vsm.doc_names))
+        self.accumulator = np.zeros(len(vsm.doc_names))
+        self.matched = np.zeros(len(vsm.doc_names), dtype=bool)
+
+    def query_matrix(self, queries):
+        """
+        Builds the matrix of the normalized ltc weights of a batch of queries.
+
+        Args:
+            queries (list): The query strings.
+
+        Returns:
+            csr_matrix: The weight of every term in every query, with a row per query and a column per term.
+        """
+        data, indices, indptr = [], [], [0]
+        preprocessor = get_preprocessor()
+        for query in queries:
+            query_frequency = Counter(preprocessor.process(query))
+            weights = {self.term_ids[term]: (1 + math.log10(freq)) * self.vsm.idf[term]
+                       for term, freq in query_frequency.items() if term in self.term_ids}
+            norm = math.sqrt(sum(weight ** 2 for weight in weights.values()))
+            if norm:
+                indices.extend(weights)
+                data.extend(weight / norm for weight in weights.values())
+            indptr.append(len(indices))
+        return sparse.csr_matrix((np.array(data, dtype=np.float64), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+                                 shape=(len(queries), len(self.term_ids)))
+
+    def top_k(self, scores, k):
+        """
+        Selects the k best documents of every row of a score matrix.
+
+        Args:
+            scores (csr_matrix): The score of every document for every query, with a row per query.
+            k (int): The number of documents to keep per query.
+
+        Returns:
+            list: Per query, the list of its top k (doc number, score) tuples, best first and ties broken by document identifier.
+        """
+        scores.eliminate_zeros()
+        rankings = []
+        for row in range(scores.shape[0]):
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            doc_numbers = scores.indices[start:end]
+            best = top_k_positions(scores.data[start:end], self.tie_ranks[doc_numbers], k)
+            rankings.append(list(zip(doc_numbers[best].tolist(), scores.data[start:end][best].tolist())))
+        return rankings
+
+    def rank_batch(self, queries, k=10):
+        """
+        Ranks the top k documents of every query of a batch.
+
+        Args:
+            queries (list): The query strings.
+            k (int): The number of documents to return per query.
+
+        Returns:
+            list: Per query, the list of its top k ranked documents (doc_id, score), best first and ties broken by doc_id.
+        """
+        doc_names = self.vsm.doc_names
+        rankings = []
+        for start in range(0, len(queries), QUERY_BATCH_SIZE):
+            scores = (self.query_matrix(queries[start:start + QUERY_BATCH_SIZE]) @ self.matrix).tocsr()
+            for ranking in self.top_k(scores, k):
+                rankings.append([(doc_names[doc_number], score) for doc_number, score in ranking])
+        return rankings
+
+    def rank_terms(self, weighated_query, query_norm, k=10, min_contribution=None):
+        """
+        Ranks the top k documents of a single weighted query term at a time, accumulating into the preallocated array.
+
+        Every posting list is a row of the matrix, whose weights are already divided by the document lengths, so
+        scoring a term is one vectorized scaled addition into the accumulator at its doc numbers, without any hashing.
+
+        Args:
+            weighated_query (dict): The ltc weight of every query term.
+            query_norm (float): The length of the query vector.
+            k (int): The number of documents to return, None to rank every matching document.
+            min_contribution (float): The smallest contribution to the cosine score read from the impact-sorted
+                rows, None to read them in full.
+
+        Returns:
+            tuple: The list of the top k (doc number, score) tuples, best first and ties broken by document
+            identifier, and a dict of the number of postings read and of those skipped.
+        """
+        evaluated = skipped = 0
+        for term, query_weight in weighated_query.items():
+            if term not in self.term_ids:
+                continue
+            term_id = self.term_ids[term]
+            start, end = self.matrix.indptr[term_id], self.matrix.indptr[term_id + 1]
+            if min_contribution is not None:
+                # The rows are sorted by decreasing weight, so the postings to read are a prefix of the row
+                contributions = self.matrix.data[start:end] * (query_weight / query_norm)
+                end = start + int(np.searchsorted(-contributions, -min_contribution, side='right'))
+            doc_numbers = self.matrix.indices[start:end]
+            self.accumulator[doc_numbers] += self.matrix.data[start:end] * query_weight
+            self.matched[doc_numbers] = True
+            evaluated += end - start
+            skipped += self.matrix.indptr[term_id + 1] - end
+
+        scored = np.flatnonzero(self.matched)
+        scores = self.accumulator[scored] / query_norm
+        # Resetting only the entries of this query for the next one
+        self.accumulator[scored] = 0
+        self.matched[scored] = False
+        best = top_k_positions(scores, self.tie_ranks[scored], len(scored) if k is None else k)
+        return list(zip(scored[best].tolist(), scores[best].tolist())), {"evaluated": int(evaluated), "skipped": int(skipped)}